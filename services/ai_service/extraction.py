@@ -0,0 +1,245 @@
+import asyncio
+import math
+import multiprocessing
+import re
+import resource
+from collections import Counter
+from typing import Iterable, Iterator, List
+
+import fitz  # PyMuPDF
+import docx  # python-docx
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+
+# Top and bottom share of a PDF page where running headers, footers and page numbers live
+MARGIN_RATIO = 0.08
+# A PDF line set this much larger than the body font is a heading (x1.6 and more - a top-level one)
+HEADING_RATIO = 1.2
+TITLE_RATIO = 1.6
+HEADING_MAX_CHARS = 120
+
+_DIGITS_RE = re.compile(r"\d+")
+_HEADING_STYLE_RE = re.compile(r"^(?:heading|заголовок)\s*(\d)", re.IGNORECASE)
+
+
+class ParserOverloaded(Exception):
+    """Too many documents are already running or waiting for a parser process."""
+
+
+class ParseTimeout(Exception):
+    """The document was not parsed within the per-job time limit."""
+
+
+class ParseFailed(Exception):
+    """The parser raised an error or its process died (e.g. hit the memory limit)."""
+
+
+def iter_pdf_text(pdf_doc) -> Iterator[str]:
+    """
+    Text of a PDF, one page at a time (pages are loaded lazily).
+
+    Margin lines already seen on an earlier page - running headers, footers, page
+    numbers - are skipped. Lines set in a larger font than the body so far become
+    markdown headings, so the prompt keeps the document structure.
+    """
+    seen_margins = set()
+    sizes = Counter()
+    for page in pdf_doc:
+        height = page.rect.height
+        lines = []
+        for block in page.get_text("dict")["blocks"]:
+            if block.get("type") != 0:
+                continue  # images
+            in_margin = block["bbox"][3] <= height * MARGIN_RATIO or block["bbox"][1] >= height * (1 - MARGIN_RATIO)
+            for line in block["lines"]:
+                text = "".join(span["text"] for span in line["spans"]).strip()
+                if not text:
+                    continue
+                if in_margin:
+                    # Page numbers differ from page to page: compare lines with digits masked
+                    signature = _DIGITS_RE.sub("#", text.lower())
+                    if signature in seen_margins or not signature.strip("# "):
+                        continue
+                    seen_margins.add(signature)
+                size = round(max(span["size"] for span in line["spans"]), 1)
+                sizes[size] += len(text)
+                lines.append((text, size))
+
+        body_size = sizes.most_common(1)[0][0] if sizes else 0
+        out = []
+        for text, size in lines:
+            if body_size and size >= body_size * HEADING_RATIO and len(text) <= HEADING_MAX_CHARS:
+                out.append(f"{'#' if size >= body_size * TITLE_RATIO else '##'} {text}")
+            else:
+                out.append(text)
+        yield "\n".join(out)
+
+
+def iter_docx_text(doc) -> Iterator[str]:
+    """Text of a DOCX, one paragraph at a time; Title/Heading styles become markdown headings."""
+    # Paragraph objects are created lazily instead of building doc.paragraphs for the whole file.
+    # Page headers and footers live in separate parts and are not in the body at all
+    for element in doc.element.body.iterchildren(qn("w:p")):
+        para = Paragraph(element, doc)
+        text = para.text.strip()
+        if not text:
+            continue
+        style = para.style.name if para.style is not None else ""
+        match = _HEADING_STYLE_RE.match(style)
+        if style == "Title":
+            yield f"# {text}"
+        elif match:
+            yield f"{'#' * min(int(match.group(1)) + 1, 4)} {text}"
+        else:
+            yield text
+
+
+def take_chars(pieces: Iterable[str], max_chars: int) -> str:
+    """Joins pieces until max_chars is reached; the rest of the document is never parsed."""
+    taken = []
+    total = 0
+    for piece in pieces:
+        if not piece:
+            continue
+        taken.append(piece)
+        total += len(piece) + 1
+        if total >= max_chars:
+            break
+    return "\n".join(taken)[:max_chars]
+
+
+def extract_text(path: str, file_ext: str, max_chars: int) -> str:
+    """
+    Structured plain text of a PDF or DOCX file, at most max_chars long.
+    Both parsers open the file by path and read only the parts they need,
+    so the document is never loaded into memory as a whole.
+    """
+    if file_ext == ".pdf":
+        with fitz.open(path, filetype="pdf") as pdf_doc:
+            return take_chars(iter_pdf_text(pdf_doc), max_chars)
+
+    if file_ext == ".docx":
+        return take_chars(iter_docx_text(docx.Document(path)), max_chars)
+
+    return ""
+
+
+def _pack(units: Iterable[str], max_chars: int) -> List[str]:
+    """Greedily joins consecutive units with newlines into pieces of at most max_chars."""
+    packed = []
+    buffer = []
+    size = 0
+    for unit in units:
+        if buffer and size + len(unit) + 1 > max_chars:
+            packed.append("\n".join(buffer))
+            buffer, size = [], 0
+        buffer.append(unit)
+        size += len(unit) + 1
+    if buffer:
+        packed.append("\n".join(buffer))
+    return packed
+
+
+def split_into_chunks(text: str, max_chars: int) -> List[str]:
+    """
+    Splits structured text (see iter_pdf_text/iter_docx_text) into chunks of at most max_chars.
+    Cuts go between sections (before heading lines) where possible, then between lines,
+    so every chunk holds whole sections or at least whole paragraphs of one section.
+    """
+    sections = []
+    current = []
+    for line in text.split("\n"):
+        if line.startswith("#") and current:
+            sections.append("\n".join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append("\n".join(current))
+
+    pieces = []
+    for section in sections:
+        if len(section) <= max_chars:
+            pieces.append(section)
+            continue
+        # Oversized section: cut between lines, a single giant line is cut by length
+        lines = []
+        for line in section.split("\n"):
+            lines.extend(line[i:i + max_chars] for i in range(0, max(len(line), 1), max_chars))
+        pieces.extend(_pack(lines, max_chars))
+    return _pack(pieces, max_chars)
+
+
+def _parse_job(conn, path: str, file_ext: str, max_chars: int, memory_bytes: int, cpu_seconds: int) -> None:
+    """Entry point of a parser process: apply resource limits, parse, send the result back."""
+    try:
+        # The kernel enforces the limits: a runaway document kills only this process
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+        conn.send(("ok", extract_text(path, file_ext, max_chars)))
+    except MemoryError:
+        conn.send(("error", "Документ слишком большой для обработки."))
+    except Exception as e:
+        conn.send(("error", str(e)))
+    finally:
+        conn.close()
+
+
+class DocumentParser:
+    """
+    Runs document extraction outside the event loop, in at most `workers` parser processes.
+
+    Every job gets a fresh process forked from a preloaded fork server, so the
+    time and memory limits apply per job and a stuck parser can simply be killed.
+    Up to `queue_limit` more jobs wait for a free process; beyond that
+    extract() raises ParserOverloaded instead of queueing without bound.
+    """
+
+    def __init__(self, workers: int, queue_limit: int, timeout: float, memory_mb: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self.memory_bytes = memory_mb * 1024 * 1024
+        self._context = multiprocessing.get_context("forkserver")
+        # fitz and docx are imported once in the fork server, not in every job
+        self._context.set_forkserver_preload([__name__])
+        self._slots = asyncio.Semaphore(workers)
+        self._pending = 0
+
+    async def extract(self, path: str, file_ext: str, max_chars: int) -> str:
+        """Text of the document at path; only the path is sent to the parser process."""
+        if self._pending >= self.workers + self.queue_limit:
+            raise ParserOverloaded()
+        self._pending += 1
+        try:
+            async with self._slots:
+                # The thread only waits on the pipe; parsing itself runs in the child process
+                return await asyncio.to_thread(self._run, path, file_ext, max_chars)
+        finally:
+            self._pending -= 1
+
+    def _run(self, path: str, file_ext: str, max_chars: int) -> str:
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_parse_job,
+            args=(sender, path, file_ext, max_chars, self.memory_bytes, math.ceil(self.timeout)),
+            daemon=True,
+        )
+        process.start()
+        sender.close()
+        try:
+            if not receiver.poll(self.timeout):
+                raise ParseTimeout()
+            try:
+                status, payload = receiver.recv()
+            except EOFError:
+                # Process died without an answer: killed by the memory or CPU limit
+                raise ParseFailed("Обработчик документа аварийно завершился.")
+        finally:
+            if process.is_alive():
+                process.kill()
+            process.join()
+            receiver.close()
+
+        if status != "ok":
+            raise ParseFailed(payload)
+        return payload
@@ -2,18 +2,24 @@ import os
 import time
 import json
 import logging
-import io
-from typing import Any, Dict, List, Optional
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
 
-import fitz  # PyMuPDF
-import docx  # python-docx
+import httpx
 
 from fastapi import FastAPI, HTTPException, Depends, status, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from pydantic import BaseModel
-from groq import Groq
+from groq import APITimeoutError, AsyncGroq
+
+from extraction import DocumentParser, ParseFailed, ParserOverloaded, ParseTimeout, split_into_chunks
+from response_cache import ResponseCache, make_key, normalize_text
+from streaming import JsonArrayStream, is_streaming, parse_streamed_json, report, sse_events
+from uploads import UploadSizeLimitMiddleware, UploadTooLarge, save_upload, too_large_detail
 
 
 # --- LOGGING ---
@@ -33,11 +39,19 @@ logger = logging.getLogger("ai_security")
 
 
 # --- APP ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Shared connection pool of the LLM client is closed together with the worker
+    await http_client.aclose()
+
+
 app = FastAPI(
     title="SaqBol AI Service",
     root_path="/ai",
     docs_url="/docs",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    lifespan=lifespan
 )
 
 @app.middleware("http")
@@ -67,6 +81,17 @@ app.add_middleware(
 )
 
 
+# --- UPLOAD LIMIT ---
+# Uploads are spooled to disk and never held in memory whole; bodies over the cap are cut off while streaming.
+# Added last, so it is the outermost middleware and its 413 reaches the client unchanged
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "128")) * 1024 * 1024
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    paths=("/generate-course-from-file", "/generate-course-from-file/stream"),
+    max_bytes=MAX_UPLOAD_BYTES,
+)
+
+
 # --- SECURITY ---
 security = HTTPBearer()
 SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "unsafe-dev-secret-key")
@@ -90,7 +115,48 @@ def verify_token(auth: HTTPAuthorizationCredentials = Depends(security)):
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 if not GROQ_API_KEY:
     logger.critical("❌ GROQ_API_KEY не найден!")
-client = Groq(api_key=GROQ_API_KEY)
+GROQ_MODEL = "llama-3.3-70b-versatile"
+
+# How many LLM requests one worker keeps in flight; the rest wait for a free slot
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+# Seconds for one LLM call, and how long a request may wait for a free slot
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "90"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+
+# One keep-alive pool for all calls: no TCP/TLS handshake per generation
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=LLM_MAX_CONCURRENCY,
+        max_keepalive_connections=LLM_MAX_CONCURRENCY,
+    ),
+    timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0),
+)
+client = AsyncGroq(api_key=GROQ_API_KEY, http_client=http_client, timeout=LLM_TIMEOUT, max_retries=1)
+llm_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+
+# --- RESPONSE CACHE ---
+# Generations are cached by a hash of the normalized input, so repeated requests for the
+# same lesson text or file cost neither tokens nor LLM latency
+response_cache = ResponseCache(
+    directory=os.getenv("AI_CACHE_DIR", "cache"),
+    ttl=float(os.getenv("AI_CACHE_TTL", str(7 * 24 * 3600))),
+    memory_items=int(os.getenv("AI_CACHE_MEMORY_ITEMS", "256")),
+    disk_bytes=int(os.getenv("AI_CACHE_DISK_MB", "256")) * 1024 * 1024,
+)
+
+# --- DOCUMENT PARSING ---
+# PDF/DOCX extraction is CPU-bound: it runs in separate processes with per-job limits,
+# so a 300-page upload does not stall quiz and scenario generation on this worker
+document_parser = DocumentParser(
+    workers=int(os.getenv("PARSE_WORKERS", "2")),
+    queue_limit=int(os.getenv("PARSE_QUEUE_LIMIT", "8")),
+    timeout=float(os.getenv("PARSE_TIMEOUT", "60")),
+    memory_mb=int(os.getenv("PARSE_MEMORY_MB", "1024")),
+)
+
+# Bump a version whenever its prompt changes: answers cached for the old prompt stop matching
+PROMPT_VERSIONS = {"quiz": 2, "scenario": 1, "course": 4}
 
 
 # --- DATA MODELS ---
@@ -207,20 +273,149 @@ def validate_choice_options_have_one_correct(scenario: Dict[str, Any]) -> None:
                     detail="AI вернул choice без нормальной разметки правильного/неправильного варианта."
                 )
 
-def groq_chat_json(system_prompt: str, user_prompt: str, temperature: float = 0.2) -> Dict[str, Any]:
-    """One Groq call that expects json_object."""
-    chat_completion = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        response_format={"type": "json_object"},
-        temperature=temperature
+def wants_fresh(http_request: Request) -> bool:
+    """Cache-Control: no-cache forces a new generation, which then replaces the cached one."""
+    return "no-cache" in http_request.headers.get("cache-control", "").lower()
+
+class ItemStream(NamedTuple):
+    """Array of the answer whose elements a streaming endpoint reports one by one."""
+    key: str
+    event: str
+    is_valid: Callable[[Any], bool]
+
+
+def is_valid_question(item: Any) -> bool:
+    return (
+        isinstance(item, dict)
+        and bool(str(item.get("question", "")).strip())
+        and isinstance(item.get("options"), list)
+        and len(item["options"]) >= 2
+    )
+
+def is_valid_lesson(item: Any) -> bool:
+    return (
+        isinstance(item, dict)
+        and isinstance(item.get("title"), str) and bool(item["title"].strip())
+        and isinstance(item.get("content"), str)
+    )
+
+def is_valid_step(item: Any) -> bool:
+    if not isinstance(item, dict):
+        return False
+    if item.get("type") == "message":
+        return isinstance(item.get("text"), str) and bool(item["text"].strip())
+    return item.get("type") == "choice" and isinstance(item.get("options"), list) and len(item["options"]) >= 2
+
+QUESTION_ITEMS = ItemStream("generated_questions", "question", is_valid_question)
+LESSON_ITEMS = ItemStream("lessons", "lesson", is_valid_lesson)
+STEP_ITEMS = ItemStream("steps", "step", is_valid_step)
+
+
+async def stream_completion(messages: List[Dict[str, str]], temperature: float, items: ItemStream) -> str:
+    """
+    Streams the answer and reports every valid element of items as soon as it is complete.
+    JSON mode is not available for streamed completions, so the prompt alone asks for JSON.
+    """
+    stream = await client.chat.completions.create(
+        model=GROQ_MODEL,
+        messages=messages,
+        temperature=temperature,
+        stream=True
     )
+    parser = JsonArrayStream(items.key)
+    parts = []
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if not delta:
+            continue
+        parts.append(delta)
+        for item in parser.feed(delta):
+            if items.is_valid(item):
+                await report(items.event, item)
+    return "".join(parts)
+
+async def groq_chat_json(
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float = 0.2,
+    items: Optional[ItemStream] = None,
+) -> Dict[str, Any]:
+    """
+    One Groq call that expects json_object.
+    Awaits the async client, so the event loop keeps serving other requests meanwhile;
+    at most LLM_MAX_CONCURRENCY calls per worker run at once.
+    Inside a streaming endpoint, a call with `items` streams the answer (see stream_completion).
+    """
+    try:
+        await asyncio.wait_for(llm_slots.acquire(), timeout=LLM_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("LLM OVERLOAD: no free slot, request rejected.")
+        raise HTTPException(status_code=503, detail="AI сервис перегружен. Попробуйте позже.")
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+    try:
+        if items is not None and is_streaming():
+            return parse_streamed_json(await stream_completion(messages, temperature, items))
+
+        chat_completion = await client.chat.completions.create(
+            model=GROQ_MODEL,
+            messages=messages,
+            response_format={"type": "json_object"},
+            temperature=temperature
+        )
+    except APITimeoutError:
+        logger.error(f"LLM TIMEOUT: no response in {LLM_TIMEOUT:.0f}s")
+        raise HTTPException(status_code=504, detail="AI не ответил вовремя. Попробуйте снова.")
+    finally:
+        llm_slots.release()
+
     content = chat_completion.choices[0].message.content
     return safe_json_loads(content)
 
+def sse_response(
+    key: str,
+    build: Callable[[], Any],
+    refresh: bool,
+    items: ItemStream,
+    error_prefix: str,
+    cleanup: Optional[Callable[[], None]] = None,
+) -> StreamingResponse:
+    """
+    Streaming twin of response_cache.get_or_generate: progress and item events while build()
+    runs, then `result` with the full JSON (or `error` with status and detail).
+    A cache hit replays the cached items at once.
+    """
+    async def produce() -> None:
+        try:
+            result = None if refresh else await response_cache.get(key)
+            if result is not None:
+                await report("progress", {"stage": "cache_hit"})
+                for item in result.get(items.key) or []:
+                    if items.is_valid(item):
+                        await report(items.event, item)
+            else:
+                result = await build()
+                await response_cache.set(key, result)
+            await report("result", result)
+        except HTTPException as e:
+            await report("error", {"status": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.error(f"{error_prefix}: {e}")
+            await report("error", {"status": 500, "detail": str(e)})
+        finally:
+            if cleanup is not None:
+                cleanup()
+
+    return StreamingResponse(
+        sse_events(produce),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they come instead of buffering the response
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 # --- ENDPOINTS ---
 @app.get("/")
@@ -232,34 +427,67 @@ def health():
     return {"status": "ok"}
 
 
-@app.post("/generate-quiz")
-async def generate_quiz(request: QuizRequest, user_data=Depends(verify_token)):
-    logger.info(f"User {user_data.get('user_id')} запросил квиз.")
+def check_quiz_request(request: QuizRequest) -> None:
     if len(request.text.strip()) < 10:
         raise HTTPException(status_code=400, detail="Текст слишком короткий.")
 
+def quiz_key(request: QuizRequest) -> str:
+    return make_key(
+        "quiz", PROMPT_VERSIONS["quiz"],
+        text=normalize_text(request.text),
+        count=request.count,
+        difficulty=normalize_text(request.difficulty).lower(),
+    )
+
+async def build_quiz(request: QuizRequest) -> Dict[str, Any]:
+    await report("progress", {"stage": "generating"})
+    system_prompt = f"Ты методист. Создай тест. Уровень: {request.difficulty}. Отвечай JSON."
+    user_prompt = (
+        f"Составь {request.count} вопросов по тексту: '{request.text}'. "
+        f'Формат JSON: {{"generated_questions": [...]}}'
+    )
+    return await groq_chat_json(system_prompt, user_prompt, temperature=0.3, items=QUESTION_ITEMS)
+
+
+@app.post("/generate-quiz")
+async def generate_quiz(request: QuizRequest, http_request: Request, user_data=Depends(verify_token)):
+    logger.info(f"User {user_data.get('user_id')} запросил квиз.")
+    check_quiz_request(request)
+
     try:
-        system_prompt = f"Ты методист. Создай тест. Уровень: {request.difficulty}. Отвечай JSON."
-        user_prompt = (
-            f"Составь {request.count} вопросов по тексту: '{request.text}'. "
-            f"Формат JSON: {{'generated_questions': [...]}}"
+        return await response_cache.get_or_generate(
+            quiz_key(request), lambda: build_quiz(request), refresh=wants_fresh(http_request)
         )
-        return groq_chat_json(system_prompt, user_prompt, temperature=0.3)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error Quiz: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/generate-scenario")
-async def generate_scenario(request: ScenarioRequest, user_data=Depends(verify_token)):
-    logger.info(
-        f"User {user_data.get('user_id')} запросил сценарий: {request.topic} | type={request.scenario_type}"
+@app.post("/generate-quiz/stream")
+async def generate_quiz_stream(request: QuizRequest, http_request: Request, user_data=Depends(verify_token)):
+    """Same quiz as /generate-quiz, as server-sent events: every question as soon as it is generated."""
+    logger.info(f"User {user_data.get('user_id')} запросил квиз (stream).")
+    check_quiz_request(request)
+    return sse_response(
+        quiz_key(request), lambda: build_quiz(request), wants_fresh(http_request), QUESTION_ITEMS, "Error Quiz"
     )
 
+
+def check_scenario_request(request: ScenarioRequest) -> None:
     if request.scenario_type not in ("chat", "email"):
         raise HTTPException(status_code=400, detail="Тип должен быть 'chat' или 'email'")
 
-    # --- PROMPTS ---
+def scenario_key(request: ScenarioRequest) -> str:
+    return make_key(
+        "scenario", PROMPT_VERSIONS["scenario"],
+        topic=normalize_text(request.topic),
+        scenario_type=request.scenario_type,
+        difficulty=normalize_text(request.difficulty).lower(),
+    )
+
+def scenario_prompts(request: ScenarioRequest) -> Tuple[str, str]:
     if request.scenario_type == "chat":
         system_prompt = f"""
 ВЫ — СТРОГИЙ REST API СЕРВЕР. ВЕРНИ ВАЛИДНЫЙ JSON ДЛЯ ИНТЕРАКТИВНОГО ТРЕНАЖЕРА.
@@ -305,40 +533,60 @@ async def generate_scenario(request: ScenarioRequest, user_data=Depends(verify_t
 Верни ТОЛЬКО JSON.
 """.strip()
 
-    # --- GENERATION WITH RETRY ---
-    try:
-        # 1) первый вызов
-        scenario = groq_chat_json(system_prompt, user_prompt, temperature=0.05)
+    return system_prompt, user_prompt
+
+
+async def build_scenario(request: ScenarioRequest) -> Dict[str, Any]:
+    await report("progress", {"stage": "generating"})
+    system_prompt, user_prompt = scenario_prompts(request)
+    items = STEP_ITEMS if request.scenario_type == "chat" else None
+
+    # 1) первый вызов
+    scenario = await groq_chat_json(system_prompt, user_prompt, temperature=0.05, items=items)
+
+    if request.scenario_type == "chat":
+        # если AI вернул speaker-формат — конвертим
+        if has_speaker_format(scenario):
+            logger.warning("AI returned speaker-format. Converting to interactive.")
+            scenario = convert_speaker_to_interactive(scenario)
+
+        # если не интерактивный — ретрай один раз жёстко
+        if not is_interactive_chat_format(scenario):
+            logger.warning("AI returned invalid chat format. Retrying with stricter prompt.")
+            # Шаги первой попытки уже ушли клиенту: он начинает заново
+            await report("progress", {"stage": "retry"})
+            strict_user_prompt = (
+                user_prompt
+                + "\n\nВАЖНО: запрещено использовать speaker. Каждый шаг обязан иметь поле type."
+            )
+            scenario = await groq_chat_json(system_prompt, strict_user_prompt, temperature=0.01, items=items)
 
-        if request.scenario_type == "chat":
-            # если AI вернул speaker-формат — конвертим
             if has_speaker_format(scenario):
-                logger.warning("AI returned speaker-format. Converting to interactive.")
+                logger.warning("Retry returned speaker-format. Converting to interactive.")
                 scenario = convert_speaker_to_interactive(scenario)
 
-            # если не интерактивный — ретрай один раз жёстко
-            if not is_interactive_chat_format(scenario):
-                logger.warning("AI returned invalid chat format. Retrying with stricter prompt.")
-                strict_user_prompt = (
-                    user_prompt
-                    + "\n\nВАЖНО: запрещено использовать speaker. Каждый шаг обязан иметь поле type."
-                )
-                scenario = groq_chat_json(system_prompt, strict_user_prompt, temperature=0.01)
+        # финальная проверка
+        if not is_interactive_chat_format(scenario):
+            logger.error("SCENARIO FORMAT ERROR: AI did not follow required message/choice alternation.")
+            raise HTTPException(status_code=500, detail="AI не сгенерировал правильный формат сценария. Попробуйте снова.")
 
-                if has_speaker_format(scenario):
-                    logger.warning("Retry returned speaker-format. Converting to interactive.")
-                    scenario = convert_speaker_to_interactive(scenario)
+        # доп. строгая проверка правильных/неправильных вариантов
+        validate_choice_options_have_one_correct(scenario)
 
-            # финальная проверка
-            if not is_interactive_chat_format(scenario):
-                logger.error("SCENARIO FORMAT ERROR: AI did not follow required message/choice alternation.")
-                raise HTTPException(status_code=500, detail="AI не сгенерировал правильный формат сценария. Попробуйте снова.")
+    return scenario
 
-            # доп. строгая проверка правильных/неправильных вариантов
-            validate_choice_options_have_one_correct(scenario)
 
-        return scenario
+@app.post("/generate-scenario")
+async def generate_scenario(request: ScenarioRequest, http_request: Request, user_data=Depends(verify_token)):
+    logger.info(
+        f"User {user_data.get('user_id')} запросил сценарий: {request.topic} | type={request.scenario_type}"
+    )
+    check_scenario_request(request)
 
+    try:
+        return await response_cache.get_or_generate(
+            scenario_key(request), lambda: build_scenario(request), refresh=wants_fresh(http_request)
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -346,45 +594,78 @@ async def generate_scenario(request: ScenarioRequest, user_data=Depends(verify_t
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/generate-course-from-file")
-async def generate_course_from_file(file: UploadFile = File(...), user_data=Depends(verify_token)):
-    user_id = user_data.get('user_id', 'Unknown')
-    logger.info(f"FILE UPLOAD: User ID {user_id} uploaded {file.filename}")
+@app.post("/generate-scenario/stream")
+async def generate_scenario_stream(request: ScenarioRequest, http_request: Request, user_data=Depends(verify_token)):
+    """Same scenario as /generate-scenario, as server-sent events: chat steps arrive one by one."""
+    logger.info(
+        f"User {user_data.get('user_id')} запросил сценарий (stream): {request.topic} | type={request.scenario_type}"
+    )
+    check_scenario_request(request)
+    return sse_response(
+        scenario_key(request), lambda: build_scenario(request), wants_fresh(http_request), STEP_ITEMS, "Error Scenario"
+    )
 
-    allowed_extensions = [".pdf", ".docx"]
-    file_ext = os.path.splitext(file.filename)[1].lower()
 
-    if file_ext not in allowed_extensions:
-        logger.warning(f"FILE ERROR: Unsupported extension {file_ext}")
-        raise HTTPException(400, "Неподдерживаемый формат. Загрузите PDF или DOCX.")
+COURSE_SYSTEM_PROMPT = """
+Ты профессиональный методист и проектировщик образовательных программ.
+Тебе на вход дается сырой текст из документа (рабочей программы или лекций).
+Твоя задача — проанализировать его и составить полноценную структуру курса.
 
-    try:
-        content = await file.read()
-        extracted_text = ""
+Верни СТРОГО валидный JSON:
+{
+  "course_title": "...",
+  "course_description": "...",
+  "lessons": [
+    {"title": "...", "content": "..."}
+  ]
+}
+Сделай от 3 до 7 уроков в зависимости от объема исходного текста.
+Строки, начинающиеся с # или ##, — заголовки разделов документа: опирайся на них при разбиении на уроки.
+""".strip()
 
-        if file_ext == ".pdf":
-            pdf_doc = fitz.open(stream=content, filetype="pdf")
-            for page in pdf_doc:
-                extracted_text += page.get_text() + "\n"
+# How much document text fits one prompt. Longer documents go through map-reduce:
+# chunk outlines are generated in parallel, then merged into one course
+COURSE_TEXT_LIMIT = 30000
+COURSE_CHUNK_CHARS = 12000
+# Extraction stops after this many characters even in map-reduce mode (bounds the LLM cost of one upload);
+# a course built from the first part only says so in source_truncated/source_chars
+COURSE_DOCUMENT_LIMIT = int(os.getenv("COURSE_DOCUMENT_CHARS", "300000"))
+# Parallel chunk calls of one request (all requests still share LLM_MAX_CONCURRENCY)
+COURSE_MAP_CONCURRENCY = int(os.getenv("COURSE_MAP_CONCURRENCY", "6"))
 
-        elif file_ext == ".docx":
-            doc = docx.Document(io.BytesIO(content))
-            extracted_text = "\n".join([para.text for para in doc.paragraphs])
+COURSE_MAP_PROMPT = """
+Ты профессиональный методист. Тебе дается один фрагмент большого документа (рабочей программы или лекций).
+Выдели темы этого фрагмента как уроки будущего курса.
 
-    except Exception as e:
-        logger.error(f"FILE PARSE ERROR: {str(e)}")
-        raise HTTPException(500, f"Ошибка при чтении файла: {str(e)}")
+Верни СТРОГО валидный JSON:
+{
+  "section_title": "...",
+  "lessons": [
+    {"title": "...", "content": "..."}
+  ]
+}
+Сделай от 1 до 3 уроков. content — сжатый конспект темы (до 1500 символов), без пересказа других фрагментов.
+Строки, начинающиеся с # или ##, — заголовки разделов документа.
+""".strip()
 
-    extracted_text = extracted_text.strip()
-    if len(extracted_text) < 100:
-        raise HTTPException(400, "Файл пуст или текст не удалось распознать (возможно, это сканы без OCR).")
+COURSE_MERGE_PROMPT = """
+Ты профессиональный методист. Тебе даны планы соседних частей одного документа, по порядку.
+Объедини их в один план: убери повторы, объедини близкие темы, сохрани порядок изложения.
 
-    extracted_text = extracted_text[:30000]
+Верни СТРОГО валидный JSON:
+{
+  "section_title": "...",
+  "lessons": [
+    {"title": "...", "content": "..."}
+  ]
+}
+Сделай не больше 8 уроков. content — сжатый конспект темы (до 1500 символов).
+""".strip()
 
-    system_prompt = """
+COURSE_REDUCE_PROMPT = """
 Ты профессиональный методист и проектировщик образовательных программ.
-Тебе на вход дается сырой текст из документа (рабочей программы или лекций).
-Твоя задача — проанализировать его и составить полноценную структуру курса.
+Тебе даны планы всех частей одного документа, по порядку.
+Составь из них единый курс: убери повторы, объедини близкие темы, сохрани логику и порядок изложения.
 
 Верни СТРОГО валидный JSON:
 {
@@ -394,21 +675,196 @@ async def generate_course_from_file(file: UploadFile = File(...), user_data=Depe
     {"title": "...", "content": "..."}
   ]
 }
-Сделай от 3 до 7 уроков в зависимости от объема исходного текста.
+Сделай от 3 до 12 уроков в зависимости от объема документа.
 """.strip()
 
+
+async def gather_or_cancel(coros) -> List[Any]:
+    """asyncio.gather that cancels the remaining calls once one fails (no tokens spent on a lost request)."""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
     try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+def outlines_json(outlines: List[Dict[str, Any]]) -> str:
+    return json.dumps(outlines, ensure_ascii=False)
+
+
+def group_outlines(outlines: List[Dict[str, Any]], max_chars: int) -> List[List[Dict[str, Any]]]:
+    """Neighbouring outlines grouped up to max_chars of JSON; each group has at least two so the count shrinks."""
+    groups: List[List[Dict[str, Any]]] = [[]]
+    size = 0
+    for outline in outlines:
+        outline_size = len(outlines_json([outline]))
+        if len(groups[-1]) >= 2 and size + outline_size > max_chars:
+            groups.append([])
+            size = 0
+        groups[-1].append(outline)
+        size += outline_size
+    return groups
+
+
+async def generate_course_map_reduce(text: str) -> Dict[str, Any]:
+    """
+    Course for a document longer than one prompt.
+
+    Map: every chunk (split at section boundaries) gets its own outline, at most
+    COURSE_MAP_CONCURRENCY calls at a time. Reduce: outlines are merged pairwise-or-more
+    until they fit one prompt, then the final call builds course_title/lessons.
+    Latency grows with the number of rounds (logarithmic), not with the number of chunks.
+    """
+    chunks = split_into_chunks(text, COURSE_CHUNK_CHARS)
+    logger.info(f"AI PARSING: {len(text)} chars -> {len(chunks)} chunks (map-reduce)")
+    await report("progress", {"stage": "map", "chunks": len(chunks)})
+    slots = asyncio.Semaphore(COURSE_MAP_CONCURRENCY)
+    done = 0
+
+    async def outline(index: int, chunk: str) -> Dict[str, Any]:
+        nonlocal done
+        async with slots:
+            result = await groq_chat_json(
+                COURSE_MAP_PROMPT,
+                f"Фрагмент {index + 1} из {len(chunks)}:\n\n{chunk}",
+                temperature=0.2
+            )
+        done += 1
+        await report("progress", {"stage": "chunk", "done": done, "total": len(chunks), "chunk": index + 1})
+        return result
+
+    async def merge(group: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if len(group) == 1:
+            return group[0]
+        async with slots:
+            return await groq_chat_json(
+                COURSE_MERGE_PROMPT,
+                f"Планы частей документа по порядку:\n\n{outlines_json(group)}",
+                temperature=0.2
+            )
+
+    outlines = await gather_or_cancel(outline(i, chunk) for i, chunk in enumerate(chunks))
+    while len(outlines) > 1 and len(outlines_json(outlines)) > COURSE_TEXT_LIMIT:
+        await report("progress", {"stage": "merge", "outlines": len(outlines)})
+        outlines = await gather_or_cancel(merge(group) for group in group_outlines(outlines, COURSE_TEXT_LIMIT))
+
+    await report("progress", {"stage": "reduce"})
+    return await groq_chat_json(
+        COURSE_REDUCE_PROMPT,
+        f"Планы частей документа по порядку:\n\n{outlines_json(outlines)}",
+        temperature=0.2,
+        items=LESSON_ITEMS
+    )
+
+
+async def save_course_upload(file: UploadFile) -> Tuple[str, str, str]:
+    """Checks the extension and spools the upload to disk. Returns (path, file_ext, sha256); the caller removes path."""
+    allowed_extensions = [".pdf", ".docx"]
+    file_ext = os.path.splitext(file.filename)[1].lower()
+
+    if file_ext not in allowed_extensions:
+        logger.warning(f"FILE ERROR: Unsupported extension {file_ext}")
+        raise HTTPException(400, "Неподдерживаемый формат. Загрузите PDF или DOCX.")
+
+    # Chunked copy into our own temp file (hashed on the way): the parser process opens it by path
+    try:
+        path, file_sha256 = await asyncio.to_thread(save_upload, file.file, file_ext, MAX_UPLOAD_BYTES)
+    except UploadTooLarge:
+        logger.warning(f"FILE ERROR: {file.filename} exceeds {MAX_UPLOAD_BYTES} bytes")
+        raise HTTPException(413, too_large_detail(MAX_UPLOAD_BYTES))
+    finally:
+        await file.close()
+    return path, file_ext, file_sha256
+
+def course_key(file_ext: str, file_sha256: str) -> str:
+    # Same file bytes -> same course: a cache hit skips both parsing and the LLM call
+    return make_key("course", PROMPT_VERSIONS["course"], file_sha256=file_sha256, file_ext=file_ext)
+
+async def build_course(path: str, file_ext: str, filename: str) -> Dict[str, Any]:
+    await report("progress", {"stage": "parsing"})
+    try:
+        # One character over the limit tells whether the document goes on past it
+        extracted_text = await document_parser.extract(path, file_ext, COURSE_DOCUMENT_LIMIT + 1)
+    except ParserOverloaded:
+        logger.warning("FILE PARSE OVERLOAD: parser queue is full, upload rejected.")
+        raise HTTPException(
+            status_code=429,
+            detail="Слишком много документов в обработке. Повторите попытку позже.",
+            headers={"Retry-After": "10"},
+        )
+    except ParseTimeout:
+        logger.error(f"FILE PARSE TIMEOUT: {filename}")
+        raise HTTPException(504, "Документ обрабатывается слишком долго. Попробуйте файл меньшего размера.")
+    except ParseFailed as e:
+        logger.error(f"FILE PARSE ERROR: {str(e)}")
+        raise HTTPException(500, f"Ошибка при чтении файла: {str(e)}")
+
+    truncated = len(extracted_text) > COURSE_DOCUMENT_LIMIT
+    extracted_text = extracted_text[:COURSE_DOCUMENT_LIMIT].strip()
+    if len(extracted_text) < 100:
+        raise HTTPException(400, "Файл пуст или текст не удалось распознать (возможно, это сканы без OCR).")
+    if truncated:
+        logger.warning(f"FILE TRUNCATED: {filename} is longer than {COURSE_DOCUMENT_LIMIT} chars, the rest is ignored")
+    await report("progress", {"stage": "parsing_done", "chars": len(extracted_text), "truncated": truncated})
+
+    if len(extracted_text) > COURSE_TEXT_LIMIT:
+        result = await generate_course_map_reduce(extracted_text)
+    else:
         logger.info(f"AI PARSING: Sending {len(extracted_text)} chars to Groq...")
 
-        result = groq_chat_json(
-            system_prompt,
+        result = await groq_chat_json(
+            COURSE_SYSTEM_PROMPT,
             f"Сгенерируй структуру курса на основе этого текста:\n\n{extracted_text}",
-            temperature=0.2
+            temperature=0.2,
+            items=LESSON_ITEMS
         )
 
-        logger.info(f"AI PARSING SUCCESS: Course '{result.get('course_title')}' generated.")
-        return result
+    result["source_truncated"] = truncated
+    result["source_chars"] = len(extracted_text)
+    logger.info(f"AI PARSING SUCCESS: Course '{result.get('course_title')}' generated.")
+    return result
+
+
+@app.post("/generate-course-from-file")
+async def generate_course_from_file(http_request: Request, file: UploadFile = File(...), user_data=Depends(verify_token)):
+    user_id = user_data.get('user_id', 'Unknown')
+    logger.info(f"FILE UPLOAD: User ID {user_id} uploaded {file.filename}")
+
+    path, file_ext, file_sha256 = await save_course_upload(file)
+    try:
+        return await response_cache.get_or_generate(
+            course_key(file_ext, file_sha256),
+            lambda: build_course(path, file_ext, file.filename),
+            refresh=wants_fresh(http_request),
+        )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"AI PARSING ERROR: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Ошибка генерации курса: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Ошибка генерации курса: {str(e)}")
+    finally:
+        os.remove(path)
+
+
+@app.post("/generate-course-from-file/stream")
+async def generate_course_from_file_stream(http_request: Request, file: UploadFile = File(...), user_data=Depends(verify_token)):
+    """
+    Same course as /generate-course-from-file, as server-sent events: parsing and map-reduce
+    progress, then lessons one by one. Upload errors (format, size) are plain HTTP errors.
+    """
+    user_id = user_data.get('user_id', 'Unknown')
+    logger.info(f"FILE UPLOAD: User ID {user_id} uploaded {file.filename} (stream)")
+
+    path, file_ext, file_sha256 = await save_course_upload(file)
+    filename = file.filename
+    return sse_response(
+        course_key(file_ext, file_sha256),
+        lambda: build_course(path, file_ext, filename),
+        wants_fresh(http_request),
+        LESSON_ITEMS,
+        "AI PARSING ERROR",
+        cleanup=lambda: os.remove(path),
+    )
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger("ai_security")
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of user text: NFC, collapsed whitespace, no leading/trailing spaces."""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def make_key(kind: str, prompt_version: int, **parts: Any) -> str:
+    """
+    Content address of a generation: sha256 over the endpoint, its prompt version
+    and the normalized inputs. Changing a prompt means bumping its version.
+    """
+    payload = json.dumps(
+        {"kind": kind, "prompt_version": prompt_version, **parts},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache of generated JSON responses.
+
+    Memory tier: LRU of at most memory_items entries.
+    Disk tier: one JSON file per key under directory, oldest files are evicted
+    once the total size exceeds disk_bytes. Both tiers expire entries after ttl seconds.
+    """
+
+    def __init__(self, directory: str, ttl: float, memory_items: int, disk_bytes: int):
+        self.directory = directory
+        self.ttl = ttl
+        self.memory_items = memory_items
+        self.disk_bytes = disk_bytes
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_size: Optional[int] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    # --- memory tier ---
+
+    def _memory_get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.time() - stored_at >= self.ttl:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return value
+
+    def _memory_set(self, key: str, value: Dict[str, Any], stored_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (stored_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    # --- disk tier ---
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        path = self._path(key)
+        try:
+            stored_at = os.path.getmtime(path)
+            if time.time() - stored_at >= self.ttl:
+                os.remove(path)
+                return None
+            with open(path, encoding="utf-8") as f:
+                return stored_at, json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _disk_set(self, key: str, value: Dict[str, Any]) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        # Write to a temp file and rename: readers never see a half-written entry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._disk_lock:
+            if self._disk_size is None:
+                self._disk_size = sum(size for _, size, _ in self._files())
+            else:
+                self._disk_size += len(data)
+            if self._disk_size > self.disk_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Drops expired files, then the oldest ones, until the tier is below 90% of its budget."""
+        now = time.time()
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in files:
+            if total <= self.disk_bytes * 0.9 and now - mtime < self.ttl:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_size = total
+
+    # --- public API ---
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._memory_get(key)
+        if value is not None:
+            return value
+        # Disk I/O runs in a thread so the event loop is not blocked
+        entry = await asyncio.to_thread(self._disk_get, key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        self._memory_set(key, value, stored_at)
+        return value
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        self._memory_set(key, value, time.time())
+        try:
+            await asyncio.to_thread(self._disk_set, key, value)
+        except OSError as e:
+            # A full or read-only disk must not fail a generation that already succeeded
+            logger.warning(f"CACHE WRITE ERROR: {e}")
+
+    async def get_or_generate(
+        self,
+        key: str,
+        generate: Callable[[], Awaitable[Dict[str, Any]]],
+        refresh: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Cached response for key, or generate() and store it. refresh=True skips the lookup.
+        Identical concurrent requests share one generation instead of paying for it twice.
+        """
+        if not refresh:
+            cached = await self.get(key)
+            if cached is not None:
+                return cached
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await generate()
+            await self.set(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters get the exception; mark it retrieved in case nobody was waiting
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
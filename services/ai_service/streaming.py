@@ -0,0 +1,133 @@
+import asyncio
+import json
+import re
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional
+
+Emitter = Callable[[str, Any], Awaitable[None]]
+
+# Set only inside a streaming request: generation code reports progress through report()
+# and stays unchanged for the plain JSON endpoints, where reporting is a no-op
+progress_emitter: ContextVar[Optional[Emitter]] = ContextVar("progress_emitter", default=None)
+
+# Comment line sent while nothing happens, so proxies do not close an idle stream
+HEARTBEAT_SECONDS = 15
+
+
+def is_streaming() -> bool:
+    return progress_emitter.get() is not None
+
+
+async def report(event: str, data: Any) -> None:
+    emit = progress_emitter.get()
+    if emit is not None:
+        await emit(event, data)
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def sse_events(produce: Callable[[], Awaitable[None]]) -> AsyncIterator[str]:
+    """
+    Runs produce() in a background task with an emitter bound and yields what it reports
+    as server-sent events. If the client disconnects the task is cancelled, so no more
+    tokens are spent on a response nobody reads.
+    """
+    queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+
+    async def emit(event: str, data: Any) -> None:
+        await queue.put(sse_event(event, data))
+
+    async def run() -> None:
+        progress_emitter.set(emit)
+        try:
+            await produce()
+        finally:
+            await queue.put(None)
+
+    task = asyncio.create_task(run())
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if message is None:
+                break
+            yield message
+    finally:
+        task.cancel()
+
+
+class JsonArrayStream:
+    """
+    Incremental parser for one array of a JSON object that arrives in pieces.
+
+    feed() takes the next piece of model output and returns the elements of
+    "<key>": [...] completed so far, long before the whole answer is valid JSON.
+    Only object and array elements are returned; a broken element is skipped.
+    """
+
+    def __init__(self, key: str):
+        self._start_re = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._buffer = ""
+        self._pos: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item_start: Optional[int] = None
+        self._done = False
+
+    def feed(self, text: str) -> List[Any]:
+        self._buffer += text
+        if self._done:
+            return []
+        if self._pos is None:
+            match = self._start_re.search(self._buffer)
+            if match is None:
+                return []
+            self._pos = match.end()
+
+        items = []
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0:
+                    self._item_start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    # Closing bracket of the array itself
+                    self._done = True
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._item_start is not None:
+                    try:
+                        items.append(json.loads(buffer[self._item_start:i + 1]))
+                    except ValueError:
+                        pass
+                    self._item_start = None
+            i += 1
+        self._pos = i
+        return items
+
+
+def parse_streamed_json(text: str) -> Any:
+    """Whole streamed answer as JSON; prose or code fences around the object are ignored."""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("AI не вернул JSON.")
+    return json.loads(text[start:end + 1])
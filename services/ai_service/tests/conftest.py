@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# main reads its configuration at import time: a small upload cap and a throwaway cache directory
+os.environ.setdefault("MAX_UPLOAD_MB", "1")
+os.environ.setdefault("AI_CACHE_DIR", tempfile.mkdtemp(prefix="ai-cache-"))
+os.environ.setdefault("GROQ_API_KEY", "test-key")
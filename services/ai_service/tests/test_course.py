@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+import main
+
+
+def build_course(monkeypatch, text):
+    calls = {}
+
+    async def extract(path, file_ext, max_chars):
+        calls["max_chars"] = max_chars
+        return text[:max_chars]
+
+    async def chat(system_prompt, user_prompt, temperature=0.2, items=None):
+        calls["prompt"] = user_prompt
+        return {"course_title": "Курс", "course_description": "", "lessons": []}
+
+    monkeypatch.setattr(main.document_parser, "extract", extract)
+    monkeypatch.setattr(main, "groq_chat_json", chat)
+    return asyncio.run(main.build_course("doc.pdf", ".pdf", "doc.pdf")), calls
+
+
+def test_course_from_long_document_reports_truncation(monkeypatch):
+    monkeypatch.setattr(main, "COURSE_DOCUMENT_LIMIT", 1000)
+
+    result, calls = build_course(monkeypatch, "а" * 5000)
+
+    assert calls["max_chars"] == 1001
+    assert result["source_truncated"] is True
+    assert result["source_chars"] == 1000
+    assert "а" * 1000 in calls["prompt"] and "а" * 1001 not in calls["prompt"]
+
+
+def test_course_from_whole_document_is_not_truncated(monkeypatch):
+    monkeypatch.setattr(main, "COURSE_DOCUMENT_LIMIT", 1000)
+
+    result, _ = build_course(monkeypatch, "б" * 1000)
+
+    assert result["source_truncated"] is False
+    assert result["source_chars"] == 1000
+
+
+def test_long_document_goes_through_map_and_reduce(monkeypatch):
+    monkeypatch.setattr(main, "COURSE_CHUNK_CHARS", 1000)
+    monkeypatch.setattr(main, "COURSE_TEXT_LIMIT", 2000)
+    text = "\n".join(f"# Раздел {number}\n" + "текст " * 150 for number in range(12))
+    calls = []
+
+    async def chat(system_prompt, user_prompt, temperature=0.2, items=None):
+        calls.append(system_prompt)
+        if system_prompt == main.COURSE_REDUCE_PROMPT:
+            assert items is main.LESSON_ITEMS
+            return {"course_title": "Курс", "course_description": "", "lessons": [{"title": "Итог", "content": ""}]}
+        # Outlines are large enough that they need a merge round before the final call
+        return {"section_title": "Часть", "lessons": [{"title": "Тема", "content": "к" * 400}]}
+
+    monkeypatch.setattr(main, "groq_chat_json", chat)
+    result = asyncio.run(main.generate_course_map_reduce(text))
+
+    chunks = main.split_into_chunks(text, 1000)
+    assert len(chunks) == 12
+    assert calls.count(main.COURSE_MAP_PROMPT) == 12
+    assert calls.count(main.COURSE_MERGE_PROMPT) > 0
+    assert calls[-1] == main.COURSE_REDUCE_PROMPT and calls.count(main.COURSE_REDUCE_PROMPT) == 1
+    assert result["course_title"] == "Курс"
+
+
+def test_group_outlines_always_shrinks_the_list():
+    outlines = [{"lessons": [{"content": "x" * 500}]} for _ in range(7)]
+
+    groups = main.group_outlines(outlines, 100)
+
+    assert sum(len(group) for group in groups) == 7
+    assert len(groups) < 7
+    assert all(len(group) >= 2 for group in groups[:-1])
+
+
+def test_failed_chunk_cancels_the_other_calls(monkeypatch):
+    monkeypatch.setattr(main, "COURSE_CHUNK_CHARS", 1000)
+    text = "\n".join(f"# Раздел {number}\n" + "текст " * 150 for number in range(6))
+    cancelled = []
+
+    async def chat(system_prompt, user_prompt, temperature=0.2, items=None):
+        if "Фрагмент 1 " in user_prompt:
+            raise RuntimeError("LLM error")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    monkeypatch.setattr(main, "groq_chat_json", chat)
+    with pytest.raises(RuntimeError):
+        asyncio.run(main.generate_course_map_reduce(text))
+    assert cancelled
@@ -0,0 +1,140 @@
+import asyncio
+
+import docx
+import fitz
+import pytest
+from fastapi import HTTPException
+
+import main
+from extraction import (
+    DocumentParser,
+    ParseFailed,
+    ParserOverloaded,
+    ParseTimeout,
+    extract_text,
+    split_into_chunks,
+    take_chars,
+)
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / "lectures.pdf"
+    document = fitz.open()
+    for number in range(1, 4):
+        page = document.new_page()
+        # Default PDF font has no Cyrillic glyphs
+        page.insert_text((72, 30), "Security course - running header", fontsize=9)
+        page.insert_text((72, 100), f"Topic {number}", fontsize=20)
+        page.insert_text((72, 140), f"Lecture {number} text about phishing.", fontsize=11)
+        page.insert_text((72, 160), "One more line of body text.", fontsize=11)
+        page.insert_text((300, page.rect.height - 20), f"Page {number}", fontsize=9)
+    document.save(path)
+    return path
+
+
+def test_pdf_text_keeps_headings_and_drops_repeated_margins(pdf_path):
+    text = extract_text(str(pdf_path), ".pdf", 10000)
+
+    assert "# Topic 2" in text
+    assert "Lecture 3 text about phishing." in text
+    # Running header and page numbers are kept once, on the first page only
+    assert text.count("running header") == 1
+    assert text.count("Page") == 1
+
+
+def test_docx_headings_become_markdown(tmp_path):
+    path = tmp_path / "program.docx"
+    document = docx.Document()
+    document.add_heading("Программа", level=0)
+    document.add_heading("Раздел 1", level=1)
+    document.add_paragraph("Текст раздела.")
+    document.save(path)
+
+    assert extract_text(str(path), ".docx", 10000).split("\n") == ["# Программа", "## Раздел 1", "Текст раздела."]
+
+
+def test_take_chars_stops_reading_at_the_limit():
+    consumed = []
+
+    def pieces():
+        for number in range(100):
+            consumed.append(number)
+            yield "x" * 10
+
+    assert len(take_chars(pieces(), 25)) == 25
+    assert len(consumed) == 3
+
+
+def test_split_into_chunks_cuts_between_sections():
+    sections = [f"# Раздел {number}\n" + "строка\n" * 20 for number in range(6)]
+    text = "".join(sections).strip()
+
+    chunks = split_into_chunks(text, 400)
+
+    assert all(len(chunk) <= 400 for chunk in chunks)
+    assert "\n".join(chunks) == text
+    # Every chunk starts at a section heading
+    assert all(chunk.startswith("# Раздел") for chunk in chunks)
+
+
+def test_split_into_chunks_cuts_oversized_sections_and_lines():
+    text = "# Огромный раздел\n" + "слово " * 500 + "\n" + "a" * 1000
+
+    chunks = split_into_chunks(text, 300)
+
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    assert "".join(chunks).replace("\n", "") == text.replace("\n", "")
+
+
+def test_parser_process_extracts_text(pdf_path):
+    parser = DocumentParser(workers=1, queue_limit=0, timeout=60, memory_mb=1024)
+
+    text = asyncio.run(parser.extract(str(pdf_path), ".pdf", 10000))
+
+    assert "# Topic 1" in text
+
+
+def test_parser_process_over_memory_limit_fails(pdf_path):
+    # The address-space limit is far below what the parser needs: the job dies, the worker does not
+    parser = DocumentParser(workers=1, queue_limit=0, timeout=60, memory_mb=1)
+
+    with pytest.raises(ParseFailed):
+        asyncio.run(parser.extract(str(pdf_path), ".pdf", 10000))
+
+
+def test_parser_process_timeout_is_killed(pdf_path):
+    parser = DocumentParser(workers=1, queue_limit=0, timeout=0.001, memory_mb=1024)
+
+    with pytest.raises(ParseTimeout):
+        asyncio.run(parser.extract(str(pdf_path), ".pdf", 10000))
+
+
+def test_parser_rejects_jobs_over_the_queue_limit(pdf_path):
+    parser = DocumentParser(workers=1, queue_limit=0, timeout=60, memory_mb=1024)
+
+    async def scenario():
+        return await asyncio.gather(
+            *(parser.extract(str(pdf_path), ".pdf", 10000) for _ in range(2)), return_exceptions=True
+        )
+
+    outcomes = asyncio.run(scenario())
+    assert isinstance(outcomes[0], str)
+    assert isinstance(outcomes[1], ParserOverloaded)
+
+
+@pytest.mark.parametrize(
+    "error, status",
+    [(ParserOverloaded(), 429), (ParseTimeout(), 504), (ParseFailed("сбой"), 500)],
+)
+def test_parser_failures_map_to_http_errors(monkeypatch, error, status):
+    async def extract(path, file_ext, max_chars):
+        raise error
+
+    monkeypatch.setattr(main.document_parser, "extract", extract)
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(main.build_course("doc.pdf", ".pdf", "doc.pdf"))
+    assert raised.value.status_code == status
+    if status == 429:
+        assert raised.value.headers == {"Retry-After": "10"}
@@ -0,0 +1,72 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from groq import APITimeoutError
+
+import main
+
+
+def fake_client(create):
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def test_groq_chat_json_parses_json_mode_answer(monkeypatch):
+    async def create(**kwargs):
+        assert kwargs["response_format"] == {"type": "json_object"}
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='```json\n{"a": 1}\n```'))])
+
+    monkeypatch.setattr(main, "client", fake_client(create))
+
+    assert asyncio.run(main.groq_chat_json("system", "user")) == {"a": 1}
+
+
+def test_groq_chat_json_limits_concurrent_calls(monkeypatch):
+    in_flight = []
+    peak = []
+
+    async def create(**kwargs):
+        in_flight.append(1)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.02)
+        in_flight.pop()
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="{}"))])
+
+    monkeypatch.setattr(main, "client", fake_client(create))
+
+    async def scenario():
+        monkeypatch.setattr(main, "llm_slots", asyncio.Semaphore(2))
+        await asyncio.gather(*(main.groq_chat_json("system", "user") for _ in range(6)))
+
+    asyncio.run(scenario())
+    assert max(peak) == 2
+
+
+def test_groq_chat_json_rejects_when_no_slot_frees_up(monkeypatch):
+    monkeypatch.setattr(main, "LLM_QUEUE_TIMEOUT", 0.01)
+
+    async def scenario():
+        monkeypatch.setattr(main, "llm_slots", asyncio.Semaphore(0))
+        await main.groq_chat_json("system", "user")
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(scenario())
+    assert raised.value.status_code == 503
+
+
+def test_groq_chat_json_maps_llm_timeout_to_504_and_frees_the_slot(monkeypatch):
+    async def create(**kwargs):
+        raise APITimeoutError(request=httpx.Request("POST", "https://api.groq.com"))
+
+    monkeypatch.setattr(main, "client", fake_client(create))
+
+    async def scenario():
+        slots = asyncio.Semaphore(1)
+        monkeypatch.setattr(main, "llm_slots", slots)
+        with pytest.raises(HTTPException) as raised:
+            await main.groq_chat_json("system", "user")
+        return raised.value.status_code, slots.locked()
+
+    assert asyncio.run(scenario()) == (504, False)
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import time
+
+from response_cache import ResponseCache, make_key, normalize_text
+
+
+def make_cache(tmp_path, **options):
+    params = dict(directory=str(tmp_path), ttl=60, memory_items=8, disk_bytes=1024 * 1024)
+    params.update(options)
+    return ResponseCache(**params)
+
+
+def test_key_depends_on_normalized_input_and_prompt_version():
+    assert normalize_text("  Фишинг\n\tэто  ") == "Фишинг это"
+    assert make_key("quiz", 1, text="a  b") != make_key("quiz", 1, text="a b")
+    assert make_key("quiz", 1, text=normalize_text("a  b")) == make_key("quiz", 1, text="a b")
+    assert make_key("quiz", 1, text="a") != make_key("quiz", 2, text="a")
+
+
+def test_miss_generates_and_hit_is_served_from_memory_and_disk(tmp_path):
+    cache = make_cache(tmp_path)
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        return {"value": len(calls)}
+
+    async def scenario():
+        first = await cache.get_or_generate("k" * 64, generate)
+        second = await cache.get_or_generate("k" * 64, generate)
+        # A new worker (empty memory tier) reads the entry from disk
+        from_disk = await make_cache(tmp_path).get("k" * 64)
+        refreshed = await cache.get_or_generate("k" * 64, generate, refresh=True)
+        return first, second, from_disk, refreshed
+
+    first, second, from_disk, refreshed = asyncio.run(scenario())
+    assert first == second == from_disk == {"value": 1}
+    assert refreshed == {"value": 2}
+    assert len(calls) == 2
+
+
+def test_identical_concurrent_requests_share_one_generation(tmp_path):
+    cache = make_cache(tmp_path)
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"ok": True}
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_generate("same", generate) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == [{"ok": True}] * 5
+    assert len(calls) == 1
+
+
+def test_expired_entries_are_regenerated(tmp_path):
+    cache = make_cache(tmp_path, ttl=60)
+    asyncio.run(cache.set("old", {"v": 1}))
+    path = cache._path("old")
+    stale = time.time() - 120
+    os.utime(path, (stale, stale))
+
+    assert asyncio.run(make_cache(tmp_path, ttl=60).get("old")) is None
+    assert not os.path.exists(path)
+
+
+def test_disk_tier_evicts_oldest_entries(tmp_path):
+    cache = make_cache(tmp_path, disk_bytes=2000)
+
+    async def fill():
+        for number in range(10):
+            await cache.set(f"{number:02d}" * 32, {"payload": "x" * 300})
+            path = cache._path(f"{number:02d}" * 32)
+            os.utime(path, (number, time.time() - 10 + number))
+
+    asyncio.run(fill())
+    sizes = sum(size for _, size, _ in cache._files())
+    assert sizes <= 2000
+    # The newest entry survives eviction
+    assert os.path.exists(cache._path("09" * 32))
@@ -0,0 +1,139 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+
+import main
+import streaming
+from streaming import JsonArrayStream, parse_streamed_json, report, sse_event, sse_events
+
+QUIZ = {
+    "generated_questions": [
+        {"question": "Это фишинг?", "options": ["Да", "Нет"], "correct_answer": "0"},
+        {"question": "", "options": ["a", "b"]},
+        {"question": "Скобки {в тексте]", "options": ["x", "y", "z"], "correct_answer": "1"},
+    ]
+}
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith(":"))
+        if fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_json_array_stream_returns_elements_as_they_complete(size):
+    text = "```json\n" + json.dumps(QUIZ, ensure_ascii=False) + "\n```"
+    stream = JsonArrayStream("generated_questions")
+
+    items = []
+    for i in range(0, len(text), size):
+        items.extend(stream.feed(text[i:i + size]))
+
+    assert items == QUIZ["generated_questions"]
+    assert parse_streamed_json(text) == QUIZ
+
+
+def test_json_array_stream_reports_an_element_before_the_answer_ends():
+    stream = JsonArrayStream("lessons")
+
+    assert stream.feed('{"course_title": "К", "lessons": [{"title": "1", "content": "a"}, {"ti') == [
+        {"title": "1", "content": "a"}
+    ]
+    assert stream.feed('tle": "2", "content": "b"}]}') == [{"title": "2", "content": "b"}]
+
+
+def test_sse_event_framing():
+    assert sse_event("question", {"q": "Да"}) == 'event: question\ndata: {"q": "Да"}\n\n'
+
+
+def test_sse_events_yields_reports_and_heartbeats(monkeypatch):
+    monkeypatch.setattr(streaming, "HEARTBEAT_SECONDS", 0.01)
+
+    async def produce():
+        await report("progress", {"stage": "generating"})
+        await asyncio.sleep(0.05)
+        await report("result", {"ok": True})
+
+    async def collect():
+        return [message async for message in sse_events(produce)]
+
+    messages = asyncio.run(collect())
+    assert messages[0] == sse_event("progress", {"stage": "generating"})
+    assert ": ping\n\n" in messages
+    assert messages[-1] == sse_event("result", {"ok": True})
+
+
+def test_report_outside_a_stream_is_a_no_op():
+    asyncio.run(report("progress", {"stage": "generating"}))
+
+
+def test_quiz_stream_endpoint_sends_questions_then_result(monkeypatch, tmp_path):
+    answer = "```json\n" + json.dumps(QUIZ, ensure_ascii=False) + "\n```"
+    calls = []
+
+    async def chunks():
+        for i in range(0, len(answer), 5):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=answer[i:i + 5]))])
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        # Groq JSON mode is not used for streamed completions
+        assert kwargs["stream"] is True and "response_format" not in kwargs
+        return chunks()
+
+    monkeypatch.setattr(main, "client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    monkeypatch.setattr(main, "response_cache", main.ResponseCache(str(tmp_path), 60, 8, 1024 * 1024))
+    token = jwt.encode({"user_id": 1}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+    payload = {"text": "Текст урока о фишинговых письмах", "count": 3, "difficulty": "easy"}
+
+    with TestClient(main.app) as client:
+        res = client.post("/generate-quiz/stream", json=payload, headers={"Authorization": f"Bearer {token}"})
+        cached = client.post("/generate-quiz/stream", json=payload, headers={"Authorization": f"Bearer {token}"})
+
+    assert res.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(res.text)
+    assert events[0] == ("progress", {"stage": "generating"})
+    # The question without text is not sent on its own, but stays in the full result
+    assert [data for event, data in events if event == "question"] == [
+        QUIZ["generated_questions"][0], QUIZ["generated_questions"][2]
+    ]
+    assert events[-1] == ("result", QUIZ)
+
+    # A cache hit replays the items without calling the model
+    cached_events = parse_sse(cached.text)
+    assert cached_events[0] == ("progress", {"stage": "cache_hit"})
+    assert cached_events[-1] == ("result", QUIZ)
+    assert len(calls) == 1
+
+
+def test_stream_endpoint_reports_errors_as_events(monkeypatch, tmp_path):
+    async def create(**kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(main, "client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    monkeypatch.setattr(main, "response_cache", main.ResponseCache(str(tmp_path), 60, 8, 1024 * 1024))
+    token = jwt.encode({"user_id": 1}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+
+    with TestClient(main.app) as client:
+        res = client.post(
+            "/generate-quiz/stream",
+            json={"text": "Текст урока о фишинге", "count": 1, "difficulty": "easy"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        short = client.post(
+            "/generate-quiz/stream",
+            json={"text": "коротко", "count": 1, "difficulty": "easy"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    assert parse_sse(res.text)[-1] == ("error", {"status": 500, "detail": "boom"})
+    # Validation fails before the stream starts: a plain HTTP error
+    assert short.status_code == 400
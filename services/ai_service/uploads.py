@@ -0,0 +1,105 @@
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Iterable, Tuple
+
+from fastapi.responses import JSONResponse
+
+# Multipart boundaries and form fields on top of the file itself
+FORM_OVERHEAD = 64 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """The uploaded file is larger than the configured limit."""
+
+
+def too_large_detail(max_bytes: int) -> str:
+    return f"Файл слишком большой. Максимальный размер — {max_bytes // (1024 * 1024)} МБ."
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Hard cap on request bodies of upload endpoints, enforced while the body streams in.
+
+    A declared Content-Length over the limit is rejected before anything is read;
+    otherwise the received bytes are counted, and once they exceed the limit the app
+    sees a disconnected client and the middleware itself answers 413. Register it
+    outermost, so no other middleware can turn the cut-off body into another response.
+    """
+
+    def __init__(self, app, paths: Iterable[str], max_bytes: int):
+        self.app = app
+        self.paths = tuple(paths)
+        self.max_body = max_bytes + FORM_OVERHEAD
+        self.detail = too_large_detail(max_bytes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].endswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_body:
+            await JSONResponse({"detail": self.detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            if exceeded:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    # Nothing more is read from the client
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded:
+                # Whatever the app answers to the cut-off body (400, 500) is replaced by the 413 below
+                return
+            response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not response_started:
+            await JSONResponse({"detail": self.detail}, status_code=413)(scope, receive, send)
+
+
+def save_upload(source: BinaryIO, suffix: str, max_bytes: int) -> Tuple[str, str]:
+    """
+    Copies an uploaded file to a temp file on disk in fixed-size chunks.
+    Returns (path, sha256 of the content); the caller removes the file.
+    Raises UploadTooLarge as soon as the copied size exceeds max_bytes.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as target:
+            source.seek(0)
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge()
+                digest.update(chunk)
+                target.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
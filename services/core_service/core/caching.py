@@ -0,0 +1,13 @@
+from django.conf import settings
+
+
+def cache_timeout(timeout):
+    """
+    Срок жизни записи кеша с учетом бэкенда: в общем кеше (Redis) — как задано,
+    в локальной памяти процесса — не дольше LOCAL_CACHE_SECONDS (None тоже ограничивается).
+    """
+    if settings.CACHE_IS_SHARED:
+        return timeout
+    if timeout is None:
+        return settings.LOCAL_CACHE_SECONDS
+    return min(timeout, settings.LOCAL_CACHE_SECONDS)
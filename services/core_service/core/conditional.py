@@ -0,0 +1,48 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Слабый ETag из произвольных частей (версии контента, пользователь, прогресс)."""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return 'W/' + quote_etag(digest)
+
+
+class ConditionalRetrieveMixin:
+    """
+    Условный GET для retrieve-представлений.
+
+    Представление реализует get_validators() и возвращает (etag, last_modified) по дешевым
+    запросам к меткам времени. Если у клиента уже актуальная версия, отвечаем 304 до загрузки
+    объекта и сериализации. None — проверка невозможна (например, нет доступа), идем обычным путем.
+    """
+
+    def get_validators(self):
+        raise NotImplementedError
+
+    def retrieve(self, request, *args, **kwargs):
+        validators = self.get_validators()
+        if validators is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        etag, last_modified = validators
+        not_modified = get_conditional_response(
+            request._request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+        if not_modified is not None:
+            return self.set_validator_headers(not_modified, etag, last_modified)
+        response = super().retrieve(request, *args, **kwargs)
+        return self.set_validator_headers(response, etag, last_modified)
+
+    def set_validator_headers(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        # Ответ зависит от пользователя: общие кеши его не хранят, браузер всегда перепроверяет
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
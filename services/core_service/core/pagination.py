@@ -0,0 +1,31 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+# Курсорная (keyset) пагинация: страница выбирается по WHERE на индексированных колонках,
+# а не через OFFSET, поэтому время ответа не растет с номером страницы
+class StableCursorPagination(CursorPagination):
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+    ordering = ('-id',)
+
+
+class CoursePagination(StableCursorPagination):
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        # Результаты полнотекстового поиска отдаем по релевантности (courses/search.py)
+        if 'search_rank' in queryset.query.annotations:
+            return ('-search_rank', '-id')
+        return super().get_ordering(request, queryset, view)
+
+
+class ResultPagination(StableCursorPagination):
+    ordering = ('-completed_at', '-id')
+
+
+class CategoryPagination(StableCursorPagination):
+    # Категорий мало, а фронтенд рисует их одним списком фильтров
+    page_size = settings.API_MAX_PAGE_SIZE
+    ordering = ('id',)
@@ -29,6 +29,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     'drf_spectacular',
     'django_prometheus', # ✅ Мониторинг
@@ -103,6 +104,37 @@ DATABASES = {
 }
 
 
+# =========================
+# CACHE
+# =========================
+
+# Redis, если задан REDIS_URL (общий кеш для всех воркеров), иначе локальная память процесса
+# с вытеснением давно неиспользуемых записей (LocMemCache работает как LRU)
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'saqbol-core',
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.environ.get('LOCMEM_CACHE_MAX_ENTRIES', 5000)),
+            },
+        }
+    }
+
+# Локальный кеш не общий: версию, поднятую сигналом в одном воркере, остальные не видят.
+# Поэтому без Redis версии и записи кеша живут не дольше LOCAL_CACHE_SECONDS (core/caching.py) —
+# столько другие воркеры могут отдавать устаревшие данные, например доступ после отмены записи
+CACHE_IS_SHARED = bool(os.environ.get('REDIS_URL'))
+LOCAL_CACHE_SECONDS = int(os.environ.get('LOCAL_CACHE_SECONDS', 30))
+
+
 # =========================
 # AUTH & PASSWORDS (ИБ)
 # =========================
@@ -178,6 +210,19 @@ REST_FRAMEWORK = {
     }
 }
 
+# Курсорная пагинация списков (core/pagination.py)
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 20))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 100))
+
+# Отложенная запись результатов тестов (quizzes/ingest.py): на пике экзаменов оценка
+# сохраняется в локальный spool-файл, а фоновый поток переносит его в БД пачками
+QUIZ_RESULTS_WRITE_BEHIND = os.environ.get('QUIZ_RESULTS_WRITE_BEHIND', 'False') == 'True'
+QUIZ_RESULTS_SPOOL_DIR = os.environ.get('QUIZ_RESULTS_SPOOL_DIR', os.path.join(BASE_DIR, 'spool', 'quiz_results'))
+QUIZ_RESULTS_FLUSH_INTERVAL = float(os.environ.get('QUIZ_RESULTS_FLUSH_INTERVAL', 1.0))
+
+# Таблицы лидеров по XP (courses/leaderboard.py) собираются из агрегатов не чаще раза в N секунд
+LEADERBOARD_CACHE_SECONDS = int(os.environ.get('LEADERBOARD_CACHE_SECONDS', 60))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -0,0 +1,69 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from core.caching import cache_timeout
+
+from .models import Course, Enrollment
+
+# Множества курсов пользователя кешируются под ключом с версией; запись на курс и смена
+# преподавателя поднимают версию (courses/signals.py), старая запись просто перестает читаться
+# (без общего кеша версия видна только своему воркеру, поэтому записи там живут недолго: core/caching.py)
+ACCESS_VERSION_KEY = 'courses:access-version:{user_id}'
+ACCESS_KEY = 'courses:access:{user_id}:{version}'
+ACCESS_TIMEOUT = 60 * 60 * 24
+
+
+class CourseAccess:
+    """Решения о доступе пользователя к курсам по заранее загруженным множествам id."""
+
+    def __init__(self, user, enrolled, taught):
+        self.user = user
+        self.enrolled = enrolled
+        self.taught = taught
+
+    def can_edit(self, course_id):
+        return self.user.is_staff or int(course_id) in self.taught
+
+    def can_view(self, course_id):
+        return self.can_edit(course_id) or int(course_id) in self.enrolled
+
+
+def get_access_version(user_id):
+    return cache.get_or_set(ACCESS_VERSION_KEY.format(user_id=user_id), time.time_ns, timeout=cache_timeout(None))
+
+
+def bump_access_version(user_id):
+    key = ACCESS_VERSION_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=cache_timeout(None))
+
+
+def schedule_access_bump(*user_ids):
+    # Версию поднимаем после коммита, чтобы параллельный запрос не закешировал старые множества
+    for user_id in set(user_ids) - {None}:
+        transaction.on_commit(lambda user_id=user_id: bump_access_version(user_id))
+
+
+def load_course_access(user):
+    key = ACCESS_KEY.format(user_id=user.pk, version=get_access_version(user.pk))
+    sets = cache.get(key)
+    if sets is None:
+        sets = {
+            'enrolled': frozenset(Enrollment.objects.filter(student=user).values_list('course_id', flat=True)),
+            'taught': frozenset(Course.objects.filter(teacher=user).values_list('id', flat=True)),
+        }
+        cache.set(key, sets, cache_timeout(ACCESS_TIMEOUT))
+    return CourseAccess(user, sets['enrolled'], sets['taught'])
+
+
+def get_course_access(request):
+    """Доступ текущего пользователя к курсам; загружается один раз за запрос."""
+    access = getattr(request, '_course_access', None)
+    if access is None:
+        access = load_course_access(request.user)
+        request._course_access = access
+    return access
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Course, Lesson, Enrollment, LessonStep, StepProgress
+from .models import Category, Course, Lesson, Enrollment, LessonStep, StepProgress, CourseProgress, DailyXP
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -32,4 +32,15 @@ class EnrollmentAdmin(admin.ModelAdmin):
 # ДОБАВЛЕНО:
 @admin.register(StepProgress)
 class StepProgressAdmin(admin.ModelAdmin):
-    list_display = ('student', 'step', 'is_completed', 'score_earned')
\ No newline at end of file
+    list_display = ('student', 'step', 'is_completed', 'score_earned')
+
+@admin.register(CourseProgress)
+class CourseProgressAdmin(admin.ModelAdmin):
+    list_display = ('student', 'course', 'completed_steps', 'total_steps', 'xp', 'last_activity')
+    list_filter = ('course',)
+
+@admin.register(DailyXP)
+class DailyXPAdmin(admin.ModelAdmin):
+    list_display = ('student', 'course', 'day', 'xp')
+    list_filter = ('course',)
+    date_hierarchy = 'day'
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CoursesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'courses'
+
+    def ready(self):
+        # Подключаем обработчики сигналов (инвалидация кешей и индексов)
+        from . import signals  # noqa: F401
@@ -0,0 +1,116 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from core.caching import cache_timeout
+
+from .models import Course
+
+# Версия индекса лежит в общем кеше: любой процесс, изменивший курс, поднимает ее,
+# и остальные воркеры пересобирают свою копию индекса при следующем запросе
+INDEX_VERSION_KEY = 'courses:autocomplete:version'
+
+# Минимальная доля триграмм запроса, найденных в названии (аналог порога pg_trgm)
+SIMILARITY_THRESHOLD = 0.45
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    return ' '.join(_WORD_RE.findall((text or '').lower().replace('ё', 'е')))
+
+
+def trigrams(text, partial_tail=False):
+    """
+    Триграммы как в pg_trgm: каждое слово дополняется двумя пробелами слева и одним справа.
+    partial_tail=True не закрывает последнее слово — пользователь его еще печатает.
+    """
+    words = text.split()
+    grams = set()
+    for i, word in enumerate(words):
+        is_tail = partial_tail and i == len(words) - 1
+        padded = f'  {word}' if is_tail else f'  {word} '
+        grams.update(padded[j:j + 3] for j in range(len(padded) - 2))
+    return grams
+
+
+class TitleIndex:
+    """In-process индекс названий курсов: префиксы слов + триграммы для опечаток."""
+
+    def __init__(self, rows):
+        self.titles = {}
+        self.postings = defaultdict(set)
+        words = []
+        for course_id, title in rows:
+            self.titles[course_id] = title
+            normalized = normalize(title)
+            for gram in trigrams(normalized):
+                self.postings[gram].add(course_id)
+            words.extend((word, course_id) for word in normalized.split())
+        words.sort()
+        self.words = words
+
+    def _prefix_matches(self, prefix, limit):
+        found = []
+        position = bisect_left(self.words, (prefix,))
+        while position < len(self.words) and len(found) < limit:
+            word, course_id = self.words[position]
+            if not word.startswith(prefix):
+                break
+            if course_id not in found:
+                found.append(course_id)
+            position += 1
+        return found
+
+    def search(self, query, limit=8):
+        query = normalize(query)
+        if not query:
+            return []
+
+        scores = {}
+        # 1. Точные совпадения по началу любого слова названия идут первыми
+        for course_id in self._prefix_matches(query.split()[-1], limit * 4):
+            if query in normalize(self.titles[course_id]):
+                scores[course_id] = 2.0
+
+        # 2. Нечеткий поиск: доля общих триграмм выдерживает опечатки и перестановки
+        query_grams = trigrams(query, partial_tail=True)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for course_id in self.postings.get(gram, ()):
+                shared[course_id] += 1
+        for course_id, count in shared.items():
+            similarity = count / len(query_grams)
+            if similarity >= SIMILARITY_THRESHOLD:
+                scores[course_id] = max(scores.get(course_id, 0), similarity)
+
+        ranked = sorted(scores, key=lambda cid: (-scores[cid], len(self.titles[cid]), cid))
+        return [{'id': course_id, 'title': self.titles[course_id]} for course_id in ranked[:limit]]
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def get_title_index():
+    global _index, _index_version
+    version = cache.get_or_set(INDEX_VERSION_KEY, time.time_ns, timeout=cache_timeout(None))
+    if _index is None or _index_version != version:
+        with _lock:
+            if _index is None or _index_version != version:
+                _index = TitleIndex(Course.objects.values_list('id', 'title').iterator())
+                _index_version = version
+    return _index
+
+
+def invalidate_title_index():
+    try:
+        cache.incr(INDEX_VERSION_KEY)
+    except ValueError:
+        # Ключ вытеснен из кеша: новая уникальная версия заставит всех пересобрать индекс
+        cache.set(INDEX_VERSION_KEY, time.time_ns(), timeout=cache_timeout(None))
@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import CourseProgress, DailyXP
+
+# Окна таблиц лидеров: None — за все время (CourseProgress.xp), иначе последние N дней (DailyXP)
+WINDOWS = {'all': None, 'week': 7, 'month': 30}
+
+# Ключ включает первый день окна: в полночь окно сдвигается, и таблица собирается заново
+LEADERBOARD_KEY = 'courses:leaderboard:{scope}:{scope_id}:{window}:{start}'
+
+# Сколько таблиц держим в памяти процесса
+LEADERBOARDS_MAX = 256
+
+
+class Leaderboard:
+    """
+    Таблица лидеров в памяти: массивы id студентов и XP, отсортированные по убыванию XP.
+    Топ — срез массива, место студента — два бинарных поиска, без запросов к БД.
+    Одинаковый XP — одинаковое место (1, 2, 2, 4).
+    """
+
+    def __init__(self, student_ids, xp):
+        order = np.lexsort((student_ids, -xp))
+        self.student_ids = student_ids[order]
+        self.xp = xp[order]
+        # Для бинарного поиска нужны возрастающие массивы
+        self._descending = -self.xp
+        self._by_student = np.argsort(self.student_ids)
+        self._sorted_ids = self.student_ids[self._by_student]
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def _ranks(self, xp):
+        return np.searchsorted(self._descending, -xp, side='left') + 1
+
+    def top(self, limit):
+        xp = self.xp[:limit]
+        return [
+            {'rank': int(rank), 'student_id': int(student_id), 'xp': int(points)}
+            for rank, student_id, points in zip(self._ranks(xp), self.student_ids[:limit], xp)
+        ]
+
+    def rank_of(self, student_id):
+        position = np.searchsorted(self._sorted_ids, student_id)
+        if position >= len(self._sorted_ids) or self._sorted_ids[position] != student_id:
+            return None
+        xp = self.xp[self._by_student[position]]
+        return {'rank': int(self._ranks(xp)), 'xp': int(xp)}
+
+
+def window_start(window):
+    days = WINDOWS[window]
+    if days is None:
+        return None
+    return timezone.localdate() - timedelta(days=days - 1)
+
+
+def load_leaderboard(scope, scope_id, window):
+    """
+    Сумма XP по студентам из агрегатов, а не из StepProgress:
+    за все время — строки CourseProgress, за неделю/месяц — дневные строки DailyXP.
+    """
+    start = window_start(window)
+    rows = CourseProgress.objects.all() if start is None else DailyXP.objects.filter(day__gte=start)
+    if scope == 'course':
+        rows = rows.filter(course_id=scope_id)
+    elif scope == 'category':
+        rows = rows.filter(course__category_id=scope_id)
+
+    totals = np.array(
+        list(
+            rows.values('student_id').annotate(total=Sum('xp')).filter(total__gt=0)
+            .values_list('student_id', 'total').iterator()
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    return totals[:, 0], totals[:, 1]
+
+
+_lock = threading.Lock()
+_boards = OrderedDict()
+
+
+def get_leaderboard(scope, scope_id, window):
+    """
+    Таблица лидеров из памяти процесса, затем из общего кеша, иначе собирается из агрегатов.
+    Начисления XP попадают в таблицу не позже чем через LEADERBOARD_CACHE_SECONDS.
+    """
+    ttl = settings.LEADERBOARD_CACHE_SECONDS
+    key = LEADERBOARD_KEY.format(scope=scope, scope_id=scope_id or 0, window=window, start=window_start(window))
+    with _lock:
+        cached = _boards.get(key)
+        if cached is not None and time.time() - cached[0] < ttl:
+            _boards.move_to_end(key)
+            return cached[1]
+
+    # В общем кеше лежат только массивы и время сборки: один воркер собирает таблицу, остальные ее читают
+    stored = cache.get(key)
+    if stored is None:
+        stored = (time.time(), *load_leaderboard(scope, scope_id, window))
+        cache.set(key, stored, ttl)
+    built_at, student_ids, xp = stored
+    board = Leaderboard(student_ids, xp)
+    with _lock:
+        _boards[key] = (built_at, board)
+        _boards.move_to_end(key)
+        while len(_boards) > LEADERBOARDS_MAX:
+            _boards.popitem(last=False)
+    return board
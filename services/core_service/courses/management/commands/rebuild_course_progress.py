@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from courses.models import CourseProgress, StepProgress
+from courses.progress import rebuild_course_progress, rebuild_daily_xp
+from quizzes.models import Result
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает таблицы CourseProgress и DailyXP с нуля параллельными пачками студентов"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help="Студентов в одной пачке")
+        parser.add_argument('--workers', type=int, default=4, help="Параллельных потоков (у каждого свое соединение с БД)")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        # Все студенты, у которых есть хоть какая-то активность или уже есть строка прогресса
+        student_ids = sorted(
+            set(StepProgress.objects.values_list('student_id', flat=True).distinct())
+            | set(Result.objects.values_list('student_id', flat=True).distinct())
+            | set(CourseProgress.objects.values_list('student_id', flat=True).distinct())
+        )
+        chunks = [student_ids[i:i + chunk_size] for i in range(0, len(student_ids), chunk_size)]
+        self.stdout.write(f"Студентов: {len(student_ids)}, пачек: {len(chunks)}")
+
+        workers = max(options['workers'], 1)
+
+        def rebuild(chunk):
+            rebuild_daily_xp(student_ids=chunk)
+            return rebuild_course_progress(student_ids=chunk)
+
+        if workers == 1:
+            rows = sum(rebuild(chunk) for chunk in chunks)
+        else:
+            def rebuild_chunk(chunk):
+                try:
+                    return rebuild(chunk)
+                finally:
+                    # Django открывает отдельное соединение на каждый поток — закрываем его сами
+                    connection.close()
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                rows = sum(pool.map(rebuild_chunk, chunks))
+
+        self.stdout.write(self.style.SUCCESS(f"Готово: обновлено строк прогресса {rows}"))
@@ -0,0 +1,57 @@
+# Generated by Django 4.2 on 2026-10-17 22:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Вектор собирается сразу в двух конфигурациях (russian + english), веса: название A, визитка B, описание C
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('russian', coalesce({row}title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}title, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce({row}short_description, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce({row}short_description, '')), 'B') ||
+    setweight(to_tsvector('russian', coalesce({row}description, '')), 'C') ||
+    setweight(to_tsvector('english', coalesce({row}description, '')), 'C')
+"""
+
+CREATE_TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION courses_course_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {SEARCH_VECTOR_SQL.format(row='NEW.')};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER courses_course_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, short_description, description, search_vector
+    ON courses_course
+    FOR EACH ROW EXECUTE FUNCTION courses_course_search_vector_update();
+
+UPDATE courses_course SET search_vector = {SEARCH_VECTOR_SQL.format(row='')};
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS courses_course_search_vector_trigger ON courses_course;
+DROP FUNCTION IF EXISTS courses_course_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_alter_course_options_course_course_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='course_search_vector_idx'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER_SQL, DROP_TRIGGER_SQL),
+    ]
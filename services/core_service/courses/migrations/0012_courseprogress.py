@@ -0,0 +1,80 @@
+# Generated by Django 4.2 on 2026-10-17 22:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import defaultdict
+
+
+def backfill_course_progress(apps, schema_editor):
+    # Самодостаточный перенос текущего прогресса (исторические модели, та же логика, что в courses/progress.py)
+    LessonStep = apps.get_model('courses', 'LessonStep')
+    StepProgress = apps.get_model('courses', 'StepProgress')
+    CourseProgress = apps.get_model('courses', 'CourseProgress')
+    Result = apps.get_model('quizzes', 'Result')
+
+    totals = {
+        row['lesson__course_id']: row['total']
+        for row in LessonStep.objects.values('lesson__course_id').annotate(total=models.Count('id'))
+    }
+    quiz_steps = {
+        row['lesson_id']: row['total']
+        for row in LessonStep.objects.filter(step_type='quiz').values('lesson_id').annotate(total=models.Count('id'))
+    }
+    rows = defaultdict(lambda: {'completed_steps': 0, 'xp': 0, 'last_activity': None})
+
+    for item in StepProgress.objects.values('student_id', 'step__lesson__course_id').annotate(
+        completed=models.Count('id', filter=models.Q(is_completed=True) & ~models.Q(step__step_type='quiz')),
+        xp=models.Sum('score_earned'),
+        last=models.Max('completed_at'),
+    ):
+        row = rows[(item['student_id'], item['step__lesson__course_id'])]
+        row['completed_steps'] += item['completed']
+        row['xp'] += item['xp'] or 0
+        row['last_activity'] = item['last']
+
+    for item in Result.objects.filter(score__gte=70).values(
+        'student_id', 'quiz__lesson_id', 'quiz__lesson__course_id'
+    ).annotate(last=models.Max('completed_at')):
+        row = rows[(item['student_id'], item['quiz__lesson__course_id'])]
+        row['completed_steps'] += quiz_steps.get(item['quiz__lesson_id'], 0)
+        if row['last_activity'] is None or item['last'] > row['last_activity']:
+            row['last_activity'] = item['last']
+
+    CourseProgress.objects.bulk_create(
+        [
+            CourseProgress(student_id=student_id, course_id=course_id, total_steps=totals.get(course_id, 0), **row)
+            for (student_id, course_id), row in rows.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0011_course_search_vector'),
+        ('quizzes', '0004_result_result_student_completed_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed_steps', models.PositiveIntegerField(default=0, verbose_name='Пройдено шагов')),
+                ('total_steps', models.PositiveIntegerField(default=0, verbose_name='Всего шагов')),
+                ('xp', models.IntegerField(default=0, verbose_name='Сумма XP')),
+                ('last_activity', models.DateTimeField(blank=True, null=True, verbose_name='Последняя активность')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_progress', to='courses.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Прогресс по курсу',
+                'verbose_name_plural': 'Прогресс по курсам',
+                'unique_together': {('student', 'course')},
+            },
+        ),
+        migrations.RunPython(backfill_course_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-17 22:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_courseprogress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='lessonstep',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
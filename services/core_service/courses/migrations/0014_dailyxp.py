@@ -0,0 +1,60 @@
+# Generated by Django 4.2 on 2026-10-17 22:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_xp(apps, schema_editor):
+    # XP уже пройденных шагов относим ко дню их прохождения
+    StepProgress = apps.get_model('courses', 'StepProgress')
+    DailyXP = apps.get_model('courses', 'DailyXP')
+    DailyXP.objects.bulk_create(
+        [
+            DailyXP(student_id=row['student_id'], course_id=row['step__lesson__course_id'], day=row['day'], xp=row['xp'])
+            for row in StepProgress.objects.exclude(score_earned=0)
+            .annotate(day=TruncDate('completed_at'))
+            .values('student_id', 'step__lesson__course_id', 'day')
+            .annotate(xp=models.Sum('score_earned'))
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0013_lesson_updated_at_lessonstep_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyXP',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('xp', models.IntegerField(default=0, verbose_name='XP за день')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_xp', to='courses.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_xp', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'XP за день',
+                'verbose_name_plural': 'XP по дням',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='dailyxp',
+            index=models.Index(fields=['day'], name='dailyxp_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyxp',
+            index=models.Index(fields=['course', 'day'], name='dailyxp_course_day_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyxp',
+            unique_together={('student', 'course', 'day')},
+        ),
+        migrations.RunPython(backfill_daily_xp, migrations.RunPython.noop),
+    ]
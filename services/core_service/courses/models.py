@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 # 1. Категории курсов (Без изменений)
 class Category(models.Model):
@@ -34,12 +36,22 @@ class Course(models.Model):
     # Даты создания и обновления auto_now_add для автоматической установки при создании и auto_now для обновления при каждом сохранении verbose_name для админки
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    # Полнотекстовый индекс по названию, визитке и описанию (ru + en). Заполняется триггером в БД,
+    # см. миграцию 0011 и courses/search.py
+    search_vector = SearchVectorField(null=True, editable=False)
     
 
     class Meta:
         # Класс мета для указания дополнительных параметров модели
         verbose_name = "Курс"
         verbose_name_plural = "Курсы"
+        # Стабильный порядок для курсорной пагинации каталога
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='course_created_idx'),
+            GinIndex(fields=['search_vector'], name='course_search_vector_idx'),
+        ]
         
     # Метод dunder str для удобного отображения объектов курса в админке и при отладке возвращает название курса
     def __str__(self):
@@ -54,6 +66,8 @@ class Lesson(models.Model):
     title = models.CharField(max_length=255, verbose_name="Название урока")
     # Порядок урока для сортировки внутри курса
     order = models.PositiveIntegerField(default=0, verbose_name="Порядок урока")
+    # Время последнего изменения урока или его шагов (валидатор для условных GET-запросов)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         # Класс мета для указания дополнительных параметров модели
@@ -101,6 +115,8 @@ class LessonStep(models.Model):
     )
     # Порядок шага для сортировки внутри урока
     order = models.PositiveIntegerField(default=0, verbose_name="Порядок шага")
+    # Время последнего изменения шага
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         # Класс мета для указания дополнительных параметров модели
@@ -151,4 +167,55 @@ class StepProgress(models.Model):
         verbose_name_plural = "Прогресс шагов"
 
     def __str__(self):
-        return f"{self.student.username} - {self.step}"
\ No newline at end of file
+        return f"{self.student.username} - {self.step}"
+
+# 7. Денормализованный прогресс студента по курсу (обновляется инкрементально, см. courses/progress.py)
+class CourseProgress(models.Model):
+    # Студент и курс: одна строка на пару, чтение прогресса — один запрос по уникальному индексу
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='course_progress')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='student_progress')
+    # Количество засчитанных шагов (обычные шаги + шаги-тесты сданных уроков)
+    completed_steps = models.PositiveIntegerField(default=0, verbose_name="Пройдено шагов")
+    # Всего шагов в курсе на момент последнего изменения
+    total_steps = models.PositiveIntegerField(default=0, verbose_name="Всего шагов")
+    # Сумма XP по шагам курса
+    xp = models.IntegerField(default=0, verbose_name="Сумма XP")
+    # Время последней активности студента в курсе
+    last_activity = models.DateTimeField(null=True, blank=True, verbose_name="Последняя активность")
+
+    class Meta:
+        unique_together = ('student', 'course')
+        verbose_name = "Прогресс по курсу"
+        verbose_name_plural = "Прогресс по курсам"
+
+    @property
+    def percent(self):
+        if not self.total_steps:
+            return 0
+        return int((self.completed_steps / self.total_steps) * 100)
+
+    def __str__(self):
+        return f"{self.student.username} - {self.course.title}: {self.percent}%"
+
+
+# 8. XP студента по курсу за день (обновляется инкрементально, источник таблиц лидеров, см. courses/leaderboard.py)
+class DailyXP(models.Model):
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_xp')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='daily_xp')
+    # День начисления (по TIME_ZONE проекта)
+    day = models.DateField(verbose_name="День")
+    # Сумма XP за день (может уменьшиться при удалении шага или пересдаче с меньшими очками)
+    xp = models.IntegerField(default=0, verbose_name="XP за день")
+
+    class Meta:
+        unique_together = ('student', 'course', 'day')
+        verbose_name = "XP за день"
+        verbose_name_plural = "XP по дням"
+        indexes = [
+            # Окна "неделя/месяц": глобально по дню, для курса — по курсу и дню
+            models.Index(fields=['day'], name='dailyxp_day_idx'),
+            models.Index(fields=['course', 'day'], name='dailyxp_course_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.username} - {self.course.title} ({self.day}): {self.xp}"
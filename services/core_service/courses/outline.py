@@ -0,0 +1,66 @@
+import time
+
+from django.core.cache import cache
+
+from core.caching import cache_timeout
+
+from .models import Lesson
+
+# Версия контента курса: любое сохранение/удаление курса, урока, шага или теста поднимает ее
+# (courses/signals.py, quizzes/signals.py), и старые записи кеша просто перестают читаться
+CONTENT_VERSION_KEY = 'courses:content-version:{course_id}'
+OUTLINE_KEY = 'courses:outline:{course_id}:{version}'
+OUTLINE_TIMEOUT = 60 * 60 * 24
+
+
+def get_content_version(course_id):
+    return cache.get_or_set(CONTENT_VERSION_KEY.format(course_id=course_id), time.time_ns, timeout=cache_timeout(None))
+
+
+def bump_content_version(course_id):
+    key = CONTENT_VERSION_KEY.format(course_id=course_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Ключ вытеснен: новая уникальная версия гарантированно не совпадет со старыми записями
+        cache.set(key, time.time_ns(), timeout=cache_timeout(None))
+
+
+def build_course_outline(course_id):
+    # Локальный импорт: serializers импортирует этот модуль
+    from .serializers import LessonSerializer
+
+    lessons = Lesson.objects.filter(course_id=course_id).prefetch_related('steps').order_by('order')
+    # Сериализуем без request: общие для всех данные, без is_completed и абсолютных ссылок
+    outline = []
+    for lesson in LessonSerializer(lessons, many=True).data:
+        steps = [{key: value for key, value in step.items() if key != 'is_completed'} for step in lesson['steps']]
+        outline.append(dict(lesson, steps=steps))
+    return outline
+
+
+def get_course_outline(course_id):
+    """Дерево уроков и шагов курса из кеша (ключ включает версию контента)."""
+    key = OUTLINE_KEY.format(course_id=course_id, version=get_content_version(course_id))
+    outline = cache.get(key)
+    if outline is None:
+        outline = build_course_outline(course_id)
+        cache.set(key, outline, cache_timeout(OUTLINE_TIMEOUT))
+    return outline
+
+
+def merge_student_state(outline, request, completion):
+    """Накладывает на общее дерево поля конкретного пользователя (is_completed, абсолютные URL)."""
+    lessons = []
+    for lesson in outline:
+        steps = []
+        for step in lesson['steps']:
+            step = dict(step)
+            step['is_completed'] = bool(completion) and completion.is_completed(
+                step['id'], step['step_type'], lesson['id']
+            )
+            if step.get('file') and request is not None:
+                step['file'] = request.build_absolute_uri(step['file'])
+            steps.append(step)
+        lessons.append(dict(lesson, steps=steps))
+    return lessons
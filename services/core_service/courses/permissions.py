@@ -0,0 +1,46 @@
+from rest_framework import permissions
+from rest_framework.exceptions import NotFound, PermissionDenied
+
+from .access import get_course_access
+from .models import Course
+
+
+class CourseContentPermission(permissions.BasePermission):
+    """
+    Доступ к содержимому курса без запросов к БД (courses/access.py):
+    читать могут студенты курса, преподаватель и админ, изменять — преподаватель и админ.
+    Для объектов курс берется из obj.course_id.
+    """
+
+    message = "Доступ к уроку запрещен. Запишитесь на курс."
+    edit_message = "Редактировать урок может только автор."
+
+    def check_course(self, request, course_id):
+        access = get_course_access(request)
+        if request.method in permissions.SAFE_METHODS:
+            if access.can_view(course_id):
+                return True
+            raise PermissionDenied(self.message)
+        if access.can_edit(course_id):
+            return True
+        raise PermissionDenied(self.edit_message)
+
+    def has_object_permission(self, request, view, obj):
+        return self.check_course(request, obj.course_id)
+
+
+class CourseLessonsPermission(CourseContentPermission):
+    """Список уроков курса из URL (course_id): проверка до выборки уроков."""
+
+    message = "Вы не записаны на этот курс. Сначала запишитесь."
+    edit_message = "Вы не являетесь автором этого курса."
+
+    def has_permission(self, request, view):
+        course_id = view.kwargs['course_id']
+        try:
+            return self.check_course(request, course_id)
+        except PermissionDenied:
+            # Для несуществующего курса, как и раньше, отвечаем 404
+            if not Course.objects.filter(pk=course_id).exists():
+                raise NotFound()
+            raise
@@ -0,0 +1,301 @@
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, TruncDate
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .models import CourseProgress, DailyXP, Lesson, LessonStep, StepProgress
+
+# Минимальный балл (в процентах), с которым тест урока считается сданным
+PASSING_SCORE = 70
+
+
+def course_progress_map(user, course_ids):
+    """
+    Прогресс студента (0-100) сразу по нескольким курсам: один запрос к CourseProgress.
+    Нет строки — студент в курсе еще ничего не сделал.
+    """
+    course_ids = list(course_ids)
+    if not course_ids or not user or not user.is_authenticated:
+        return {}
+
+    progress = dict.fromkeys(course_ids, 0)
+    for row in CourseProgress.objects.filter(student=user, course_id__in=course_ids):
+        progress[row.course_id] = row.percent
+    return progress
+
+
+def progress_stamp(user, course_id):
+    """
+    Состояние прогресса студента в курсе для валидаторов условного GET: (last_activity, метка).
+    Любая отметка шага или сдача теста меняет строку CourseProgress, а значит и метку.
+    """
+    if not user.is_authenticated:
+        return None, None
+    row = (
+        CourseProgress.objects.filter(student=user, course_id=course_id)
+        .values_list('last_activity', 'completed_steps', 'total_steps', 'xp')
+        .first()
+    )
+    if row is None:
+        return None, None
+    return row[0], row
+
+
+def _aggregate_progress(student_ids=None, course_ids=None):
+    """
+    Пересчет прогресса с нуля набором агрегирующих запросов (без обхода шагов в Python).
+
+    Логика совпадает с пошаговой проверкой: обычный шаг засчитан, если есть StepProgress
+    с is_completed=True, шаг-тест засчитан, если студент сдал любой тест урока на >= 70%.
+    Сдачи берутся из QuizBestScore: при отложенной записи строки Result появляются позже.
+    Возвращает {(student_id, course_id): {...поля CourseProgress}}.
+    """
+    from quizzes.models import QuizBestScore, Result
+
+    steps = LessonStep.objects.all()
+    step_progress = StepProgress.objects.all()
+    passed = QuizBestScore.objects.filter(best_score__gte=PASSING_SCORE)
+    passed_results = Result.objects.filter(score__gte=PASSING_SCORE)
+    if student_ids is not None:
+        step_progress = step_progress.filter(student_id__in=student_ids)
+        passed = passed.filter(student_id__in=student_ids)
+        passed_results = passed_results.filter(student_id__in=student_ids)
+    if course_ids is not None:
+        steps = steps.filter(lesson__course_id__in=course_ids)
+        step_progress = step_progress.filter(step__lesson__course_id__in=course_ids)
+        passed = passed.filter(lesson__course_id__in=course_ids)
+        passed_results = passed_results.filter(quiz__lesson__course_id__in=course_ids)
+
+    totals = {
+        row['lesson__course_id']: row['total']
+        for row in steps.values('lesson__course_id').annotate(total=Count('id'))
+    }
+    quiz_steps_per_lesson = {
+        row['lesson_id']: row['total']
+        for row in steps.filter(step_type='quiz').values('lesson_id').annotate(total=Count('id'))
+    }
+
+    rows = defaultdict(lambda: {'completed_steps': 0, 'xp': 0, 'last_activity': None})
+
+    def touch(row, moment):
+        if moment and (row['last_activity'] is None or moment > row['last_activity']):
+            row['last_activity'] = moment
+
+    # Обычные шаги и XP
+    for item in step_progress.values('student_id', 'step__lesson__course_id').annotate(
+        completed=Count('id', filter=Q(is_completed=True) & ~Q(step__step_type='quiz')),
+        xp=Sum('score_earned'),
+        last=Max('completed_at'),
+    ):
+        row = rows[(item['student_id'], item['step__lesson__course_id'])]
+        row['completed_steps'] += item['completed']
+        row['xp'] += item['xp'] or 0
+        touch(row, item['last'])
+
+    # Шаги-тесты сданных уроков
+    for item in passed.values('student_id', 'lesson_id', 'lesson__course_id').distinct():
+        row = rows[(item['student_id'], item['lesson__course_id'])]
+        row['completed_steps'] += quiz_steps_per_lesson.get(item['lesson_id'], 0)
+
+    for item in passed_results.values('student_id', 'quiz__lesson__course_id').annotate(last=Max('completed_at')):
+        touch(rows[(item['student_id'], item['quiz__lesson__course_id'])], item['last'])
+
+    for (student_id, course_id), row in rows.items():
+        row['total_steps'] = totals.get(course_id, 0)
+    return rows
+
+
+def rebuild_course_progress(student_ids=None, course_ids=None):
+    """
+    Полностью пересчитывает строки CourseProgress для выбранных студентов/курсов
+    (None — без ограничения) и сохраняет их одним upsert.
+    """
+    rows = _aggregate_progress(student_ids, course_ids)
+
+    # Строки без активности (например, все шаги удалены) больше не нужны
+    existing = CourseProgress.objects.all()
+    if student_ids is not None:
+        existing = existing.filter(student_id__in=student_ids)
+    if course_ids is not None:
+        existing = existing.filter(course_id__in=course_ids)
+    stale_ids = [
+        pk for pk, student_id, course_id in existing.values_list('pk', 'student_id', 'course_id')
+        if (student_id, course_id) not in rows
+    ]
+    if stale_ids:
+        CourseProgress.objects.filter(pk__in=stale_ids).delete()
+
+    CourseProgress.objects.bulk_create(
+        [
+            CourseProgress(student_id=student_id, course_id=course_id, **row)
+            for (student_id, course_id), row in rows.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['student', 'course'],
+        update_fields=['completed_steps', 'total_steps', 'xp', 'last_activity'],
+    )
+    return len(rows)
+
+
+def rebuild_daily_xp(student_ids=None):
+    """
+    Пересчитывает DailyXP выбранных студентов из StepProgress: XP шага относится ко дню его прохождения.
+    Для исправления расхождений (команда rebuild_course_progress), в запросах не используется.
+    """
+    steps = StepProgress.objects.exclude(score_earned=0)
+    existing = DailyXP.objects.all()
+    if student_ids is not None:
+        steps = steps.filter(student_id__in=student_ids)
+        existing = existing.filter(student_id__in=student_ids)
+    rows = [
+        DailyXP(student_id=row['student_id'], course_id=row['step__lesson__course_id'], day=row['day'], xp=row['xp'])
+        for row in steps.annotate(day=TruncDate('completed_at'))
+        .values('student_id', 'step__lesson__course_id', 'day')
+        .annotate(xp=Sum('score_earned'))
+    ]
+    with transaction.atomic():
+        existing.delete()
+        DailyXP.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def record_daily_xp(deltas):
+    """
+    Прибавляет XP к дневным строкам DailyXP одним INSERT ... ON CONFLICT.
+    deltas — (student_id, course_id, day, xp); отрицательный xp списывает очки.
+    """
+    totals = defaultdict(int)
+    for student_id, course_id, day, xp in deltas:
+        totals[(student_id, course_id, day)] += xp
+    totals = {key: xp for key, xp in totals.items() if xp}
+    if not totals:
+        return
+
+    table = connection.ops.quote_name(DailyXP._meta.db_table)
+    params = []
+    for (student_id, course_id, day), xp in totals.items():
+        params.extend([student_id, course_id, day, xp])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (student_id, course_id, day, xp) '
+            f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(totals))} '
+            f'ON CONFLICT (student_id, course_id, day) DO UPDATE SET xp = {table}.xp + EXCLUDED.xp',
+            params,
+        )
+
+
+def apply_progress_delta(student_id, course_id, completed=0, xp=0):
+    """Инкрементальное обновление строки прогресса (и XP за сегодня) после действия студента."""
+    if xp:
+        record_daily_xp([(student_id, course_id, timezone.localdate(), xp)])
+    updated = CourseProgress.objects.filter(student_id=student_id, course_id=course_id).update(
+        completed_steps=F('completed_steps') + completed,
+        xp=F('xp') + xp,
+        last_activity=timezone.now(),
+    )
+    if not updated:
+        # Первой активности в курсе еще нет строки — считаем ее целиком
+        rebuild_course_progress(student_ids=[student_id], course_ids=[course_id])
+
+
+def passed_students(lesson_id):
+    from quizzes.models import QuizBestScore
+
+    return QuizBestScore.objects.filter(lesson_id=lesson_id, best_score__gte=PASSING_SCORE).values('student_id')
+
+
+def lesson_unlocked(student_id, lesson_id):
+    """
+    Можно ли отмечать шаги урока: у урока нет тестов или студент сдал любой из них.
+    Один запрос по индексам quiz.lesson_id и QuizBestScore (student, lesson, best_score).
+    """
+    from quizzes.models import Quiz, QuizBestScore
+
+    return Lesson.objects.filter(pk=lesson_id).filter(
+        ~Exists(Quiz.objects.filter(lesson_id=OuterRef('pk')))
+        | Exists(QuizBestScore.objects.filter(
+            student_id=student_id, lesson_id=OuterRef('pk'), best_score__gte=PASSING_SCORE
+        ))
+    ).exists()
+
+
+def on_step_created(step):
+    course_id = step.lesson.course_id
+    CourseProgress.objects.filter(course_id=course_id).update(total_steps=F('total_steps') + 1)
+    if step.step_type == 'quiz':
+        # Новый шаг-тест сразу засчитан тем, кто уже сдал тест урока
+        CourseProgress.objects.filter(
+            course_id=course_id, student_id__in=passed_students(step.lesson_id)
+        ).update(completed_steps=F('completed_steps') + 1)
+
+
+def on_step_deleted(step):
+    # Вызывается до удаления (pre_delete), пока StepProgress шага еще существует
+    course_id = step.lesson.course_id
+    rows = CourseProgress.objects.filter(course_id=course_id)
+    if step.step_type == 'quiz':
+        completed_by = passed_students(step.lesson_id)
+    else:
+        completed_by = StepProgress.objects.filter(step=step, is_completed=True).values('student_id')
+    rows.filter(student_id__in=completed_by).update(
+        completed_steps=Greatest(F('completed_steps') - 1, Value(0))
+    )
+
+    # XP шага списываем с тех дней, когда шаг был пройден
+    record_daily_xp(
+        (row['student_id'], course_id, row['day'], -row['xp'])
+        for row in StepProgress.objects.filter(step=step).exclude(score_earned=0)
+        .annotate(day=TruncDate('completed_at'))
+        .values('student_id', 'day')
+        .annotate(xp=Sum('score_earned'))
+    )
+
+    earned = StepProgress.objects.filter(step=step, student_id=OuterRef('student_id')).values('score_earned')[:1]
+    rows.update(
+        total_steps=Greatest(F('total_steps') - 1, Value(0)),
+        xp=F('xp') - Coalesce(Subquery(earned), Value(0)),
+    )
+
+
+class StudentCompletion:
+    """
+    Пройденные шаги и сданные уроки студента, загружаемые один раз за запрос.
+
+    Сериализаторы получают объект через контекст, и is_completed становится
+    проверкой по множеству вместо одного-двух запросов на каждый шаг.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def completed_step_ids(self):
+        if not self.user.is_authenticated:
+            return set()
+        return set(
+            StepProgress.objects.filter(student=self.user, is_completed=True)
+            .values_list('step_id', flat=True)
+        )
+
+    @cached_property
+    def passed_lesson_ids(self):
+        from quizzes.models import QuizBestScore
+
+        if not self.user.is_authenticated:
+            return set()
+        return set(
+            QuizBestScore.objects.filter(student=self.user, best_score__gte=PASSING_SCORE)
+            .values_list('lesson_id', flat=True)
+        )
+
+    def is_completed(self, step_id, step_type, lesson_id):
+        # Шаг-тест засчитывается, если сдан любой тест урока
+        if step_type == 'quiz':
+            return lesson_id in self.passed_lesson_ids
+        return step_id in self.completed_step_ids
+
+    def is_step_completed(self, step):
+        return self.is_completed(step.id, step.step_type, step.lesson_id)
@@ -0,0 +1,30 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, IntegerField
+from django.db.models.functions import Cast
+
+# Конфигурации, в которых построен Course.search_vector (см. миграцию 0011)
+SEARCH_CONFIGS = ('russian', 'english')
+
+# ts_rank возвращает real; для курсорной пагинации переводим его в целое,
+# чтобы сравнение позиции курсора было точным
+RANK_SCALE = 1_000_000
+
+
+def build_search_query(text):
+    query = None
+    for config in SEARCH_CONFIGS:
+        part = SearchQuery(text, config=config, search_type='websearch')
+        query = part if query is None else query | part
+    return query
+
+
+def search_courses(queryset, text):
+    """
+    Полнотекстовый поиск курсов по GIN-индексу search_vector.
+    Добавляет аннотацию search_rank (чем больше, тем релевантнее).
+    """
+    query = build_search_query(text)
+    rank = SearchRank(F('search_vector'), query) * RANK_SCALE
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=Cast(rank, IntegerField())
+    )
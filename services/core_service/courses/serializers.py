@@ -1,5 +1,8 @@
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 from .models import Course, Lesson, Category, LessonStep, StepProgress
+from .outline import get_course_outline, merge_student_state
+from .progress import StudentCompletion, course_progress_map
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -22,23 +25,12 @@ class LessonStepSerializer(serializers.ModelSerializer):
         if not request or not request.user.is_authenticated:
             return False
 
-        # 🔥 Локальный импорт решает проблему 500 ошибки (NameError / Circular Import)
-        from quizzes.models import Quiz, Result 
+        # Множества пройденных шагов грузятся один раз на весь запрос (см. StudentCompletionMixin)
+        completion = self.context.get('completion')
+        if completion is None:
+            completion = self.context['completion'] = StudentCompletion(request.user)
+        return completion.is_step_completed(obj)
 
-        if obj.step_type == 'quiz':
-            quizzes = Quiz.objects.filter(lesson=obj.lesson)
-            if quizzes.exists():
-                # Просто возвращаем True, если тест сдан. Ничего не пишем в базу!
-                return Result.objects.filter(student=request.user, quiz__in=quizzes, score__gte=70).exists()
-            return False
-
-        # Для обычных шагов
-        return StepProgress.objects.filter(
-            student=request.user,
-            step=obj,
-            is_completed=True
-        ).exists()
-        
 class LessonSerializer(serializers.ModelSerializer):
     steps = LessonStepSerializer(many=True, read_only=True)
 
@@ -46,10 +38,79 @@ class LessonSerializer(serializers.ModelSerializer):
         model = Lesson
         fields = ['id', 'title', 'order', 'course', 'steps'] 
 
-class CourseSerializer(serializers.ModelSerializer):
+@extend_schema_field(LessonSerializer(many=True))
+class CourseOutlineField(serializers.Field):
+    """
+    Уроки и шаги курса из версионированного кеша (courses/outline.py).
+    Общее дерево кешируется целиком, а is_completed накладывается поверх для текущего студента.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, course):
+        request = self.context.get('request')
+        completion = self.context.get('completion')
+        if completion is None and request and request.user.is_authenticated:
+            completion = self.context['completion'] = StudentCompletion(request.user)
+        return merge_student_state(get_course_outline(course.id), request, completion)
+
+
+def _query_param_set(request, name):
+    # "?fields=id,title" -> {'id', 'title'}
+    raw = request.query_params.get(name, '') if request else ''
+    return {item.strip() for item in raw.split(',') if item.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Разреженные наборы полей для GET-запросов.
+
+    ?fields=id,title оставляет только перечисленные поля, а поля из expandable_fields
+    (тяжелые вложенные данные) попадают в ответ только при ?expand=<поле>.
+    """
+    expandable_fields = ()
+
+    @classmethod
+    def includes_field(cls, request, name):
+        # Позволяет вьюхе не делать prefetch для полей, которые клиент не запросил
+        if name in cls.expandable_fields and name not in _query_param_set(request, 'expand'):
+            return False
+        requested = _query_param_set(request, 'fields')
+        return not requested or name in requested
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        # Для записи нужны все поля, иначе сломается валидация
+        if not request or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return fields
+
+        for name in list(fields):
+            if not self.includes_field(request, name):
+                fields.pop(name)
+        return fields
+
+
+class CourseProgressFieldMixin:
+    def get_progress(self, obj):
+        request = self.context.get('request')
+        if not request or not request.user.is_authenticated:
+            return 0
+
+        # Вьюха заранее считает прогресс по всем курсам страницы (см. CourseProgressMixin)
+        progress_map = self.context.get('course_progress')
+        if progress_map is None or obj.id not in progress_map:
+            progress_map = course_progress_map(request.user, [obj.id])
+        return progress_map.get(obj.id, 0)
+
+
+class CourseSerializer(SparseFieldsMixin, CourseProgressFieldMixin, serializers.ModelSerializer):
     category_title = serializers.ReadOnlyField(source='category.title')
     teacher_name = serializers.ReadOnlyField(source='teacher.username')
-    lessons = LessonSerializer(many=True, read_only=True)
+    lessons = CourseOutlineField()
     
     category = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(), 
@@ -70,29 +131,20 @@ class CourseSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         return Course.objects.create(**validated_data)
 
-    def get_progress(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return 0
-        
-        steps = LessonStep.objects.filter(lesson__course=obj)
-        total_steps = steps.count()
-        if total_steps == 0:
-            return 0
-            
-        completed_count = 0
-        
-        # 🔥 Локальный импорт
-        from quizzes.models import Quiz, Result
-
-        # 🔥 УМНЫЙ ПОДСЧЕТ ПРОГРЕССА (Учитывает и обычные шаги, и тесты)
-        for step in steps:
-            if step.step_type == 'quiz':
-                quizzes = Quiz.objects.filter(lesson=step.lesson)
-                if quizzes.exists() and Result.objects.filter(student=request.user, quiz__in=quizzes, score__gte=70).exists():
-                    completed_count += 1
-            else:
-                if StepProgress.objects.filter(student=request.user, step=step, is_completed=True).exists():
-                    completed_count += 1
-        
-        return int((completed_count / total_steps) * 100)
\ No newline at end of file
+
+# Облегченная карточка курса для каталога: без уроков, шагов и полного описания
+class CourseCatalogSerializer(SparseFieldsMixin, CourseProgressFieldMixin, serializers.ModelSerializer):
+    category_title = serializers.ReadOnlyField(source='category.title')
+    teacher_name = serializers.ReadOnlyField(source='teacher.username')
+    lessons = CourseOutlineField()
+    progress = serializers.SerializerMethodField()
+
+    expandable_fields = ('lessons', 'progress')
+
+    class Meta:
+        model = Course
+        fields = [
+            'id', 'title', 'short_description', 'cover_image',
+            'price', 'category', 'category_title',
+            'teacher_name', 'lessons', 'progress'
+        ]
@@ -0,0 +1,117 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .access import schedule_access_bump
+from .autocomplete import invalidate_title_index
+from .models import Category, Course, Enrollment, Lesson, LessonStep
+from .outline import bump_content_version
+from .progress import on_step_created, on_step_deleted
+
+
+def course_id_of(instance):
+    """Курс, к которому относится объект контента (курс, урок, шаг или тест)."""
+    if isinstance(instance, Course):
+        return instance.pk
+    if isinstance(instance, Lesson):
+        return instance.course_id
+    # У шага и теста курс лежит за уроком
+    lesson_field = instance._meta.get_field('lesson')
+    if lesson_field.is_cached(instance):
+        return instance.lesson.course_id
+    return Lesson.objects.filter(pk=instance.lesson_id).values_list('course_id', flat=True).first()
+
+
+def schedule_content_version_bump(instance):
+    # Курс определяем сразу (при удалении урок еще существует), а версию поднимаем после коммита,
+    # чтобы параллельный запрос не закешировал старые данные под новой версией
+    course_id = course_id_of(instance)
+    if course_id is not None:
+        transaction.on_commit(lambda: bump_content_version(course_id))
+
+
+def touch_lesson(lesson_id):
+    """
+    Поднимает updated_at урока и его курса (валидаторы условного GET, core/conditional.py).
+    Обычный UPDATE без save(): сигналы родителей повторно не срабатывают.
+    """
+    now = timezone.now()
+    Lesson.objects.filter(pk=lesson_id).update(updated_at=now)
+    Course.objects.filter(lessons__pk=lesson_id).update(updated_at=now)
+
+
+@receiver([post_save, post_delete], sender=Course)
+def refresh_title_index(sender, instance, **kwargs):
+    # Индекс автодополнения пересобирается лениво, здесь только поднимаем его версию
+    invalidate_title_index()
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=LessonStep)
+def content_saved(sender, instance, **kwargs):
+    schedule_content_version_bump(instance)
+
+
+@receiver(pre_delete, sender=Course)
+@receiver(pre_delete, sender=Lesson)
+@receiver(pre_delete, sender=LessonStep)
+def content_deleted(sender, instance, **kwargs):
+    schedule_content_version_bump(instance)
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+def touch_course_of_lesson(sender, instance, **kwargs):
+    Course.objects.filter(pk=instance.course_id).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=LessonStep)
+def touch_lesson_of_step(sender, instance, **kwargs):
+    touch_lesson(instance.lesson_id)
+
+
+@receiver(post_save, sender=Category)
+def touch_category_courses(sender, instance, **kwargs):
+    # Название категории входит в ответ курса
+    Course.objects.filter(category=instance).update(updated_at=timezone.now())
+
+
+# Кешированные множества курсов пользователя (courses/access.py): запись на курс — в том числе
+# из stripe_webhook через get_or_create — и смена преподавателя поднимают версию доступа
+@receiver([post_save, post_delete], sender=Enrollment)
+def enrollment_changed(sender, instance, **kwargs):
+    schedule_access_bump(instance.student_id)
+
+
+@receiver(pre_save, sender=Course)
+def remember_course_teacher(sender, instance, **kwargs):
+    instance._previous_teacher_id = (
+        Course.objects.filter(pk=instance.pk).values_list('teacher_id', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Course)
+def course_teacher_changed(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_teacher_id', None)
+    if created or previous != instance.teacher_id:
+        schedule_access_bump(previous, instance.teacher_id)
+
+
+@receiver(post_delete, sender=Course)
+def course_removed_from_teacher(sender, instance, **kwargs):
+    schedule_access_bump(instance.teacher_id)
+
+
+# Число шагов курса хранится в CourseProgress, поэтому создание/удаление шага
+# сразу поправляет строки прогресса всех студентов курса одним UPDATE
+@receiver(post_save, sender=LessonStep)
+def count_created_step(sender, instance, created, **kwargs):
+    if created:
+        on_step_created(instance)
+
+
+@receiver(pre_delete, sender=LessonStep)
+def uncount_deleted_step(sender, instance, **kwargs):
+    on_step_deleted(instance)
@@ -1,6 +1,7 @@
 from django.urls import path
 from .views import (
     CourseListView, 
+    CourseAutocompleteView,
     CourseDetailView, 
     CategoryListView,
     EnrollCourseView, 
@@ -11,6 +12,7 @@ from .views import (
     LessonStepDetailView,
     LessonStepCreateView,
     MarkStepCompleteView,
+    LeaderboardView,
     upload_image,
     CreateStripeCheckoutSessionView,
     stripe_webhook # <-- ИМПОРТИРУЕМ ФУНКЦИЮ
@@ -18,10 +20,13 @@ from .views import (
 
 urlpatterns = [
     path('categories/', CategoryListView.as_view(), name='category-list'),
+    path('categories/<int:category_id>/leaderboard/', LeaderboardView.as_view(scope='category'), name='category-leaderboard'),
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
     path('bulk-create/', BulkCreateCourseView.as_view(), name='course-bulk-create'), 
     path('my_courses/', MyCoursesView.as_view(), name='my-courses'),
     
     path('', CourseListView.as_view(), name='course-list'),
+    path('autocomplete/', CourseAutocompleteView.as_view(), name='course-autocomplete'),
     path('<int:pk>/', CourseDetailView.as_view(), name='course-detail'),
     path('<int:pk>/enroll/', EnrollCourseView.as_view(), name='course-enroll'),
     
@@ -29,6 +34,7 @@ urlpatterns = [
     path('<int:course_id>/create-checkout-session/', CreateStripeCheckoutSessionView.as_view(), name='create-checkout-session'),
     path('webhook/stripe/', stripe_webhook, name='stripe-webhook'), # <-- МАРШРУТ НА ФУНКЦИЮ
 
+    path('<int:course_id>/leaderboard/', LeaderboardView.as_view(scope='course'), name='course-leaderboard'),
     path('<int:course_id>/lessons/', LessonListCreateView.as_view(), name='course-lessons'),
     path('lessons/<int:pk>/', LessonDetailView.as_view(), name='lesson-detail'),
     
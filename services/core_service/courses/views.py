@@ -13,35 +13,94 @@ from rest_framework.exceptions import PermissionDenied
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
+from django.utils.functional import SimpleLazyObject
 
 User = get_user_model()
 
 # Импорты моделей и сериализаторов
 from .models import Category, Course, Enrollment, Lesson, LessonStep, StepProgress
-from .serializers import CategorySerializer, CourseSerializer, LessonSerializer, LessonStepSerializer
-from quizzes.models import Quiz, Result
+from .serializers import (
+    CategorySerializer,
+    CourseCatalogSerializer,
+    CourseSerializer,
+    LessonSerializer,
+    LessonStepSerializer,
+)
+from .progress import (
+    StudentCompletion,
+    apply_progress_delta,
+    course_progress_map,
+    lesson_unlocked,
+    progress_stamp,
+    rebuild_course_progress,
+)
+from .search import search_courses
+from .autocomplete import get_title_index
+from .leaderboard import WINDOWS, get_leaderboard
+from .access import get_course_access
+from .permissions import CourseContentPermission, CourseLessonsPermission
+from core.conditional import ConditionalRetrieveMixin, make_etag
+from core.pagination import CategoryPagination, CoursePagination
+
+# Максимальный размер топа в таблице лидеров
+LEADERBOARD_MAX_LIMIT = 100
 
 # Инициализация ключа Stripe
 stripe.api_key = getattr(settings, 'STRIPE_SECRET_KEY', None)
 
 
+class CourseProgressMixin:
+    """
+    Считает прогресс студента сразу по всем сериализуемым курсам и кладет его в контекст.
+    Подсчет ленивый: если клиент не запросил поле progress, запросов не будет.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        context = kwargs.setdefault('context', self.get_serializer_context())
+        user = self.request.user
+        if args and args[0] is not None and user.is_authenticated:
+            courses = args[0] if kwargs.get('many') else [args[0]]
+            course_ids = [course.id for course in courses]
+            context['course_progress'] = SimpleLazyObject(lambda: course_progress_map(user, course_ids))
+        return super().get_serializer(*args, **kwargs)
+
+
+class StudentCompletionMixin:
+    """Загружает пройденные шаги и сданные уроки студента один раз на запрос."""
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.user.is_authenticated:
+            context['completion'] = StudentCompletion(self.request.user)
+        return context
+
+
 class CategoryListView(generics.ListCreateAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = CategoryPagination
 
 
-class CourseListView(generics.ListCreateAPIView):
-    serializer_class = CourseSerializer
+class CourseListView(StudentCompletionMixin, CourseProgressMixin, generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = CoursePagination
+
+    def get_serializer_class(self):
+        # Каталог отдает облегченные карточки, создание курса идет через полный сериализатор
+        if self.request.method == 'POST':
+            return CourseSerializer
+        return CourseCatalogSerializer
 
     def get_queryset(self):
-        queryset = Course.objects.all()
+        # Уроки и шаги берутся из кеша структуры курса (CourseOutlineField), поэтому prefetch не нужен
+        queryset = Course.objects.select_related('category', 'teacher')
         search_query = self.request.query_params.get('search', None)
         category_id = self.request.query_params.get('category', None)
 
         if search_query:
-            queryset = queryset.filter(title__icontains=search_query)
+            # Сортировка по релевантности задается в CoursePagination
+            queryset = search_courses(queryset, search_query)
         if category_id:
             queryset = queryset.filter(category_id=category_id)
         return queryset
@@ -50,11 +109,38 @@ class CourseListView(generics.ListCreateAPIView):
         serializer.save(teacher=self.request.user)
 
 
-class CourseDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Course.objects.all()
+class CourseAutocompleteView(APIView):
+    permission_classes = [permissions.AllowAny]
+    max_limit = 20
+
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', 8)), self.max_limit)
+        except ValueError:
+            limit = 8
+        # Индекс названий живет в памяти процесса, поэтому ответ не требует запросов к БД
+        return Response(get_title_index().search(query, limit=max(limit, 1)))
+
+
+class CourseDetailView(
+    ConditionalRetrieveMixin, StudentCompletionMixin, CourseProgressMixin, generics.RetrieveUpdateDestroyAPIView
+):
+    queryset = Course.objects.select_related('category', 'teacher')
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    def get_validators(self):
+        # updated_at курса поднимается при любом изменении его уроков, шагов и тестов (courses/signals.py)
+        course_id = self.kwargs['pk']
+        updated_at = Course.objects.filter(pk=course_id).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return None
+        user = self.request.user
+        last_activity, stamp = progress_stamp(user, course_id)
+        etag = make_etag('course', course_id, updated_at.isoformat(), user.pk, stamp, self.request.query_params.urlencode())
+        return etag, max(updated_at, last_activity or updated_at)
+
     def get_object(self):
         course = super().get_object()
         if self.request.method in permissions.SAFE_METHODS:
@@ -129,51 +215,36 @@ class CreateStripeCheckoutSessionView(APIView):
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class LessonListCreateView(generics.ListCreateAPIView):
+class LessonListCreateView(StudentCompletionMixin, generics.ListCreateAPIView):
     serializer_class = LessonSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    # Запись на курс и авторство проверяются по кешированным множествам (courses/access.py)
+    permission_classes = [permissions.IsAuthenticated, CourseLessonsPermission]
 
     def get_queryset(self):
         course_id = self.kwargs.get('course_id')
-        course = get_object_or_404(Course, id=course_id)
-        user = self.request.user
-
-        if course.teacher == user or user.is_staff:
-            return Lesson.objects.filter(course_id=course_id).order_by('order')
-
-        is_enrolled = Enrollment.objects.filter(student=user, course=course).exists()
-        if not is_enrolled:
-            raise PermissionDenied("Вы не записаны на этот курс. Сначала запишитесь.")
-
-        return Lesson.objects.filter(course_id=course_id).order_by('order')
+        return Lesson.objects.filter(course_id=course_id).prefetch_related('steps').order_by('order')
 
     def perform_create(self, serializer):
         course = get_object_or_404(Course, id=self.kwargs.get('course_id'))
-        if course.teacher != self.request.user and not self.request.user.is_staff:
-            raise PermissionDenied("Вы не являетесь автором этого курса.")
         serializer.save(course=course)
 
 
-class LessonDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Lesson.objects.all()
+class LessonDetailView(ConditionalRetrieveMixin, StudentCompletionMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Lesson.objects.prefetch_related('steps')
     serializer_class = LessonSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    # Проверка доступа в has_object_permission не требует запросов (courses/access.py)
+    permission_classes = [permissions.IsAuthenticated, CourseContentPermission]
 
-    def get_object(self):
-        lesson = super().get_object()
-        course = lesson.course
+    def get_validators(self):
         user = self.request.user
-
-        is_enrolled = Enrollment.objects.filter(student=user, course=course).exists()
-        is_teacher = (course.teacher == user)
-
-        if self.request.method in permissions.SAFE_METHODS:
-            if not (is_enrolled or is_teacher or user.is_staff):
-                raise PermissionDenied("Доступ к уроку запрещен. Запишитесь на курс.")
-        else:
-            if not is_teacher and not user.is_staff:
-                raise PermissionDenied("Редактировать урок может только автор.")
-        return lesson
+        lesson = Lesson.objects.filter(pk=self.kwargs['pk']).values('updated_at', 'course_id').first()
+        if lesson is None or not get_course_access(self.request).can_view(lesson['course_id']):
+            # Без доступа валидаторы не считаем: обычный путь вернет 403
+            return None
+        last_activity, stamp = progress_stamp(user, lesson['course_id'])
+        updated_at = lesson['updated_at']
+        etag = make_etag('lesson', self.kwargs['pk'], updated_at.isoformat(), user.pk, stamp)
+        return etag, max(updated_at, last_activity or updated_at)
 
 
 class LessonStepCreateView(generics.CreateAPIView):
@@ -182,7 +253,7 @@ class LessonStepCreateView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         lesson = get_object_or_404(Lesson, id=self.kwargs['lesson_id'])
-        if lesson.course.teacher != self.request.user and not self.request.user.is_staff:
+        if not get_course_access(self.request).can_edit(lesson.course_id):
             raise PermissionDenied("Только преподаватель может добавлять шаги.")
         serializer.save(lesson=lesson)
 
@@ -197,47 +268,110 @@ class LessonStepDetailView(generics.RetrieveUpdateDestroyAPIView):
             return LessonStep.objects.all()
         return LessonStep.objects.filter(lesson__course__teacher=self.request.user)
 
+    def perform_update(self, serializer):
+        was_quiz = serializer.instance.step_type == 'quiz'
+        step = serializer.save()
+        # Смена типа меняет правило зачета шага — пересчитываем прогресс курса целиком
+        if was_quiz != (step.step_type == 'quiz'):
+            rebuild_course_progress(course_ids=[step.lesson.course_id])
 
-class MyCoursesView(generics.ListAPIView):
+
+class MyCoursesView(StudentCompletionMixin, CourseProgressMixin, generics.ListAPIView):
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CoursePagination
 
     def get_queryset(self):
         user = self.request.user
+        courses = Course.objects.select_related('category', 'teacher')
         if user.role in ['teacher', 'admin'] or user.is_staff:
-            return Course.objects.filter(teacher=user)
+            return courses.filter(teacher=user)
         
         enrolled_course_ids = Enrollment.objects.filter(student=user).values_list('course_id', flat=True)
-        return Course.objects.filter(id__in=enrolled_course_ids)
+        return courses.filter(id__in=enrolled_course_ids)
 
 
 class MarkStepCompleteView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
-        step = get_object_or_404(LessonStep, pk=pk)
+        step = get_object_or_404(LessonStep.objects.select_related('lesson'), pk=pk)
         user = request.user
         score = request.data.get('score', 10)
 
-        if not (step.lesson.course.teacher == user or user.is_staff):
-            quizzes = Quiz.objects.filter(lesson=step.lesson)
-            if quizzes.exists():
-                passed = Result.objects.filter(student=user, quiz__in=quizzes, score__gte=70).exists()
-                if not passed:
-                    return Response(
-                        {"error": "Сначала нужно успешно пройти тесты для этого урока (минимум 70%)."}, 
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
+        if not get_course_access(request).can_edit(step.lesson.course_id):
+            # Сдача урока проверяется по таблице лучших баллов (QuizBestScore) одним запросом
+            if not lesson_unlocked(user.id, step.lesson_id):
+                return Response(
+                    {"error": "Сначала нужно успешно пройти тесты для этого урока (минимум 70%)."}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
 
+        previous = StepProgress.objects.filter(student=user, step=step).values('is_completed', 'score_earned').first()
         progress, created = StepProgress.objects.update_or_create(
             student=user,
             step=step,
             defaults={'score_earned': score, 'is_completed': True}
         )
 
+        # Инкрементально обновляем прогресс по курсу (шаги-тесты засчитываются через сдачу теста)
+        newly_completed = step.step_type != 'quiz' and not (previous and previous['is_completed'])
+        apply_progress_delta(
+            user.id,
+            step.lesson.course_id,
+            completed=1 if newly_completed else 0,
+            xp=int(progress.score_earned) - (previous['score_earned'] if previous else 0),
+        )
+
         return Response({"message": "Шаг пройден!", "score_earned": score}, status=status.HTTP_200_OK)
 
 
+class LeaderboardView(APIView):
+    """
+    Таблица лидеров по XP: глобальная, курса или категории (scope задается в urls.py).
+    ?window=all|week|month, ?limit=N (до LEADERBOARD_MAX_LIMIT). Топ и место текущего
+    пользователя считаются по таблице в памяти (courses/leaderboard.py), имена — одним запросом.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    scope = 'global'
+
+    def get_permissions(self):
+        if self.scope == 'course':
+            # Лидеры курса видны только его студентам, преподавателю и админу
+            return [permissions.IsAuthenticated(), CourseLessonsPermission()]
+        return super().get_permissions()
+
+    def get(self, request, course_id=None, category_id=None):
+        window = request.query_params.get('window', 'all')
+        if window not in WINDOWS:
+            return Response(
+                {"error": f"window должен быть одним из: {', '.join(WINDOWS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), LEADERBOARD_MAX_LIMIT)
+        except ValueError:
+            return Response({"error": "limit должен быть числом"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if self.scope == 'category':
+            get_object_or_404(Category, pk=category_id)
+        board = get_leaderboard(self.scope, course_id or category_id, window)
+
+        results = board.top(limit)
+        usernames = dict(
+            User.objects.filter(id__in=[row['student_id'] for row in results]).values_list('id', 'username')
+        )
+        for row in results:
+            row['username'] = usernames.get(row['student_id'])
+
+        return Response({
+            "window": window,
+            "total": len(board),
+            "results": results,
+            "me": board.rank_of(request.user.id),
+        })
+
+
 class BulkCreateCourseView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Quiz, Question, Choice, Result
+from .models import Quiz, Question, Choice, Result, QuizBestScore
 
 # Позволяет добавлять варианты ответов прямо внутри вопроса
 class ChoiceInline(admin.TabularInline):
@@ -23,4 +23,9 @@ class QuestionAdmin(admin.ModelAdmin):
 @admin.register(Result)
 class ResultAdmin(admin.ModelAdmin):
     list_display = ('student', 'quiz', 'score', 'completed_at')
-    readonly_fields = ('completed_at',)
\ No newline at end of file
+    readonly_fields = ('completed_at',)
+
+@admin.register(QuizBestScore)
+class QuizBestScoreAdmin(admin.ModelAdmin):
+    list_display = ('student', 'quiz', 'lesson', 'best_score')
+    list_filter = ('lesson',)
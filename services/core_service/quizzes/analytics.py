@@ -0,0 +1,119 @@
+from itertools import chain
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .grading import get_quiz_version
+from .models import Choice, Question, Result
+
+# Ключ включает версию теста и "отпечаток" попыток (количество и последний id):
+# новая попытка или правка теста дают новый ключ, и аналитика пересчитывается
+ANALYTICS_KEY = 'quizzes:analytics:{quiz_id}:{version}:{attempts}:{last}'
+ANALYTICS_TIMEOUT = 60 * 60 * 24
+
+
+def _column_correlation(items, totals, mask):
+    """
+    Корреляция Пирсона по столбцам двух матриц (попытки x вопросы) только по попыткам,
+    отмеченным в mask; NaN при нулевой дисперсии.
+    """
+    weights = mask.astype(np.float64)
+    counts = weights.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        items = (items - (items * weights).sum(axis=0) / counts) * weights
+        totals = (totals - (totals * weights).sum(axis=0) / counts) * weights
+        denominator = np.sqrt((items ** 2).sum(axis=0) * (totals ** 2).sum(axis=0))
+        return np.where(denominator > 0, (items * totals).sum(axis=0) / denominator, np.nan)
+
+
+def _maybe(value):
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def compute_item_analytics(questions, choices, attempts):
+    """
+    Аналитика вопросов по всем попыткам без циклов по строкам.
+
+    questions — [(id, text)], choices — [(id, question_id, text, is_correct)],
+    attempts — [[id выбранных вариантов], ...].
+    Вопрос учитывается только в попытках, где выбран один из его текущих вариантов: id вариантов,
+    которых в тесте уже нет (вопрос или вариант изменен, quizzes/bulk.py), отбрасываются, а попытки,
+    сделанные до появления вопроса, не считаются ответами на него.
+    difficulty — доля правильных ответов среди ответивших на вопрос,
+    discrimination — корреляция правильности вопроса с баллом по остальным вопросам среди ответивших,
+    у вариантов — сколько раз и как часто их выбирали среди ответивших (частоты дистракторов).
+    """
+    n_attempts = len(attempts)
+    question_column = {question_id: i for i, (question_id, _) in enumerate(questions)}
+    choices = [choice for choice in choices if choice[1] in question_column]
+    choice_ids = np.array([choice[0] for choice in choices], dtype=np.int64)
+    choice_question = np.array([question_column[choice[1]] for choice in choices], dtype=np.int64)
+    is_correct = np.array([choice[3] for choice in choices], dtype=bool)
+
+    # Матрица выбора: попытки x варианты
+    selected = np.zeros((n_attempts, len(choices)), dtype=bool)
+    lengths = np.fromiter(map(len, attempts), dtype=np.int64, count=n_attempts)
+    flat = np.fromiter(chain.from_iterable(attempts), dtype=np.int64, count=int(lengths.sum()))
+    if len(choice_ids) and len(flat):
+        order = np.argsort(choice_ids)
+        positions = np.clip(np.searchsorted(choice_ids[order], flat), 0, len(choice_ids) - 1)
+        known = choice_ids[order][positions] == flat
+        rows = np.repeat(np.arange(n_attempts), lengths)[known]
+        selected[rows, order[positions[known]]] = True
+
+    # Варианты -> вопросы: произведение матриц сворачивает выбор по вопросам
+    incidence = np.zeros((len(choices), len(questions)), dtype=np.int64)
+    incidence[np.arange(len(choices)), choice_question] = 1
+    answered = (selected.astype(np.int64) @ incidence) > 0
+    correct = ((selected & is_correct).astype(np.int64) @ incidence) > 0
+
+    choice_counts = selected.sum(axis=0)
+    answered_counts = answered.sum(axis=0)
+    correct_scores = correct.astype(np.float64)
+    rest_scores = correct_scores.sum(axis=1, keepdims=True) - correct_scores
+    with np.errstate(invalid='ignore', divide='ignore'):
+        difficulty = correct_scores.sum(axis=0) / answered_counts
+    discrimination = _column_correlation(correct_scores, rest_scores, answered)
+    choice_answered = answered_counts[choice_question]
+
+    items = [
+        {
+            'question_id': question_id,
+            'text': text,
+            'answered': int(answered_counts[i]),
+            'difficulty': _maybe(difficulty[i]),
+            'discrimination': _maybe(discrimination[i]),
+            'choices': [],
+        }
+        for i, (question_id, text) in enumerate(questions)
+    ]
+    for j, (choice_id, _, text, correct_flag) in enumerate(choices):
+        items[choice_question[j]]['choices'].append({
+            'id': choice_id,
+            'text': text,
+            'is_correct': correct_flag,
+            'count': int(choice_counts[j]),
+            'rate': round(float(choice_counts[j]) / choice_answered[j], 4) if choice_answered[j] else None,
+        })
+    return {'attempts': n_attempts, 'questions': items}
+
+
+def get_quiz_analytics(quiz_id):
+    """Аналитика теста из кеша; пересчитывается при новых попытках или изменении теста."""
+    # Попытки до появления selected_choices не содержат ответов и в аналитику не входят
+    attempts = Result.objects.filter(quiz_id=quiz_id).exclude(selected_choices=[])
+    fingerprint = attempts.aggregate(attempts=Count('id'), last=Max('id'))
+    key = ANALYTICS_KEY.format(quiz_id=quiz_id, version=get_quiz_version(quiz_id), **fingerprint)
+    analytics = cache.get(key)
+    if analytics is None:
+        analytics = compute_item_analytics(
+            list(Question.objects.filter(quiz_id=quiz_id).values_list('id', 'text')),
+            list(
+                Choice.objects.filter(question__quiz_id=quiz_id)
+                .values_list('id', 'question_id', 'text', 'is_correct')
+            ),
+            list(attempts.filter(id__lte=fingerprint['last'] or 0).values_list('selected_choices', flat=True)),
+        )
+        cache.set(key, analytics, ANALYTICS_TIMEOUT)
+    return analytics
@@ -0,0 +1,113 @@
+from collections import defaultdict, deque
+
+from django.utils import timezone
+
+from .grading import schedule_quiz_version_bump
+from .models import Choice, Question, Quiz
+
+
+def parse_generated_question(q_item):
+    """
+    Вопрос из ответа AI/фронтенда -> (текст, объяснение, [(текст варианта, правильный), ...]).
+    None, если текста вопроса нет.
+    """
+    q_text = str(q_item.get('question', '')).strip()
+    if not q_text:
+        return None
+
+    options = q_item.get('options', [])
+    correct_index = 0
+
+    # Ищем ключи, которые реально присылает React-фронтенд
+    if 'correct_option_index' in q_item and q_item['correct_option_index'] is not None:
+        correct_index = int(q_item['correct_option_index'])
+    elif 'user_selected_index' in q_item and q_item['user_selected_index'] is not None:
+        correct_index = int(q_item['user_selected_index'])
+    elif 'correct_index' in q_item and q_item['correct_index'] is not None:
+        correct_index = int(q_item['correct_index'])
+    else:
+        # Фолбек на старый 'correct_answer' от AI
+        correct_idx_str = str(q_item.get('correct_answer', '0'))
+        if correct_idx_str.isdigit():
+            correct_index = int(correct_idx_str)
+
+    # Защита от багов фронтенда: если индекс больше количества вариантов, ставим 0
+    if correct_index < 0 or correct_index >= len(options):
+        correct_index = 0
+
+    choices = [(str(opt_text).strip(), i == correct_index) for i, opt_text in enumerate(options)]
+    return q_text, q_item.get('explanation', ''), choices
+
+
+def _match_by_text(rows, texts):
+    """
+    Сопоставляет существующие строки (вопросы или варианты) с новыми текстами по тексту;
+    одинаковые тексты разбираются по очереди. Возвращает [строка или None на каждый текст]
+    и строки, которым пары не нашлось.
+    """
+    pool = defaultdict(deque)
+    for row in rows:
+        pool[row.text.strip()].append(row)
+    matched = [pool[text].popleft() if pool.get(text) else None for text in texts]
+    return matched, [row for rows_left in pool.values() for row in rows_left]
+
+
+def save_quiz_questions(quiz, questions_data):
+    """
+    Сохраняет вопросы теста пачками вместо INSERT на каждый вопрос и вариант.
+
+    Существующие вопросы сопоставляются с новыми по тексту, варианты — по тексту внутри вопроса,
+    а не по позиции: иначе после вставки или перестановки вопросов старые id (и выбранные варианты
+    в Result.selected_choices) указывали бы на другой текст. Совпавшие строки не трогаем, кроме
+    настоящих правок (объяснение, правильность, позиция); новые тексты создаются, пропавшие удаляются.
+    Bulk-операции не шлют сигналы, поэтому версию и updated_at теста поднимаем явно, если что-то изменилось.
+    """
+    parsed = [item for item in map(parse_generated_question, questions_data) if item is not None]
+    existing = list(Question.objects.filter(quiz=quiz).prefetch_related('choices'))
+    matched, surplus_questions = _match_by_text(existing, [text for text, _, _ in parsed])
+
+    questions_to_update = []
+    new_questions = []
+    rows = []
+    for order, ((text, explanation, choices), question) in enumerate(zip(parsed, matched)):
+        if question is None:
+            question = Question(quiz=quiz, text=text, explanation=explanation, order=order)
+            new_questions.append(question)
+            current = []
+        else:
+            if (question.explanation, question.order) != (explanation, order):
+                question.explanation, question.order = explanation, order
+                questions_to_update.append(question)
+            current = list(question.choices.all())
+        rows.append((question, current, choices))
+
+    if questions_to_update:
+        Question.objects.bulk_update(questions_to_update, ['explanation', 'order'])
+    # PostgreSQL возвращает id созданных строк, поэтому варианты можно привязать без дозапросов
+    Question.objects.bulk_create(new_questions)
+
+    choices_to_update = []
+    new_choices = []
+    surplus_choices = []
+    for question, current, choices in rows:
+        matched_choices, left = _match_by_text(current, [choice_text for choice_text, _ in choices])
+        for order, ((choice_text, is_correct), choice) in enumerate(zip(choices, matched_choices)):
+            if choice is None:
+                new_choices.append(Choice(question=question, text=choice_text, is_correct=is_correct, order=order))
+            elif (choice.is_correct, choice.order) != (is_correct, order):
+                choice.is_correct, choice.order = is_correct, order
+                choices_to_update.append(choice)
+        surplus_choices.extend(choice.id for choice in left)
+
+    if choices_to_update:
+        Choice.objects.bulk_update(choices_to_update, ['is_correct', 'order'])
+    Choice.objects.bulk_create(new_choices)
+    if surplus_choices:
+        Choice.objects.filter(id__in=surplus_choices).delete()
+    if surplus_questions:
+        Question.objects.filter(id__in=[question.id for question in surplus_questions]).delete()
+
+    if questions_to_update or new_questions or choices_to_update or new_choices or surplus_choices or surplus_questions:
+        Quiz.objects.filter(pk=quiz.pk).update(updated_at=timezone.now())
+        schedule_quiz_version_bump(quiz.pk)
+    return len(parsed)
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from core.caching import cache_timeout
+
+from .models import Question, Quiz
+
+# Версия теста лежит в общем кеше: изменение вопросов или вариантов (SaveGeneratedView, админка)
+# поднимает ее через сигналы (quizzes/signals.py), и каждый процесс перечитывает свой ключ ответов
+QUIZ_VERSION_KEY = 'quizzes:version:{quiz_id}'
+
+# Сколько ключей ответов держим в памяти процесса
+ANSWER_KEYS_MAX = 1024
+
+
+class AnswerKey:
+    """Ключ ответов теста: вопрос -> множество id правильных вариантов."""
+
+    def __init__(self, lesson_id, course_id, correct):
+        self.lesson_id = lesson_id
+        self.course_id = course_id
+        self.correct = correct
+
+    @property
+    def total_questions(self):
+        return len(self.correct)
+
+    def count_correct(self, answers):
+        # Как и раньше, засчитывается каждая присланная пара (question_id, choice_id)
+        return sum(
+            1 for ans in answers
+            if ans.get('choice_id') in self.correct.get(ans.get('question_id'), ())
+        )
+
+
+def get_quiz_version(quiz_id):
+    return cache.get_or_set(QUIZ_VERSION_KEY.format(quiz_id=quiz_id), time.time_ns, timeout=cache_timeout(None))
+
+
+def bump_quiz_version(quiz_id):
+    key = QUIZ_VERSION_KEY.format(quiz_id=quiz_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=cache_timeout(None))
+
+
+def schedule_quiz_version_bump(quiz_id):
+    if quiz_id is not None:
+        transaction.on_commit(lambda: bump_quiz_version(quiz_id))
+
+
+def load_answer_key(quiz_id):
+    quiz = Quiz.objects.filter(pk=quiz_id).values_list('lesson_id', 'lesson__course_id').first()
+    if quiz is None:
+        return None
+    correct = {}
+    # Один LEFT JOIN: вопросы без правильных вариантов тоже входят в общее число вопросов
+    for question_id, choice_id, is_correct in Question.objects.filter(quiz_id=quiz_id).values_list(
+        'id', 'choices__id', 'choices__is_correct'
+    ):
+        choices = correct.setdefault(question_id, set())
+        if is_correct:
+            choices.add(choice_id)
+    return AnswerKey(quiz[0], quiz[1], {question_id: frozenset(ids) for question_id, ids in correct.items()})
+
+
+_lock = threading.Lock()
+_answer_keys = OrderedDict()
+
+
+def get_answer_key(quiz_id):
+    """Ключ ответов из памяти процесса; перечитывается из БД при смене версии теста."""
+    version = get_quiz_version(quiz_id)
+    with _lock:
+        cached = _answer_keys.get(quiz_id)
+        if cached is not None and cached[0] == version:
+            _answer_keys.move_to_end(quiz_id)
+            return cached[1]
+
+    answer_key = load_answer_key(quiz_id)
+    if answer_key is not None:
+        with _lock:
+            _answer_keys[quiz_id] = (version, answer_key)
+            _answer_keys.move_to_end(quiz_id)
+            while len(_answer_keys) > ANSWER_KEYS_MAX:
+                _answer_keys.popitem(last=False)
+    return answer_key
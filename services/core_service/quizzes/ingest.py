@@ -0,0 +1,345 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from courses.models import LessonStep
+from courses.progress import PASSING_SCORE, apply_progress_delta
+from .models import Quiz, QuizBestScore, Result
+
+logger = logging.getLogger(__name__)
+
+
+def record_results(entries):
+    """
+    Сохраняет результаты тестов пачкой и применяет их последствия для прогресса курса.
+
+    entries — словари submission_id, student_id, quiz_id, lesson_id, course_id, score,
+    selected_choices, completed_at в порядке сдачи.
+    """
+    apply_results(entries)
+    insert_results(entries)
+    return len(entries)
+
+
+def insert_results(entries):
+    """
+    Вставляет строки Result. submission_id уникален, поэтому повторная вставка той же сдачи
+    (пачка, перенесенная в БД, но не удаленная до падения процесса) ничего не делает.
+    """
+    Result.objects.bulk_create(
+        [
+            Result(
+                submission_id=entry.get('submission_id'),
+                student_id=entry['student_id'],
+                quiz_id=entry['quiz_id'],
+                score=entry['score'],
+                selected_choices=entry.get('selected_choices', []),
+                completed_at=entry['completed_at'],
+            )
+            for entry in entries
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def apply_results(entries):
+    """
+    Последствия сдач для прогресса: лучшие баллы (QuizBestScore) и дельта CourseProgress.
+    Выполняется сразу при сдаче и в режиме отложенной записи — от них зависит доступ к следующему уроку.
+    Первая сдача урока (>= PASSING_SCORE) засчитывает все шаги-тесты урока, как и раньше.
+    """
+    if not entries:
+        return
+
+    student_ids = {entry['student_id'] for entry in entries}
+    lesson_ids = {entry['lesson_id'] for entry in entries}
+    passed = set(
+        QuizBestScore.objects.filter(
+            student_id__in=student_ids, lesson_id__in=lesson_ids, best_score__gte=PASSING_SCORE
+        ).values_list('student_id', 'lesson_id')
+    )
+
+    upsert_best_scores(entries)
+
+    first_passes = defaultdict(list)
+    touched = set()
+    for entry in entries:
+        pair = (entry['student_id'], entry['lesson_id'])
+        touched.add((entry['student_id'], entry['course_id']))
+        if entry['score'] >= PASSING_SCORE and pair not in passed:
+            passed.add(pair)
+            first_passes[(entry['student_id'], entry['course_id'])].append(entry['lesson_id'])
+
+    quiz_steps = {}
+    if first_passes:
+        quiz_steps = dict(
+            LessonStep.objects.filter(
+                lesson_id__in={lesson_id for lessons in first_passes.values() for lesson_id in lessons},
+                step_type='quiz',
+            ).values('lesson_id').annotate(total=Count('id')).values_list('lesson_id', 'total')
+        )
+
+    # Первая сдача урока засчитывает все его шаги-тесты в прогрессе курса
+    for student_id, course_id in touched:
+        completed = sum(quiz_steps.get(lesson_id, 0) for lesson_id in first_passes.get((student_id, course_id), ()))
+        apply_progress_delta(student_id, course_id, completed=completed)
+
+
+def upsert_best_scores(entries):
+    """
+    Поднимает лучшие баллы (студент, тест) одним INSERT ... ON CONFLICT.
+    GREATEST в самом UPDATE: параллельные сдачи не затрут более высокий балл.
+    """
+    best = {}
+    for entry in entries:
+        key = (entry['student_id'], entry['quiz_id'])
+        if key not in best or entry['score'] > best[key][1]:
+            best[key] = (entry['lesson_id'], entry['score'])
+
+    table = connection.ops.quote_name(QuizBestScore._meta.db_table)
+    params = []
+    for (student_id, quiz_id), (lesson_id, score) in best.items():
+        params.extend([student_id, quiz_id, lesson_id, score])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (student_id, quiz_id, lesson_id, best_score) '
+            f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(best))} '
+            f'ON CONFLICT (student_id, quiz_id) DO UPDATE SET '
+            f'best_score = GREATEST({table}.best_score, EXCLUDED.best_score), lesson_id = EXCLUDED.lesson_id',
+            params,
+        )
+
+
+def refresh_best_score(student_id, quiz_id):
+    """Пересчет лучшего балла из Result (после удаления или ручной правки результата)."""
+    best = Result.objects.filter(student_id=student_id, quiz_id=quiz_id).aggregate(best=Max('score'))['best']
+    if best is None:
+        QuizBestScore.objects.filter(student_id=student_id, quiz_id=quiz_id).delete()
+        return
+    lesson_id = Quiz.objects.filter(pk=quiz_id).values_list('lesson_id', flat=True).first()
+    if lesson_id is not None:
+        QuizBestScore.objects.update_or_create(
+            student_id=student_id, quiz_id=quiz_id, defaults={'lesson_id': lesson_id, 'best_score': best}
+        )
+
+
+def is_write_behind():
+    return settings.QUIZ_RESULTS_WRITE_BEHIND
+
+
+# --- Spool-файлы ---
+
+def spool_dir():
+    path = settings.QUIZ_RESULTS_SPOOL_DIR
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _points_to(path, handle):
+    try:
+        return os.path.samestat(os.fstat(handle.fileno()), os.stat(path))
+    except FileNotFoundError:
+        return False
+
+
+def _dump(entry):
+    return json.dumps(dict(entry, completed_at=entry['completed_at'].isoformat())) + '\n'
+
+
+def _read_entries(handle):
+    entries = []
+    for line in handle:
+        if line.strip():
+            entry = json.loads(line)
+            entry['completed_at'] = parse_datetime(entry['completed_at'])
+            entries.append(entry)
+    return entries
+
+
+def spool_result(entry):
+    """
+    Дописывает результат в spool-файл процесса (append + fsync).
+    Флашер забирает файл переименованием, поэтому после блокировки проверяем,
+    что путь все еще указывает на открытый файл, иначе пишем в новый.
+    """
+    line = _dump(entry)
+    path = os.path.join(spool_dir(), f'results-{os.getpid()}.jsonl')
+    while True:
+        with open(path, 'a', encoding='utf-8') as spool:
+            fcntl.flock(spool, fcntl.LOCK_EX)
+            if _points_to(path, spool):
+                spool.write(line)
+                spool.flush()
+                os.fsync(spool.fileno())
+                break
+    ensure_flusher()
+
+
+def _insert_checked(entries):
+    with transaction.atomic():
+        # Внешние ключи Django откладываются до коммита; проверяем их сразу, чтобы нарушение
+        # было у этой вставки, а не у коммита внешней транзакции
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        insert_results(entries)
+
+
+def _insert_rows(entries):
+    """
+    Вставляет результаты пачкой, а если пачка нарушает ограничения БД (например, тест или студент
+    уже удалены) — по одному, чтобы одна плохая строка не задерживала остальные.
+    Возвращает (число вставленных, отвергнутые записи). Прочие ошибки БД (нет соединения)
+    пробрасываются: пачка останется на диске и будет повторена целиком.
+    """
+    try:
+        _insert_checked(entries)
+        return len(entries), []
+    except IntegrityError:
+        pass
+    flushed = 0
+    rejected = []
+    for entry in entries:
+        try:
+            _insert_checked([entry])
+            flushed += 1
+        except IntegrityError:
+            rejected.append(entry)
+    return flushed, rejected
+
+
+def _dead_letter(entries):
+    """Отвергнутые БД результаты откладываются в dead-letter.jsonl для ручного разбора."""
+    with open(os.path.join(spool_dir(), 'dead-letter.jsonl'), 'a', encoding='utf-8') as dead_letter:
+        dead_letter.writelines(map(_dump, entries))
+        dead_letter.flush()
+        os.fsync(dead_letter.fileno())
+
+
+def _flush_batch(path):
+    """
+    Переносит одну пачку в БД. Блокировка пачки ждет писателя, открывшего файл до переименования,
+    и не дает двум флашерам обработать ее дважды. Пачка удаляется только после коммита;
+    оставшиеся после падения процесса пачки подбирает следующий флаш (повтор вставки ничего не делает).
+    """
+    try:
+        batch = open(path, encoding='utf-8')
+    except FileNotFoundError:
+        return 0
+    with batch:
+        fcntl.flock(batch, fcntl.LOCK_EX)
+        if not _points_to(path, batch):
+            # Пачку уже обработал другой флашер
+            return 0
+        entries = sorted(_read_entries(batch), key=lambda entry: entry['completed_at'])
+        legacy = [entry for entry in entries if not entry.get('submission_id')]
+        if legacy:
+            # Записи, отложенные до появления submission_id: их последствия для прогресса еще не применены
+            with transaction.atomic():
+                apply_results(legacy)
+        flushed, rejected = _insert_rows(entries)
+        if rejected:
+            logger.error('Результаты тестов отвергнуты БД и отложены в dead-letter.jsonl: %s', len(rejected))
+            _dead_letter(rejected)
+        os.remove(path)
+    return flushed
+
+
+_flush_lock = threading.Lock()
+
+
+def flush_spool():
+    """Переносит все накопленные результаты в БД; возвращает число записанных строк."""
+    directory = spool_dir()
+    with _flush_lock:
+        # rename атомарен: каждый spool-файл забирает ровно один флашер, писатели начинают новый файл
+        for path in glob.glob(os.path.join(directory, 'results-*.jsonl')):
+            try:
+                os.rename(path, os.path.join(directory, f'{uuid.uuid4().hex}.batch'))
+            except FileNotFoundError:
+                continue
+        flushed = 0
+        for path in sorted(glob.glob(os.path.join(directory, '*.batch'))):
+            try:
+                flushed += _flush_batch(path)
+            except Exception:
+                # Пачка остается на диске и будет подобрана повторно, остальные не ждут ее
+                logger.exception('Не удалось перенести пачку результатов тестов %s в БД', path)
+        return flushed
+
+
+def flush_student_results(student_id):
+    """
+    Read-your-writes для одного студента: вставляет его ожидающие результаты, не трогая
+    spool-файлы и чужие записи. Флашер позже вставит их еще раз — по submission_id это ничего не делает.
+    """
+    directory = spool_dir()
+    entries = []
+    for path in glob.glob(os.path.join(directory, 'results-*.jsonl')) + glob.glob(os.path.join(directory, '*.batch')):
+        try:
+            handle = open(path, encoding='utf-8')
+        except FileNotFoundError:
+            continue
+        with handle:
+            # Разделяемая блокировка: писатель дописывает строку целиком под эксклюзивной
+            fcntl.flock(handle, fcntl.LOCK_SH)
+            entries.extend(entry for entry in _read_entries(handle) if entry['student_id'] == student_id)
+    if entries:
+        # Отвергнутые строки разберет флашер
+        _insert_rows(entries)
+
+
+def submit_result(student, quiz_id, lesson_id, course_id, score, selected_choices=()):
+    entry = {
+        'submission_id': uuid.uuid4().hex,
+        'student_id': student.id,
+        'quiz_id': int(quiz_id),
+        'lesson_id': lesson_id,
+        'course_id': course_id,
+        'score': score,
+        'selected_choices': list(selected_choices),
+        'completed_at': timezone.now(),
+    }
+    if is_write_behind():
+        # Лучший балл и прогресс — сразу (доступ к следующему уроку), откладывается только строка Result
+        with transaction.atomic():
+            apply_results([entry])
+            spool_result(entry)
+    else:
+        record_results([entry])
+
+
+# --- Фоновый флашер ---
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _flush_forever():
+    while True:
+        time.sleep(settings.QUIZ_RESULTS_FLUSH_INTERVAL)
+        try:
+            flush_spool()
+        finally:
+            close_old_connections()
+
+
+def ensure_flusher():
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flush_forever, name='quiz-results-flusher', daemon=True)
+            _flusher.start()
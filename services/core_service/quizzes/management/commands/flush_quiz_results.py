@@ -0,0 +1,21 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from quizzes.ingest import flush_spool
+
+
+class Command(BaseCommand):
+    help = "Переносит результаты тестов из spool-файлов отложенной записи в БД"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Не завершаться, а флашить с интервалом QUIZ_RESULTS_FLUSH_INTERVAL")
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = flush_spool()
+            if not options['loop']:
+                break
+            time.sleep(settings.QUIZ_RESULTS_FLUSH_INTERVAL)
+        self.stdout.write(self.style.SUCCESS(f"Готово: перенесено результатов {flushed}"))
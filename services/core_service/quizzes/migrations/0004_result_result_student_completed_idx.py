@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 22:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0003_alter_quiz_lesson'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['student', '-completed_at', '-id'], name='result_student_completed_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-17 22:43
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0005_quiz_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='result',
+            name='completed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-17 22:45
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0006_alter_result_completed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='result',
+            name='selected_choices',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2 on 2026-10-17 22:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_best_scores(apps, schema_editor):
+    # Лучший балл по каждой паре (студент, тест) из уже сохраненных результатов
+    Result = apps.get_model('quizzes', 'Result')
+    QuizBestScore = apps.get_model('quizzes', 'QuizBestScore')
+    QuizBestScore.objects.bulk_create(
+        [
+            QuizBestScore(
+                student_id=row['student_id'],
+                quiz_id=row['quiz_id'],
+                lesson_id=row['quiz__lesson_id'],
+                best_score=row['best'],
+            )
+            for row in Result.objects.values('student_id', 'quiz_id', 'quiz__lesson_id').annotate(
+                best=models.Max('score')
+            )
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_lesson_updated_at_lessonstep_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quizzes', '0007_result_selected_choices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizBestScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('best_score', models.FloatField()),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_best_scores', to='courses.lesson')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='best_scores', to='quizzes.quiz')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_best_scores', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='quizbestscore',
+            index=models.Index(fields=['student', 'lesson', 'best_score'], name='bestscore_student_lesson_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizbestscore',
+            index=models.Index(fields=['lesson', 'best_score'], name='bestscore_lesson_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='quizbestscore',
+            unique_together={('student', 'quiz')},
+        ),
+        migrations.RunPython(backfill_best_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-17 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0008_quizbestscore'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='choice',
+            options={'ordering': ['order', 'id']},
+        ),
+        migrations.AlterModelOptions(
+            name='question',
+            options={'ordering': ['order', 'id']},
+        ),
+        migrations.AddField(
+            model_name='choice',
+            name='order',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='order',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 23:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0009_question_choice_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='result',
+            name='submission_id',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
@@ -1,4 +1,6 @@
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
+from django.utils import timezone
 # Импортируем настройки Django для получения модели пользователя, так как нам нужно связать результаты тестов с пользователями
 from django.conf import settings
 # Импортируем модель Lesson для связи с тестами, так как каждый тест будет привязан к конкретному уроку
@@ -11,6 +13,8 @@ class Quiz(models.Model):
     title = models.CharField(max_length=255)
     # Описание теста (необязательно)
     description = models.TextField(blank=True)
+    # Время последнего изменения теста, его вопросов или вариантов (валидатор для условных GET-запросов)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Тест к уроку: {self.lesson.title}"
@@ -21,6 +25,13 @@ class Question(models.Model):
     text = models.TextField()
     # Объяснение для студентов (необязательно)
     explanation = models.TextField(blank=True, null=True, help_text="Объяснение для студента")
+    # Позиция вопроса в тесте. При пересохранении теста вопросы сопоставляются по тексту (quizzes/bulk.py),
+    # поэтому перестановка меняет только это поле, а id вопроса (и ответы в Result) остаются прежними
+    order = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['order', 'id']
+
     # Dunder str для удобного отображения объектов вопроса в админке и при отладке возвращает текст вопроса для контекста
     def __str__(self):
         return self.text
@@ -31,6 +42,11 @@ class Choice(models.Model):
     text = models.CharField(max_length=255)
     # Булево поле для указания правильного ответа
     is_correct = models.BooleanField(default=False)
+    # Позиция варианта в вопросе (см. Question.order)
+    order = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['order', 'id']
 
     def __str__(self):
         return self.text
@@ -42,8 +58,41 @@ class Result(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
     # Набранные баллы в процентах
     score = models.FloatField()
-    # Дата и время завершения теста с автоматической установкой при создании записи verbose_name для админки
-    completed_at = models.DateTimeField(auto_now_add=True)
+    # Идентификатор сдачи: отложенная запись (quizzes/ingest.py) может повторить вставку, и строка не задвоится
+    submission_id = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+    # Выбранные варианты попытки (id Choice в порядке ответов) для аналитики вопросов (quizzes/analytics.py)
+    selected_choices = ArrayField(models.IntegerField(), default=list, blank=True)
+    # Дата и время завершения теста. Не auto_now_add: при отложенной записи (quizzes/ingest.py)
+    # строка попадает в БД позже, а время должно остаться временем сдачи
+    completed_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        # Индекс под курсорную пагинацию "моих результатов"
+        indexes = [
+            models.Index(fields=['student', '-completed_at', '-id'], name='result_student_completed_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.username} - {self.quiz.title}: {self.score}%"
+
+
+# Лучший балл студента по тесту. Обновляется при каждой сдаче (quizzes/ingest.py) и отвечает
+# на вопрос "сдан ли урок" одним поиском по индексу вместо фильтра по всем Result
+class QuizBestScore(models.Model):
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='quiz_best_scores')
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='best_scores')
+    # Урок теста (денормализовано для проверки "урок сдан" без JOIN)
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='quiz_best_scores')
+    best_score = models.FloatField()
+
+    class Meta:
+        unique_together = ('student', 'quiz')
+        indexes = [
+            # Сдан ли урок студентом / какие уроки студент сдал
+            models.Index(fields=['student', 'lesson', 'best_score'], name='bestscore_student_lesson_idx'),
+            # Кто из студентов сдал урок (пересчет прогресса при изменении шагов)
+            models.Index(fields=['lesson', 'best_score'], name='bestscore_lesson_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.username} - {self.quiz.title}: {self.best_score}%"
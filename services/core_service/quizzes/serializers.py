@@ -2,6 +2,22 @@
 from rest_framework import serializers
 # Загрузка таблиц для создания сериализаторов
 from .models import Quiz, Question, Choice, Result
+from courses.access import get_course_access
+
+
+def reveals_answers(context, quiz_id, course_id):
+    """
+    Показывать ли правильные ответы (админу и преподавателю курса). Решение принимается
+    один раз на тест за запрос и хранится в общем контексте сериализаторов.
+    """
+    decisions = context.setdefault('reveal_answers', {})
+    if quiz_id not in decisions:
+        request = context.get('request')
+        decisions[quiz_id] = bool(
+            request and request.user.is_authenticated and get_course_access(request).can_edit(course_id)
+        )
+    return decisions[quiz_id]
+
 
 # Сериализатор для вариантов ответа
 # ModelSerializer автоматически создает поля на основе модели Choice.
@@ -12,15 +28,11 @@ class ChoiceSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
-        request = self.context.get('request')
-        show_answer = False
-        
-        if request and request.user.is_authenticated:
-            if request.user.is_staff:
-                show_answer = True
-            elif hasattr(instance.question.quiz.lesson.course, 'teacher'):
-                if request.user == instance.question.quiz.lesson.course.teacher:
-                    show_answer = True
+        quiz_id = instance.question.quiz_id
+        # QuizSerializer уже принял решение для теста; сюда доходим только при сериализации варианта отдельно
+        show_answer = self.context.get('reveal_answers', {}).get(quiz_id)
+        if show_answer is None:
+            show_answer = reveals_answers(self.context, quiz_id, instance.question.quiz.lesson.course_id)
 
         if not show_answer:
             ret.pop('is_correct', None)
@@ -43,6 +55,11 @@ class QuizSerializer(serializers.ModelSerializer):
         model = Quiz
         fields = ['id', 'title', 'description', 'questions', 'lesson']
 
+    def to_representation(self, instance):
+        # Представления подгружают lesson через select_related, course_id берется без запроса
+        reveals_answers(self.context, instance.id, instance.lesson.course_id)
+        return super().to_representation(instance)
+
 # Сериализатор для отправки ответов на тест
 # serializers.Serializer используется потому что answers не сохраняется в базу в таком виде это просто форма проверки данных
 class QuizSubmissionSerializer(serializers.Serializer):
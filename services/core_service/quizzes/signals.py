@@ -0,0 +1,67 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from courses.signals import schedule_content_version_bump, touch_lesson
+from .grading import schedule_quiz_version_bump
+from .ingest import refresh_best_score
+from .models import Choice, Question, Quiz, QuizBestScore, Result
+
+
+# Тест — часть контента курса: его изменение тоже поднимает версию курса
+@receiver(post_save, sender=Quiz)
+@receiver(pre_delete, sender=Quiz)
+def quiz_changed(sender, instance, **kwargs):
+    schedule_content_version_bump(instance)
+
+
+@receiver([post_save, post_delete], sender=Quiz)
+def touch_lesson_of_quiz(sender, instance, **kwargs):
+    touch_lesson(instance.lesson_id)
+
+
+# Вопросы и варианты входят в ответ теста — двигаем его updated_at
+@receiver([post_save, post_delete], sender=Question)
+def touch_quiz_of_question(sender, instance, **kwargs):
+    Quiz.objects.filter(pk=instance.quiz_id).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=Choice)
+def touch_quiz_of_choice(sender, instance, **kwargs):
+    Quiz.objects.filter(questions__pk=instance.question_id).update(updated_at=timezone.now())
+
+
+# Ключ ответов для проверки теста (quizzes/grading.py) перечитывается при смене версии теста
+@receiver([post_save, post_delete], sender=Quiz)
+def quiz_answer_key_changed(sender, instance, **kwargs):
+    schedule_quiz_version_bump(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_answer_key_changed(sender, instance, **kwargs):
+    schedule_quiz_version_bump(instance.quiz_id)
+
+
+@receiver([post_save, post_delete], sender=Choice)
+def choice_answer_key_changed(sender, instance, **kwargs):
+    # При каскадном удалении вопроса его варианты удаляются раньше, вопрос еще на месте
+    schedule_quiz_version_bump(
+        Question.objects.filter(pk=instance.question_id).values_list('quiz_id', flat=True).first()
+    )
+
+
+# Лучшие баллы (QuizBestScore) при сдаче обновляет quizzes/ingest.py пачкой без сигналов;
+# здесь — ручные правки и удаления результатов, например из админки
+@receiver([post_save, post_delete], sender=Result)
+def result_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_best_score(instance.student_id, instance.quiz_id)
+
+
+@receiver(post_save, sender=Quiz)
+def move_best_scores_with_quiz(sender, instance, created, **kwargs):
+    # Тест перенесли в другой урок — сдача теперь засчитывается новому уроку
+    if not created:
+        QuizBestScore.objects.filter(quiz=instance).exclude(lesson_id=instance.lesson_id).update(
+            lesson_id=instance.lesson_id
+        )
@@ -0,0 +1,59 @@
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from core.caching import cache_timeout
+
+from .grading import QUIZ_VERSION_KEY, get_quiz_version
+from .models import Quiz
+
+# Готовый JSON теста для студентов (без is_correct). Ключ включает версию теста, которую
+# поднимают изменения вопросов и вариантов (quizzes/signals.py), поэтому снимок
+# пересобирается только после сохранения теста в SaveGeneratedView или админке
+SNAPSHOT_KEY = 'quizzes:snapshot:{quiz_id}:{version}'
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+
+def build_quiz_snapshot(quiz_id):
+    # Локальный импорт: serializers импортирует courses.access, а тот — модели курсов
+    from .serializers import QuizSerializer
+
+    quiz = (
+        Quiz.objects.select_related('lesson')
+        .prefetch_related('questions__choices')
+        .filter(pk=quiz_id)
+        .first()
+    )
+    if quiz is None:
+        return None
+    data = QuizSerializer(quiz, context={'reveal_answers': {quiz.id: False}}).data
+    return JSONRenderer().render(data)
+
+
+def get_quiz_snapshots(quiz_ids):
+    """Снимки тестов в порядке quiz_ids: версии и снимки читаются из кеша пачкой."""
+    version_keys = {quiz_id: QUIZ_VERSION_KEY.format(quiz_id=quiz_id) for quiz_id in quiz_ids}
+    found = cache.get_many(version_keys.values())
+    versions = {
+        quiz_id: found[key] if key in found else get_quiz_version(quiz_id)
+        for quiz_id, key in version_keys.items()
+    }
+
+    snapshot_keys = {
+        quiz_id: SNAPSHOT_KEY.format(quiz_id=quiz_id, version=version) for quiz_id, version in versions.items()
+    }
+    snapshots = cache.get_many(snapshot_keys.values())
+    result = []
+    for quiz_id in quiz_ids:
+        snapshot = snapshots.get(snapshot_keys[quiz_id])
+        if snapshot is None:
+            snapshot = build_quiz_snapshot(quiz_id)
+            if snapshot is None:
+                continue
+            cache.set(snapshot_keys[quiz_id], snapshot, cache_timeout(SNAPSHOT_TIMEOUT))
+        result.append(snapshot)
+    return result
+
+
+def get_quiz_snapshot(quiz_id):
+    snapshots = get_quiz_snapshots([quiz_id])
+    return snapshots[0] if snapshots else None
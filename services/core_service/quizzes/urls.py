@@ -5,6 +5,7 @@ from .views import (
     QuizByLessonView, # View для получения тестов по конкретному уроку
     QuizSubmitView, # View для сдачи теста и получения результатов
     MyQuizResultsView, # View для получения результатов тестов текущего пользователя
+    QuizAnalyticsView, # View аналитики вопросов теста для преподавателя
     GeneratePreviewView, # View для генерации превью теста
     SaveGeneratedView # View для сохранения сгенерированного теста
 )
@@ -20,6 +21,8 @@ urlpatterns = [
     path('<int:pk>/', QuizDetailView.as_view(), name='quiz-detail'),
     path('<int:quiz_id>/submit/', QuizSubmitView.as_view(), name='quiz-submit'),
     path('my-results/', MyQuizResultsView.as_view(), name='my-results'),
+    # Аналитика вопросов теста (сложность, дискриминация, дистракторы): quizzes/<quiz_id>/analytics/
+    path('<int:quiz_id>/analytics/', QuizAnalyticsView.as_view(), name='quiz-analytics'),
     
     # Путь для генерации превью теста. Этот путь будет обрабатывать URL вида: quizzes/generate-preview/
     path('generate-preview/', GeneratePreviewView.as_view(), name='generate-preview'),
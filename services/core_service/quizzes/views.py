@@ -2,14 +2,24 @@
 import requests
 # Стандартные импорты Django и DRF
 from django.db import transaction
+from django.http import HttpResponse
 from rest_framework import generics, status
+from rest_framework.exceptions import NotFound, PermissionDenied
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from drf_spectacular.utils import extend_schema
-
-from .models import Quiz, Question, Choice, Result
+from core.conditional import ConditionalRetrieveMixin, make_etag
+from core.pagination import ResultPagination, StableCursorPagination
+
+from .analytics import get_quiz_analytics
+from .bulk import save_quiz_questions
+from .grading import get_answer_key
+from .ingest import flush_student_results, is_write_behind, submit_result
+from .snapshot import get_quiz_snapshot, get_quiz_snapshots
+from .models import Quiz, Result
 # Импорт модели Lesson для получения контента урока при генерации тестов через AI
+from courses.access import get_course_access
 from courses.models import Lesson
 from .serializers import (
     QuizSerializer, 
@@ -18,11 +28,21 @@ from .serializers import (
     MyResultSerializer
 )
 
+# Тест со всеми вопросами и вариантами за фиксированное число запросов
+def quizzes_with_questions():
+    return Quiz.objects.select_related('lesson').prefetch_related('questions__choices')
+
 # 1. ОБЫЧНЫЙ СПИСОК (для админки или общих целей)
 class QuizListView(generics.ListAPIView):
-    queryset = Quiz.objects.all().order_by('-id')
+    queryset = quizzes_with_questions().order_by('-id')
     serializer_class = QuizSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = StableCursorPagination
+
+# Студентам тесты отдаются готовыми снимками JSON (quizzes/snapshot.py) без ORM и сериализаторов;
+# преподавателю курса и админу нужны правильные ответы, для них остается обычная сериализация
+def snapshot_response(snapshots):
+    return HttpResponse(snapshots, content_type='application/json')
 
 # 2. Получение тестов по конкретному уроку
 class QuizByLessonView(generics.ListAPIView):
@@ -32,15 +52,54 @@ class QuizByLessonView(generics.ListAPIView):
     def get_queryset(self):
         lesson_id = self.kwargs.get('lesson_id')
         if lesson_id:
-            return Quiz.objects.filter(lesson_id=lesson_id).order_by('id')
+            return quizzes_with_questions().filter(lesson_id=lesson_id).order_by('id')
         return Quiz.objects.none()
 
+    def list(self, request, *args, **kwargs):
+        quizzes = list(self.get_queryset().values_list('id', 'lesson__course_id'))
+        access = get_course_access(request)
+        if any(access.can_edit(course_id) for _, course_id in quizzes):
+            return super().list(request, *args, **kwargs)
+        snapshots = get_quiz_snapshots([quiz_id for quiz_id, _ in quizzes])
+        return snapshot_response(b'[' + b','.join(snapshots) + b']')
+
+
+class QuizSnapshotMixin:
+    def retrieve(self, request, *args, **kwargs):
+        if self.reveals_answers():
+            return super().retrieve(request, *args, **kwargs)
+        snapshot = get_quiz_snapshot(self.kwargs['pk'])
+        if snapshot is None:
+            raise NotFound()
+        return snapshot_response(snapshot)
+
 # 3. Детальный просмотр теста по ID теста
-class QuizDetailView(generics.RetrieveAPIView):
-    queryset = Quiz.objects.all()
+class QuizDetailView(ConditionalRetrieveMixin, QuizSnapshotMixin, generics.RetrieveAPIView):
+    queryset = quizzes_with_questions()
     serializer_class = QuizSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_course_id(self):
+        if not hasattr(self, 'quiz_course_id'):
+            self.quiz_course_id = (
+                Quiz.objects.filter(pk=self.kwargs['pk']).values_list('lesson__course_id', flat=True).first()
+            )
+        return self.quiz_course_id
+
+    def reveals_answers(self):
+        # Несуществующий тест идет обычным путем и получает 404
+        course_id = self.get_course_id()
+        return course_id is None or get_course_access(self.request).can_edit(course_id)
+
+    def get_validators(self):
+        # updated_at теста поднимается и при изменении вопросов/вариантов (quizzes/signals.py)
+        quiz = Quiz.objects.filter(pk=self.kwargs['pk']).values_list('updated_at', 'lesson__course_id').first()
+        if quiz is None:
+            return None
+        updated_at, self.quiz_course_id = quiz
+        # Преподавателю и админу видны правильные ответы — у них своя версия ответа
+        return make_etag('quiz', self.kwargs['pk'], updated_at.isoformat(), self.reveals_answers()), updated_at
+
 # 4. Сдача теста
 class QuizSubmitView(APIView):
     permission_classes = [IsAuthenticated]
@@ -50,29 +109,20 @@ class QuizSubmitView(APIView):
         serializer = QuizSubmissionSerializer(data=request.data)
         if serializer.is_valid():
             answers = serializer.validated_data.get('answers')
-            questions = Question.objects.filter(quiz_id=quiz_id)
-            total_questions = questions.count()
+            # Ключ ответов грузится одним запросом и живет в памяти процесса до смены версии теста
+            answer_key = get_answer_key(quiz_id)
+            total_questions = answer_key.total_questions if answer_key else 0
             
             if total_questions == 0:
                 return Response({"error": "В тесте нет вопросов"}, status=400)
 
-            correct_answers_count = 0
-            for ans in answers:
-                is_correct = Choice.objects.filter(
-                    id=ans.get('choice_id'), 
-                    question_id=ans.get('question_id'), 
-                    is_correct=True
-                ).exists()
-                if is_correct:
-                    correct_answers_count += 1
-
+            correct_answers_count = answer_key.count_correct(answers)
             score = int((correct_answers_count / total_questions * 100))
-            
-            Result.objects.create(
-                student=request.user,
-                quiz_id=quiz_id,
-                score=score
-            )
+
+            lesson_id, course_id = answer_key.lesson_id, answer_key.course_id
+            # Лучший балл и прогресс пишутся сразу, строка результата — сразу или фоновым флашером
+            selected_choices = [ans['choice_id'] for ans in answers if 'choice_id' in ans]
+            submit_result(request.user, quiz_id, lesson_id, course_id, score, selected_choices)
             
             return Response({
                 "score": score,
@@ -87,10 +137,27 @@ class QuizSubmitView(APIView):
 class MyQuizResultsView(generics.ListAPIView):
     serializer_class = MyResultSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ResultPagination
 
     def get_queryset(self):
+        if is_write_behind():
+            # Read-your-writes: сначала переносим в БД ожидающие результаты этого студента
+            flush_student_results(self.request.user.id)
         return Result.objects.filter(student=self.request.user).order_by('-completed_at')
 
+# 6. Аналитика вопросов теста для преподавателя
+class QuizAnalyticsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, quiz_id):
+        course_id = Quiz.objects.filter(pk=quiz_id).values_list('lesson__course_id', flat=True).first()
+        if course_id is None:
+            raise NotFound()
+        if not get_course_access(request).can_edit(course_id):
+            raise PermissionDenied("Аналитика теста доступна только преподавателю курса.")
+        # Сложность, дискриминация и частоты вариантов считаются NumPy по всем попыткам (quizzes/analytics.py)
+        return Response(get_quiz_analytics(quiz_id))
+
 # --- AI ФУНКЦИОНАЛ ---
 class GeneratePreviewView(APIView):
     permission_classes = [IsAuthenticated]
@@ -148,53 +215,12 @@ class SaveGeneratedView(APIView):
                 if quiz_title:
                     quiz.title = quiz_title
                     quiz.save()
-                
-                # 🔥 ГЛАВНЫЙ ФИКС: Удаляем старые вопросы перед сохранением новых!
-                # Без этой строки старые неправильные варианты копились дубликатами в БД.
-                Question.objects.filter(quiz=quiz).delete()
             else:
                 title = quiz_title or f"Тест: {lesson.title}"
                 quiz = Quiz.objects.create(title=title, lesson=lesson)
 
-            # Сохранение вопросов
-            for q_item in questions_data:
-                q_text = str(q_item.get('question', '')).strip()
-                if not q_text: continue
-                
-                question = Question.objects.create(
-                    quiz=quiz, 
-                    text=q_text, 
-                    explanation=q_item.get('explanation', '')
-                )
-
-                options = q_item.get('options', [])
-                
-                
-                correct_index = 0
-                
-                # Ищем ключи, которые реально присылает React-фронтенд
-                if 'correct_option_index' in q_item and q_item['correct_option_index'] is not None:
-                    correct_index = int(q_item['correct_option_index'])
-                elif 'user_selected_index' in q_item and q_item['user_selected_index'] is not None:
-                    correct_index = int(q_item['user_selected_index'])
-                elif 'correct_index' in q_item and q_item['correct_index'] is not None:
-                    correct_index = int(q_item['correct_index'])
-                else:
-                    # Фолбек на старый 'correct_answer' от AI
-                    correct_idx_str = str(q_item.get('correct_answer', '0'))
-                    if correct_idx_str.isdigit():
-                        correct_index = int(correct_idx_str)
-
-                # Защита от багов фронтенда: если индекс больше количества вариантов, ставим 0
-                if correct_index < 0 or correct_index >= len(options):
-                    correct_index = 0
-
-                for i, opt_text in enumerate(options):
-                    Choice.objects.create(
-                        question=question,
-                        text=str(opt_text).strip(),
-                        is_correct=(i == correct_index)
-                    )
+            # Вопросы и варианты сохраняются пачками, существующие сопоставляются по тексту (quizzes/bulk.py)
+            save_quiz_questions(quiz, questions_data)
 
             return Response({"message": "Тест сохранен", "quiz_id": quiz.id}, status=201)
         except Exception as e:
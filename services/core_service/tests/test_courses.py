@@ -0,0 +1,717 @@
+import json
+import time
+from datetime import timedelta
+from io import StringIO
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from courses.models import Category, Course, CourseProgress, DailyXP, Enrollment, Lesson, LessonStep
+from courses.progress import course_progress_map, rebuild_course_progress
+from courses.progress import lesson_unlocked
+from quizzes.ingest import flush_spool
+from quizzes.models import Choice, Question, Quiz, QuizBestScore, Result
+
+User = get_user_model()
+
+
+@pytest.fixture
+def teacher():
+    return User.objects.create_user(username="teacher", password="StrongPass123!", role="teacher")
+
+
+@pytest.fixture
+def student():
+    return User.objects.create_user(username="student", password="StrongPass123!")
+
+
+@pytest.fixture
+def course(teacher):
+    category = Category.objects.create(title="ИБ")
+    course = Course.objects.create(category=category, teacher=teacher, title="Фишинг", description="Курс")
+    for order in range(1, 3):
+        lesson = Lesson.objects.create(course=course, title=f"Урок {order}", order=order)
+        LessonStep.objects.create(lesson=lesson, step_type="text", content="Теория", order=1)
+        LessonStep.objects.create(lesson=lesson, step_type="quiz", order=2)
+        quiz = Quiz.objects.create(lesson=lesson, title=f"Тест {order}")
+        question = Question.objects.create(quiz=quiz, text="Это фишинг?")
+        Choice.objects.create(question=question, text="Да", is_correct=True)
+        Choice.objects.create(question=question, text="Нет", is_correct=False)
+    return course
+
+
+def submit_quiz(client, quiz, correct):
+    question = quiz.questions.first()
+    choice = question.choices.get(is_correct=correct)
+    return client.post(
+        f"/quizzes/{quiz.id}/submit/",
+        {"answers": [{"question_id": question.id, "choice_id": choice.id}]},
+        format="json",
+    )
+
+
+def auth_client(user):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.mark.django_db
+def test_progress_counts_completed_steps_and_passed_quizzes(course, student):
+    Enrollment.objects.create(student=student, course=course)
+    client = auth_client(student)
+    first_lesson = course.lessons.get(order=1)
+
+    assert submit_quiz(client, first_lesson.quizzes.first(), correct=True).data["status"] == "Pass"
+    text_step = first_lesson.steps.get(step_type="text")
+    assert client.post(f"/courses/steps/{text_step.id}/complete/", {"score": 15}).status_code == 200
+    # Несданный тест второго урока не засчитывается
+    assert submit_quiz(client, course.lessons.get(order=2).quizzes.first(), correct=False).data["status"] == "Fail"
+
+    res = client.get("/courses/my_courses/")
+
+    assert res.status_code == 200
+    assert res.data["results"][0]["progress"] == 50
+    row = CourseProgress.objects.get(student=student, course=course)
+    assert (row.completed_steps, row.total_steps, row.xp) == (2, 4, 15)
+
+
+@pytest.mark.django_db
+def test_progress_map_is_a_single_row_fetch(course, student, django_assert_num_queries):
+    rebuild_course_progress()
+
+    with django_assert_num_queries(1):
+        progress = course_progress_map(student, [course.id])
+
+    assert progress == {course.id: 0}
+
+
+@pytest.mark.django_db
+def test_step_changes_keep_progress_rows_consistent(course, student):
+    client = auth_client(student)
+    first_lesson = course.lessons.get(order=1)
+    submit_quiz(client, first_lesson.quizzes.first(), correct=True)
+    text_step = first_lesson.steps.get(step_type="text")
+    client.post(f"/courses/steps/{text_step.id}/complete/", {"score": 10})
+
+    LessonStep.objects.create(lesson=first_lesson, step_type="quiz", order=3)
+    LessonStep.objects.create(lesson=first_lesson, step_type="video_url", order=4)
+    text_step.delete()
+
+    row = CourseProgress.objects.get(student=student, course=course)
+    assert (row.completed_steps, row.total_steps, row.xp) == (2, 5, 0)
+
+    CourseProgress.objects.filter(pk=row.pk).update(completed_steps=0, total_steps=0, xp=99)
+    # Потоки открывают свои соединения и не видят транзакцию теста, поэтому пересчет без параллелизма
+    call_command("rebuild_course_progress", workers=1, chunk_size=1, stdout=StringIO())
+    rebuilt = CourseProgress.objects.get(student=student, course=course)
+    assert (rebuilt.completed_steps, rebuilt.total_steps, rebuilt.xp) == (2, 5, 0)
+
+
+@pytest.mark.django_db
+def test_course_tree_query_count_does_not_grow_with_steps(
+    course, student, django_assert_max_num_queries, django_capture_on_commit_callbacks
+):
+    Enrollment.objects.create(student=student, course=course)
+    client = auth_client(student)
+
+    with django_assert_max_num_queries(20) as ctx:
+        client.get(f"/courses/{course.id}/")
+    baseline = len(ctx.captured_queries)
+
+    lesson = course.lessons.get(order=1)
+    with django_capture_on_commit_callbacks(execute=True):
+        for order in range(3, 20):
+            LessonStep.objects.create(lesson=lesson, step_type="text", order=order)
+
+    with django_assert_max_num_queries(baseline):
+        res = client.get(f"/courses/{course.id}/")
+
+    steps = [step for lesson in res.data["lessons"] for step in lesson["steps"]]
+    assert len(steps) == 21
+    assert not any(step["is_completed"] for step in steps)
+
+
+@pytest.mark.django_db
+def test_course_outline_is_cached_and_invalidated_on_change(
+    course, student, django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    Enrollment.objects.create(student=student, course=course)
+    client = auth_client(student)
+    client.get(f"/courses/{course.id}/")
+
+    # Повторное чтение берет дерево из кеша: остаются валидаторы условного GET, курс, прогресс и отметки студента
+    with django_assert_num_queries(6):
+        client.get(f"/courses/{course.id}/")
+
+    step = course.lessons.get(order=1).steps.get(step_type="text")
+    with django_capture_on_commit_callbacks(execute=True):
+        step.title = "Новый заголовок"
+        step.save()
+
+    lessons = client.get(f"/courses/{course.id}/").data["lessons"]
+    assert lessons[0]["steps"][0]["title"] == "Новый заголовок"
+
+
+@pytest.mark.django_db
+def test_catalog_returns_lightweight_cards(course):
+    res = APIClient().get("/courses/")
+
+    assert res.status_code == 200
+    card = res.data["results"][0]
+    assert set(card) == {
+        "id", "title", "short_description", "cover_image",
+        "price", "category", "category_title", "teacher_name",
+    }
+
+
+@pytest.mark.django_db
+def test_catalog_expand_and_fields(course, student):
+    client = auth_client(student)
+
+    expanded = client.get("/courses/", {"expand": "lessons,progress"}).data["results"][0]
+    assert len(expanded["lessons"]) == 2
+    assert expanded["progress"] == 0
+
+    sparse = client.get(f"/courses/{course.id}/", {"fields": "id,title"}).data
+    assert set(sparse) == {"id", "title"}
+
+
+@pytest.mark.django_db
+def test_catalog_is_cursor_paginated_with_capped_page_size(course, settings):
+    for i in range(5):
+        Course.objects.create(category=course.category, teacher=course.teacher, title=f"Курс {i}", description="-")
+    client = APIClient()
+
+    first = client.get("/courses/", {"page_size": 4}).data
+    assert [c["title"] for c in first["results"]] == ["Курс 4", "Курс 3", "Курс 2", "Курс 1"]
+    assert first["next"]
+
+    # Ссылка next содержит префикс FORCE_SCRIPT_NAME, поэтому передаем только курсор
+    cursor = parse_qs(urlparse(first["next"]).query)["cursor"][0]
+    second = client.get("/courses/", {"page_size": 4, "cursor": cursor}).data
+    assert [c["title"] for c in second["results"]] == ["Курс 0", "Фишинг"]
+    assert second["next"] is None
+
+    capped = client.get("/courses/", {"page_size": 10_000}).data
+    assert len(capped["results"]) <= settings.API_MAX_PAGE_SIZE
+
+
+@pytest.mark.django_db
+def test_search_is_full_text_and_ranked(course):
+    Course.objects.create(
+        category=course.category, teacher=course.teacher, title="Основы сетей",
+        description="Разбираем подозрительные письма и вложения",
+    )
+    Course.objects.create(
+        category=course.category, teacher=course.teacher, title="Опасные письма",
+        description="Практика",
+    )
+    other = Category.objects.create(title="Другое")
+    Course.objects.create(category=other, teacher=course.teacher, title="Письма", description="-")
+    client = APIClient()
+
+    titles = [c["title"] for c in client.get("/courses/", {"search": "письмо"}).data["results"]]
+    # Совпадение в названии весит больше, чем в описании; стемминг находит другие формы слова
+    assert set(titles[:2]) == {"Письма", "Опасные письма"}
+    assert titles[2:] == ["Основы сетей"]
+
+    res = client.get("/courses/", {"search": "письмо", "category": course.category.id}).data
+    assert [c["title"] for c in res["results"]] == ["Опасные письма", "Основы сетей"]
+
+
+@pytest.mark.django_db
+def test_autocomplete_tolerates_typos_and_sees_new_courses(course, django_assert_num_queries):
+    client = APIClient()
+
+    assert client.get("/courses/autocomplete/", {"q": "фиш"}).data == [{"id": course.id, "title": "Фишинг"}]
+    # Опечатка в середине слова
+    assert client.get("/courses/autocomplete/", {"q": "фишнг"}).data[0]["id"] == course.id
+
+    created = Course.objects.create(category=course.category, teacher=course.teacher, title="Фишинг в мессенджерах", description="-")
+    titles = [item["title"] for item in client.get("/courses/autocomplete/", {"q": "мессендж"}).data]
+    assert titles == [created.title]
+
+    with django_assert_num_queries(0):
+        client.get("/courses/autocomplete/", {"q": "фиш"})
+
+
+@pytest.mark.django_db
+def test_course_detail_supports_conditional_get(course, student, django_assert_max_num_queries):
+    Enrollment.objects.create(student=student, course=course)
+    client = auth_client(student)
+    first = client.get(f"/courses/{course.id}/")
+    etag = first["ETag"]
+
+    # Клиент с актуальной версией получает 304 без загрузки и сериализации дерева курса
+    with django_assert_max_num_queries(2):
+        cached = client.get(f"/courses/{course.id}/", HTTP_IF_NONE_MATCH=etag)
+    assert cached.status_code == 304
+    assert cached["ETag"] == etag
+    assert not cached.content
+
+    # Прогресс студента входит в ответ, поэтому меняет валидатор
+    first_lesson = course.lessons.get(order=1)
+    submit_quiz(client, first_lesson.quizzes.first(), correct=True)
+    after_progress = client.get(f"/courses/{course.id}/", HTTP_IF_NONE_MATCH=etag)
+    assert after_progress.status_code == 200
+
+    # Как и изменение шага курса
+    etag = after_progress["ETag"]
+    step = first_lesson.steps.get(step_type="text")
+    step.content = "Новая теория"
+    step.save()
+    assert client.get(f"/courses/{course.id}/", HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_quiz_and_lesson_conditional_get(course, student, teacher, django_capture_on_commit_callbacks):
+    quiz = course.lessons.get(order=1).quizzes.first()
+    client = auth_client(student)
+    etag = client.get(f"/quizzes/{quiz.id}/")["ETag"]
+    assert client.get(f"/quizzes/{quiz.id}/", HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    Choice.objects.filter(question__quiz=quiz, is_correct=False).first().save()
+    assert client.get(f"/quizzes/{quiz.id}/", HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    # Проверка доступа к уроку выполняется и для условных запросов
+    lesson = quiz.lesson
+    lesson_etag = auth_client(teacher).get(f"/courses/lessons/{lesson.id}/")["ETag"]
+    assert client.get(f"/courses/lessons/{lesson.id}/", HTTP_IF_NONE_MATCH=lesson_etag).status_code == 403
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Enrollment.objects.create(student=student, course=course)
+    lesson_etag = client.get(f"/courses/lessons/{lesson.id}/")["ETag"]
+    assert client.get(f"/courses/lessons/{lesson.id}/", HTTP_IF_NONE_MATCH=lesson_etag).status_code == 304
+
+
+@pytest.mark.django_db
+def test_lesson_access_is_cached_and_invalidated(
+    course, student, teacher, django_assert_max_num_queries, django_capture_on_commit_callbacks
+):
+    client = auth_client(student)
+    lesson = course.lessons.get(order=1)
+    assert client.get(f"/courses/{course.id}/lessons/").status_code == 403
+    assert client.get("/courses/999999/lessons/").status_code == 404
+
+    # Запись через get_or_create (как в stripe_webhook) открывает доступ сразу после коммита
+    with django_capture_on_commit_callbacks(execute=True):
+        Enrollment.objects.get_or_create(student=student, course=course)
+    assert client.get(f"/courses/{course.id}/lessons/").status_code == 200
+
+    # Повторные проверки доступа не обращаются к записям на курс и к курсам
+    with django_assert_max_num_queries(10) as ctx:
+        assert client.get(f"/courses/lessons/{lesson.id}/").status_code == 200
+    sql = " ".join(query["sql"] for query in ctx.captured_queries)
+    assert "courses_enrollment" not in sql
+    assert '"courses_course"' not in sql
+
+    # Новый преподаватель курса получает право редактирования, прежний его теряет
+    other = User.objects.create_user(username="other", password="StrongPass123!", role="teacher")
+    assert auth_client(teacher).patch(f"/courses/lessons/{lesson.id}/", {"title": "А"}).status_code == 200
+    with django_capture_on_commit_callbacks(execute=True):
+        course.teacher = other
+        course.save()
+    assert auth_client(teacher).patch(f"/courses/lessons/{lesson.id}/", {"title": "Б"}).status_code == 403
+    assert auth_client(other).patch(f"/courses/lessons/{lesson.id}/", {"title": "В"}).status_code == 200
+
+
+@pytest.mark.django_db
+def test_local_cache_entries_expire_for_other_workers(course, student, settings, monkeypatch):
+    settings.CACHE_IS_SHARED = False
+    settings.LOCAL_CACHE_SECONDS = 30
+    enrollment = Enrollment.objects.create(student=student, course=course)
+    client = auth_client(student)
+    assert client.get(f"/courses/{course.id}/lessons/").status_code == 200
+
+    # Запись отменена в другом воркере: сигнал этого процесса версию не поднял
+    Enrollment.objects.filter(pk=enrollment.pk)._raw_delete(Enrollment.objects.db)
+    assert client.get(f"/courses/{course.id}/lessons/").status_code == 200
+
+    # Через LOCAL_CACHE_SECONDS локальная запись истекает, и доступ перечитывается из БД
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 31)
+    assert client.get(f"/courses/{course.id}/lessons/").status_code == 403
+
+
+@pytest.mark.django_db
+def test_quiz_grading_uses_cached_answer_key(
+    course, student, teacher, django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    quiz = course.lessons.get(order=1).quizzes.first()
+    question = quiz.questions.first()
+    right = question.choices.get(is_correct=True)
+    client = auth_client(student)
+    submit_quiz(client, quiz, correct=True)
+
+    def submit(count):
+        answers = [{"question_id": question.id, "choice_id": right.id}] * count
+        return client.post(f"/quizzes/{quiz.id}/submit/", {"answers": answers}, format="json")
+
+    # Ключ ответов уже в памяти процесса: остаются проверка первой сдачи, Result, лучший балл и прогресс,
+    # и их число не зависит от количества ответов
+    with django_assert_num_queries(4) as one:
+        submit(1)
+    with django_assert_num_queries(len(one.captured_queries)):
+        assert submit(50).data["correct_count"] == 50
+
+    # Перегенерация теста меняет ключ ответов после коммита
+    with django_capture_on_commit_callbacks(execute=True):
+        auth_client(teacher).post(
+            "/quizzes/save-generated/",
+            {
+                "lesson_id": quiz.lesson_id,
+                "quiz_id": quiz.id,
+                "questions": [{"question": "Новый вопрос", "options": ["А", "Б"], "correct_option_index": 1}],
+            },
+            format="json",
+        )
+    assert submit(1).data["correct_count"] == 0
+    new_question = quiz.questions.get()
+    right = new_question.choices.get(is_correct=True)
+    answers = [{"question_id": new_question.id, "choice_id": right.id}]
+    assert client.post(f"/quizzes/{quiz.id}/submit/", {"answers": answers}, format="json").data["score"] == 100
+
+
+@pytest.mark.django_db
+def test_quiz_renders_in_fixed_queries_and_hides_answers(course, student, teacher, django_assert_max_num_queries):
+    quiz = course.lessons.get(order=1).quizzes.first()
+    for number in range(30):
+        question = Question.objects.create(quiz=quiz, text=f"Вопрос {number}")
+        for letter in "АБВГ":
+            Choice.objects.create(question=question, text=letter, is_correct=letter == "А")
+
+    with django_assert_max_num_queries(6):
+        res = auth_client(student).get(f"/quizzes/{quiz.id}/")
+    choices = [choice for question in res.json()["questions"] for choice in question["choices"]]
+    assert len(choices) == 122
+    assert all("is_correct" not in choice for choice in choices)
+
+    with django_assert_max_num_queries(6):
+        res = auth_client(teacher).get(f"/quizzes/lesson/{quiz.lesson_id}/")
+    assert all("is_correct" in choice for question in res.data[0]["questions"] for choice in question["choices"])
+
+
+@pytest.mark.django_db
+def test_students_get_cached_quiz_snapshots(
+    course, student, teacher, django_assert_max_num_queries, django_capture_on_commit_callbacks
+):
+    quiz = course.lessons.get(order=1).quizzes.first()
+    client = auth_client(student)
+    first = client.get(f"/quizzes/{quiz.id}/").json()
+    assert first["questions"][0]["choices"][0] == {"id": first["questions"][0]["choices"][0]["id"], "text": "Да"}
+
+    # Повторные чтения не трогают вопросы и варианты: снимок уже собран
+    with django_assert_max_num_queries(1):
+        assert client.get(f"/quizzes/{quiz.id}/").json() == first
+    with django_assert_max_num_queries(1):
+        assert client.get(f"/quizzes/lesson/{quiz.lesson_id}/").json() == [first]
+
+    # Изменение варианта пересобирает снимок после коммита
+    with django_capture_on_commit_callbacks(execute=True):
+        Choice.objects.filter(question__quiz=quiz, text="Да").update(text="Конечно")
+        Choice.objects.get(question__quiz=quiz, text="Нет").save()
+    texts = [choice["text"] for choice in client.get(f"/quizzes/{quiz.id}/").json()["questions"][0]["choices"]]
+    assert "Конечно" in texts
+
+    # Преподаватель по-прежнему видит правильные ответы
+    teacher_view = auth_client(teacher).get(f"/quizzes/{quiz.id}/").json()
+    assert "is_correct" in teacher_view["questions"][0]["choices"][0]
+    assert auth_client(teacher).get("/quizzes/999999/").status_code == 404
+    assert client.get("/quizzes/999999/").status_code == 404
+
+
+@pytest.mark.django_db
+def test_save_generated_quiz_uses_bulk_writes_and_keeps_ids(course, teacher, django_assert_max_num_queries):
+    lesson = course.lessons.get(order=1)
+    client = auth_client(teacher)
+    questions = [
+        {"question": f"Вопрос {number}", "options": ["А", "Б", "В", "Г"], "correct_option_index": number % 4}
+        for number in range(30)
+    ]
+
+    # 30 вопросов по 4 варианта сохраняются фиксированным числом запросов, а не ~150 INSERT
+    with django_assert_max_num_queries(15):
+        res = client.post("/quizzes/save-generated/", {"lesson_id": lesson.id, "questions": questions}, format="json")
+    quiz = Quiz.objects.get(id=res.data["quiz_id"])
+    assert quiz.questions.count() == 30
+    assert Choice.objects.filter(question__quiz=quiz, is_correct=True).count() == 30
+
+    first_ids = list(quiz.questions.values_list("id", flat=True))
+    edited = questions[:20]
+    edited[0] = {"question": "Изменен", "options": ["Да", "Нет"], "correct_option_index": 1}
+    client.post(
+        "/quizzes/save-generated/",
+        {"lesson_id": lesson.id, "quiz_id": quiz.id, "questions": edited},
+        format="json",
+    )
+
+    # Совпавшие по тексту вопросы остались с прежними id, измененный создан заново, лишние удалены
+    ids = list(quiz.questions.values_list("id", flat=True))
+    assert ids[1:] == first_ids[1:20]
+    assert ids[0] not in first_ids
+    changed = quiz.questions.get(id=ids[0])
+    assert changed.text == "Изменен"
+    assert list(changed.choices.values_list("text", "is_correct")) == [("Да", False), ("Нет", True)]
+
+
+@pytest.mark.django_db
+def test_resaving_reordered_quiz_keeps_choice_ids_meaning(course, teacher, student, django_assert_max_num_queries):
+    lesson = course.lessons.get(order=1)
+    client = auth_client(teacher)
+    questions = [
+        {"question": f"Вопрос {number}", "options": ["А", "Б", "В"], "correct_option_index": number % 3}
+        for number in range(5)
+    ]
+    res = client.post("/quizzes/save-generated/", {"lesson_id": lesson.id, "questions": questions}, format="json")
+    quiz = Quiz.objects.get(id=res.data["quiz_id"])
+    selected = [question.choices.all()[1].id for question in quiz.questions.prefetch_related("choices")]
+    Result.objects.create(student=student, quiz=quiz, score=40, selected_choices=selected)
+    before = dict(Choice.objects.filter(id__in=selected).values_list("id", "text"))
+    before_questions = dict(Choice.objects.filter(id__in=selected).values_list("id", "question__text"))
+    updated_at = Quiz.objects.get(pk=quiz.pk).updated_at
+
+    # Повторное сохранение без изменений ничего не пишет
+    with django_assert_max_num_queries(8) as ctx:
+        client.post(
+            "/quizzes/save-generated/",
+            {"lesson_id": lesson.id, "quiz_id": quiz.id, "questions": questions},
+            format="json",
+        )
+    assert not any(query["sql"].startswith(("UPDATE", "INSERT", "DELETE")) for query in ctx.captured_queries)
+    assert Quiz.objects.get(pk=quiz.pk).updated_at == updated_at
+
+    # Вставка в начало, перестановка вопросов и вариантов: старые id указывают на тот же текст
+    reordered = [{"question": "Новый", "options": ["Да", "Нет"], "correct_option_index": 0}]
+    reordered += [
+        dict(item, options=item["options"][::-1], correct_option_index=2 - item["correct_option_index"])
+        for item in questions[::-1]
+    ]
+    client.post(
+        "/quizzes/save-generated/",
+        {"lesson_id": lesson.id, "quiz_id": quiz.id, "questions": reordered},
+        format="json",
+    )
+
+    result = Result.objects.get(quiz=quiz)
+    assert dict(Choice.objects.filter(id__in=result.selected_choices).values_list("id", "text")) == before
+    assert dict(
+        Choice.objects.filter(id__in=result.selected_choices).values_list("id", "question__text")
+    ) == before_questions
+    # Порядок отдачи — новый
+    assert list(quiz.questions.values_list("text", flat=True)) == ["Новый"] + [f"Вопрос {n}" for n in range(4, -1, -1)]
+    first = quiz.questions.get(text="Вопрос 0")
+    assert list(first.choices.values_list("text", "is_correct")) == [("В", False), ("Б", False), ("А", True)]
+
+
+@pytest.mark.django_db
+def test_write_behind_results_are_spooled_and_flushed_on_read(course, student, settings, tmp_path):
+    settings.QUIZ_RESULTS_WRITE_BEHIND = True
+    settings.QUIZ_RESULTS_SPOOL_DIR = str(tmp_path)
+    # Фоновый флашер в тесте не должен успеть сработать
+    settings.QUIZ_RESULTS_FLUSH_INTERVAL = 3600
+    client = auth_client(student)
+    first_lesson = course.lessons.get(order=1)
+    first_quiz = first_lesson.quizzes.first()
+    second_quiz = course.lessons.get(order=2).quizzes.first()
+
+    assert submit_quiz(client, first_quiz, correct=True).data["score"] == 100
+    assert submit_quiz(client, first_quiz, correct=True).data["status"] == "Pass"
+    assert submit_quiz(client, second_quiz, correct=False).data["status"] == "Fail"
+
+    # Оценка выдана сразу, а в БД результаты попадают только при переносе spool-файла
+    assert not Result.objects.filter(student=student).exists()
+    assert len(list(tmp_path.glob("results-*.jsonl"))) == 1
+    # Лучший балл и прогресс записаны сразу: первая сдача урока засчитала его шаг-тест один раз,
+    # и шаги урока можно отмечать до переноса результатов
+    assert lesson_unlocked(student.id, first_lesson.id)
+    row = CourseProgress.objects.get(student=student, course=course)
+    assert (row.completed_steps, row.total_steps) == (1, 4)
+
+    # Чтение своих результатов вставляет только записи этого студента, spool-файл остается флашеру
+    other = User.objects.create_user(username="other", password="StrongPass123!")
+    submit_quiz(auth_client(other), first_quiz, correct=False)
+    results = client.get("/quizzes/my-results/").data["results"]
+    assert [result["score"] for result in results] == [0, 100, 100]
+    assert not Result.objects.filter(student=other).exists()
+    assert len(list(tmp_path.glob("results-*.jsonl"))) == 1
+
+    # Флашер вставляет остальное; повторная вставка тех же сдач не задваивает строки
+    flush_spool()
+    assert not list(tmp_path.iterdir())
+    assert Result.objects.filter(student=student).count() == 3
+    assert Result.objects.filter(student=other).count() == 1
+    row.refresh_from_db()
+    assert row.completed_steps == 1
+
+
+@pytest.mark.django_db
+def test_write_behind_bad_entries_go_to_dead_letter(course, student, settings, tmp_path):
+    settings.QUIZ_RESULTS_WRITE_BEHIND = True
+    settings.QUIZ_RESULTS_SPOOL_DIR = str(tmp_path)
+    settings.QUIZ_RESULTS_FLUSH_INTERVAL = 3600
+    client = auth_client(student)
+    quiz = course.lessons.get(order=1).quizzes.first()
+    doomed = Quiz.objects.create(lesson=quiz.lesson, title="Удаляемый")
+    question = Question.objects.create(quiz=doomed, text="?")
+    Choice.objects.create(question=question, text="Да", is_correct=True)
+
+    submit_quiz(client, quiz, correct=True)
+    submit_quiz(client, doomed, correct=True)
+    submit_quiz(client, quiz, correct=False)
+    # Тест удален, пока его результат ждал в spool-файле: вставка нарушает внешний ключ
+    doomed_id = doomed.id
+    doomed.delete()
+
+    # Плохая строка не задерживает остальные, а откладывается в dead-letter
+    assert flush_spool() == 2
+    assert sorted(Result.objects.filter(student=student).values_list("score", flat=True)) == [0, 100]
+    dead = [json.loads(line) for line in (tmp_path / "dead-letter.jsonl").read_text().splitlines()]
+    assert [entry["quiz_id"] for entry in dead] == [doomed_id]
+    assert not list(tmp_path.glob("*.batch"))
+
+    # Пачка, перенесенная в БД, но не удаленная до падения процесса, при повторе не задваивает строки
+    submit_quiz(client, quiz, correct=True)
+    spool = next(tmp_path.glob("results-*.jsonl"))
+    replay = spool.read_text()
+    flush_spool()
+    (tmp_path / "replay.batch").write_text(replay)
+    flush_spool()
+    assert Result.objects.filter(student=student).count() == 3
+
+
+@pytest.mark.django_db
+def test_quiz_item_analytics(
+    course, student, teacher, django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    quiz = course.lessons.get(order=1).quizzes.first()
+    first = quiz.questions.get()
+    yes, no = first.choices.get(is_correct=True), first.choices.get(is_correct=False)
+    second = Question.objects.create(quiz=quiz, text="Что делать?")
+    report = Choice.objects.create(question=second, text="Сообщить", is_correct=True)
+    click = Choice.objects.create(question=second, text="Перейти", is_correct=False)
+
+    # Сильные студенты отвечают верно на оба вопроса, слабые ошибаются во втором
+    picks = [(yes, report), (yes, report), (yes, click), (no, click)]
+    for number, (answer_one, answer_two) in enumerate(picks):
+        user = User.objects.create_user(username=f"s{number}", password="StrongPass123!")
+        auth_client(user).post(
+            f"/quizzes/{quiz.id}/submit/",
+            {"answers": [
+                {"question_id": first.id, "choice_id": answer_one.id},
+                {"question_id": second.id, "choice_id": answer_two.id},
+            ]},
+            format="json",
+        )
+    assert Result.objects.get(student__username="s0").selected_choices == [yes.id, report.id]
+
+    assert auth_client(student).get(f"/quizzes/{quiz.id}/analytics/").status_code == 403
+    client = auth_client(teacher)
+    data = client.get(f"/quizzes/{quiz.id}/analytics/").data
+    assert data["attempts"] == 4
+    by_question = {item["question_id"]: item for item in data["questions"]}
+    assert by_question[first.id]["difficulty"] == 0.75
+    assert by_question[second.id]["difficulty"] == 0.5
+    assert by_question[second.id]["discrimination"] > 0
+    assert {c["id"]: c["count"] for c in by_question[second.id]["choices"]} == {report.id: 2, click.id: 2}
+    assert {c["id"]: c["rate"] for c in by_question[first.id]["choices"]} == {yes.id: 0.75, no.id: 0.25}
+
+    # Пока новых попыток нет, ответ берется из кеша: остаются поиск курса теста и отпечаток попыток
+    with django_assert_num_queries(2):
+        client.get(f"/quizzes/{quiz.id}/analytics/")
+
+    submit_quiz(auth_client(student), quiz, correct=True)
+    assert client.get(f"/quizzes/{quiz.id}/analytics/").data["attempts"] == 5
+
+    # После правки теста старые выборы не приписываются новому содержимому: выбор удаленного
+    # варианта отбрасывается, а попытки до появления вопроса не считаются ответами на него
+    questions = [
+        {"question": "Это фишинг?", "options": ["Да", "Нет"], "correct_option_index": 0},
+        {"question": "Что делать?", "options": ["Сообщить", "Удалить письмо"], "correct_option_index": 0},
+        {"question": "Новый вопрос", "options": ["А", "Б"], "correct_option_index": 0},
+    ]
+    with django_capture_on_commit_callbacks(execute=True):
+        client.post(
+            "/quizzes/save-generated/",
+            {"lesson_id": quiz.lesson_id, "quiz_id": quiz.id, "questions": questions},
+            format="json",
+        )
+    by_text = {item["text"]: item for item in client.get(f"/quizzes/{quiz.id}/analytics/").data["questions"]}
+    assert (by_text["Это фишинг?"]["answered"], by_text["Это фишинг?"]["difficulty"]) == (5, 0.8)
+    assert (by_text["Что делать?"]["answered"], by_text["Что делать?"]["difficulty"]) == (2, 1.0)
+    assert [(c["text"], c["count"], c["rate"]) for c in by_text["Что делать?"]["choices"]] == [
+        ("Сообщить", 2, 1.0), ("Удалить письмо", 0, 0.0),
+    ]
+    assert (by_text["Новый вопрос"]["answered"], by_text["Новый вопрос"]["difficulty"]) == (0, None)
+
+
+@pytest.mark.django_db
+def test_best_scores_drive_lesson_gating(course, student, django_assert_num_queries):
+    client = auth_client(student)
+    lesson = course.lessons.get(order=1)
+    quiz = lesson.quizzes.first()
+
+    with django_assert_num_queries(1):
+        assert not lesson_unlocked(student.id, lesson.id)
+
+    submit_quiz(client, quiz, correct=True)
+    submit_quiz(client, quiz, correct=False)
+    # Лучший балл не понижается более слабой попыткой
+    best = QuizBestScore.objects.get(student=student, quiz=quiz)
+    assert (best.best_score, best.lesson_id) == (100, lesson.id)
+    with django_assert_num_queries(1):
+        assert lesson_unlocked(student.id, lesson.id)
+
+    # Удаление результата (например, из админки) пересчитывает лучший балл
+    Result.objects.filter(student=student, quiz=quiz, score=100).delete()
+    assert QuizBestScore.objects.get(student=student, quiz=quiz).best_score == 0
+    assert not lesson_unlocked(student.id, lesson.id)
+    step = lesson.steps.get(step_type="text")
+    assert client.post(f"/courses/steps/{step.id}/complete/").status_code == 400
+
+
+@pytest.mark.django_db
+def test_xp_leaderboards(course, teacher, student, settings, django_assert_num_queries):
+    settings.LEADERBOARD_CACHE_SECONDS = 0
+    rival = User.objects.create_user(username="rival", password="StrongPass123!")
+    lesson = course.lessons.get(order=1)
+    text_step = lesson.steps.get(step_type="text")
+    for user, score in ((student, 15), (rival, 40)):
+        Enrollment.objects.create(student=user, course=course)
+        client = auth_client(user)
+        submit_quiz(client, lesson.quizzes.first(), correct=True)
+        client.post(f"/courses/steps/{text_step.id}/complete/", {"score": score})
+    # Очки в другом курсе той же категории, набранные 20 дней назад: в месяце есть, в неделе нет
+    other = Course.objects.create(category=course.category, teacher=teacher, title="Пароли", description="Курс")
+    CourseProgress.objects.create(student=student, course=other, xp=50)
+    DailyXP.objects.create(student=student, course=other, day=timezone.localdate() - timedelta(days=20), xp=50)
+
+    client = auth_client(student)
+
+    def board(url):
+        res = client.get(url)
+        assert res.status_code == 200
+        return [(row["rank"], row["username"], row["xp"]) for row in res.data["results"]], res.data["me"]
+
+    assert board("/courses/leaderboard/") == ([(1, "student", 65), (2, "rival", 40)], {"rank": 1, "xp": 65})
+    assert board("/courses/leaderboard/?window=week") == ([(1, "rival", 40), (2, "student", 15)], {"rank": 2, "xp": 15})
+    assert board("/courses/leaderboard/?window=month&limit=1") == ([(1, "student", 65)], {"rank": 1, "xp": 65})
+    assert board(f"/courses/{course.id}/leaderboard/")[0] == [(1, "rival", 40), (2, "student", 15)]
+    assert board(f"/courses/categories/{course.category_id}/leaderboard/?window=month")[1] == {"rank": 1, "xp": 65}
+    assert client.get("/courses/leaderboard/?window=year").status_code == 400
+    outsider = User.objects.create_user(username="outsider", password="StrongPass123!")
+    assert auth_client(outsider).get(f"/courses/{course.id}/leaderboard/").status_code == 403
+
+    # Таблица собирается из агрегатов раз в LEADERBOARD_CACHE_SECONDS, дальше запрос только за именами топа
+    settings.LEADERBOARD_CACHE_SECONDS = 60
+    client.get(f"/courses/{course.id}/leaderboard/?window=week")
+    with django_assert_num_queries(1):
+        assert board(f"/courses/{course.id}/leaderboard/?window=week")[1] == {"rank": 2, "xp": 15}
+
+    # Удаление шага списывает его XP и из дневных строк
+    text_step.delete()
+    assert sum(DailyXP.objects.filter(course=course).values_list("xp", flat=True)) == 0
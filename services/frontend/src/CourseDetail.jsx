@@ -1,6 +1,6 @@
 import { useEffect, useState } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
-import api from './api';
+import api, { fetchAllPages } from './api';
 import { 
     FileText, 
     PlayCircle, 
@@ -42,8 +42,9 @@ function CourseDetail({ isLoggedIn }) {
 
                 if (isLoggedIn) {
                     try {
-                        const myCoursesRes = await api.get(`courses/my_courses/`);
-                        const isUserEnrolled = myCoursesRes.data.some(c => c.id === parseInt(id));
+                        // Для проверки записи достаточно id курсов
+                        const myCourses = await fetchAllPages('courses/my_courses/?fields=id&page_size=100');
+                        const isUserEnrolled = myCourses.some(c => c.id === parseInt(id));
 
                         if (isUserEnrolled) {
                             const lessonsRes = await api.get(`courses/${id}/lessons/`);
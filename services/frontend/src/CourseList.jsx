@@ -1,6 +1,6 @@
 import { useEffect, useState, useMemo } from 'react';
 import { Link } from 'react-router-dom';
-import api from './api';
+import api, { fetchAllPages } from './api';
 import {
     Search, BookOpen, PlayCircle, Clock, Users, Star,
     ChevronDown, X, CheckCircle, ArrowRight, Zap, Shield, TrendingUp
@@ -68,7 +68,7 @@ function CourseCard({ course }) {
                         {course.title}
                     </h3>
                     <p className="text-xs text-slate-500 line-clamp-2 sm:line-clamp-1 leading-relaxed">
-                        {stripHtml(course.description) || 'Описание скоро появится'}
+                        {stripHtml(course.short_description || course.description) || 'Описание скоро появится'}
                     </p>
                 </div>
 
@@ -198,6 +198,8 @@ function PromoBanner() {
 // ─── Main ─────────────────────────────────────────────────────────────────────
 export default function CourseList() {
     const [courses, setCourses]       = useState([]);
+    const [nextPage, setNextPage]     = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [categories, setCategories] = useState([]);
     const [loading, setLoading]       = useState(true);
     
@@ -213,8 +215,8 @@ export default function CourseList() {
 
     // Загрузка категорий
     useEffect(() => {
-        api.get('courses/categories/')
-            .then(res => setCategories(res.data))
+        fetchAllPages('courses/categories/')
+            .then(setCategories)
             .catch(() => {});
     }, []);
 
@@ -232,12 +234,27 @@ export default function CourseList() {
         const params = new URLSearchParams();
         if (debouncedSearch) params.append('search', debouncedSearch);
         if (selectedCategory) params.append('category', selectedCategory);
+        // Каталог отдает облегченные карточки, прогресс запрашиваем явно
+        params.append('expand', 'progress');
         
         api.get(`courses/?${params.toString()}`)
-            .then(res => { setCourses(res.data); setLoading(false); })
+            .then(res => { setCourses(res.data.results); setNextPage(res.data.next); setLoading(false); })
             .catch(() => setLoading(false));
     }, [debouncedSearch, selectedCategory]);
 
+    // Каталог пагинируется курсором: следующая страница берется по ссылке next
+    const loadMore = () => {
+        if (!nextPage) return;
+        setLoadingMore(true);
+        api.get(nextPage)
+            .then(res => {
+                setCourses(prev => [...prev, ...res.data.results]);
+                setNextPage(res.data.next);
+            })
+            .catch(() => {})
+            .finally(() => setLoadingMore(false));
+    };
+
     const filtered = useMemo(() => {
         let r = [...courses];
         if (onlyFree) r = r.filter(c => parseFloat(c.price) === 0);
@@ -471,6 +488,16 @@ export default function CourseList() {
                                 <div className="flex flex-col gap-3">
                                     {filtered.map(c => <CourseCard key={c.id} course={c} />)}
                                 </div>
+
+                                {nextPage && (
+                                    <button
+                                        onClick={loadMore}
+                                        disabled={loadingMore}
+                                        className="mt-5 w-full py-3 bg-slate-100 text-slate-700 rounded-xl text-sm font-bold hover:bg-slate-200 transition-colors disabled:opacity-60"
+                                    >
+                                        {loadingMore ? 'Загружаем...' : 'Показать ещё'}
+                                    </button>
+                                )}
                             </>
                         ) : (
                             <div className="flex flex-col items-center justify-center py-24 text-center px-4">
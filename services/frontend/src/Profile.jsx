@@ -1,6 +1,6 @@
 import { useEffect, useState, useMemo } from 'react';
 import { useNavigate, Link } from 'react-router-dom';
-import api from './api';
+import api, { fetchAllPages } from './api';
 import { toast } from 'react-toastify';
 
 function Profile() {
@@ -37,15 +37,16 @@ function Profile() {
                     age: userRes.data.age || '',
                 });
 
-                const resultsRes = await api.get('quizzes/my-results/'); 
-                setResults(resultsRes.data);
+                // Статистика профиля строится по всем результатам, поэтому собираем все страницы
+                const allResults = await fetchAllPages('quizzes/my-results/?page_size=100'); 
+                setResults(allResults);
                 
-                const catRes = await api.get('courses/categories/'); 
-                setCategories(catRes.data);
-                if (catRes.data.length > 0) setSelectedCategory(catRes.data[0].id);
+                const allCategories = await fetchAllPages('courses/categories/'); 
+                setCategories(allCategories);
+                if (allCategories.length > 0) setSelectedCategory(allCategories[0].id);
 
-                const coursesRes = await api.get('courses/my_courses/');
-                setMyCourses(coursesRes.data);
+                const allCourses = await fetchAllPages('courses/my_courses/?fields=id,title,category_title');
+                setMyCourses(allCourses);
             } catch (err) {
                 console.error("Ошибка загрузки профиля:", err);
                 toast.error("Не удалось загрузить данные профиля");
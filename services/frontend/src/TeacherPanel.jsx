@@ -78,6 +78,9 @@ function TeacherPanel() {
             });
             setGeneratedCourse(res.data);
             toast.success('✨ Черновик курса успешно создан!');
+            if (res.data.source_truncated) {
+                toast.warning(`Документ слишком большой: курс составлен по первым ${res.data.source_chars} символам.`);
+            }
         } catch (err) {
             console.error("Ошибка ИИ:", err);
             toast.error(err.response?.data?.detail || "Ошибка при генерации курса.");
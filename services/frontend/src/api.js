@@ -17,4 +17,18 @@ api.interceptors.request.use((config) => {
 // 👇 Включаем автоматическую обработку ошибок (ответ от сервера)
 setupAxiosInterceptors(api);
 
+// Списки API пагинируются курсором ({ next, previous, results }).
+// Собираем все страницы, проходя по ссылкам next
+export const fetchAllPages = async (url) => {
+    const items = [];
+    let next = url;
+    while (next) {
+        const res = await api.get(next);
+        if (Array.isArray(res.data)) return res.data;
+        items.push(...res.data.results);
+        next = res.data.next;
+    }
+    return items;
+};
+
 export default api;
\ No newline at end of file